@@ -0,0 +1,67 @@
+import argparse
+import json
+import sys
+
+# Показатели, по которым ищутся ухудшения; True — чем больше, тем лучше
+METRICS = {
+    'seconds': False,
+    'peak_rss_mb': False,
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'qps': True,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Сравнение результатов двух запусков run.py')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.1, help='допустимое ухудшение, доля')
+    return parser.parse_args()
+
+
+def load_results(results_file):
+    with open(results_file, 'r') as file:
+        return json.load(file)
+
+
+def change(before, after, higher_is_better):
+    # Доля ухудшения: положительная, если стало хуже
+    if not before:
+        return 0.0
+    ratio = (after - before) / before
+    return -ratio if higher_is_better else ratio
+
+
+def compare(baseline, current, threshold=0.1):
+    # Сравниваются только размеры коллекции и этапы, которые есть в обоих запусках
+    baseline_runs = {run['docs']: run['stages'] for run in baseline['runs']}
+    regressions = []
+    for run in current['runs']:
+        if run['docs'] not in baseline_runs:
+            continue
+        print(f'{run["docs"]} documents')
+        for stage, result in run['stages'].items():
+            before_result = baseline_runs[run['docs']].get(stage)
+            if before_result is None:
+                continue
+            for metric, higher_is_better in METRICS.items():
+                if metric not in result or metric not in before_result:
+                    continue
+                before, after = before_result[metric], result[metric]
+                worse = change(before, after, higher_is_better)
+                mark = ''
+                if worse > threshold:
+                    mark = '  REGRESSION'
+                    regressions.append((run['docs'], stage, metric, worse))
+                relative = (after - before) / before if before else 0.0
+                print(f'  {stage:<14}{metric:<13}{before:>12.3f} -> {after:<12.3f}{relative:+8.1%}{mark}')
+    print(f'{len(regressions)} regressions above {threshold:.0%}')
+    return regressions
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    regressions = compare(load_results(args.baseline), load_results(args.current), args.threshold)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,81 @@
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common.nltk_resources import english_words
+from common.page_store import PageStore
+
+# Синтетическая коллекция для замеров: html-страницы из слов словаря nltk с распределением Ципфа.
+# Страница зависит только от seed и своего номера, поэтому коллекции разного размера совпадают
+# на общих документах, а повторный запуск даёт те же байты
+DEFAULT_VOCABULARY_SIZE = 20000
+ZIPF_EXPONENT = 1.1
+MEAN_DOC_WORDS = 400
+URL_PATTERN = 'https://bench.example.org/wiki/Page_{}'
+
+
+def corpus_vocabulary(seed=0, size=DEFAULT_VOCABULARY_SIZE):
+    # Только слова, которые пропустит tokenize: из словаря nltk, строчные, без дефисов и длиннее одной буквы
+    candidates = sorted(word for word in english_words() if word.isalpha() and word.islower() and len(word) > 1)
+    rng = np.random.default_rng(seed)
+    return [candidates[i] for i in rng.permutation(len(candidates))[:size]]
+
+
+def zipf_weights(size, exponent=ZIPF_EXPONENT):
+    weights = 1 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+def sample_words(rng, vocabulary, weights, count):
+    return [vocabulary[i] for i in rng.choice(len(vocabulary), count, p=weights)]
+
+
+def generate_page(doc_id, vocabulary, weights, seed=0):
+    rng = np.random.default_rng([seed, doc_id])
+    word_count = max(20, int(rng.lognormal(np.log(MEAN_DOC_WORDS), 0.6)))
+    text = sample_words(rng, vocabulary, weights, word_count)
+    title = ' '.join(text[:3]).title()
+    paragraphs = []
+    start = 0
+    while start < word_count:
+        end = start + int(rng.integers(30, 120))
+        paragraphs.append(f'<p>{" ".join(text[start:end])}</p>')
+        start = end
+    # Разметка, которую должна отбросить очистка html: скрипты, стили и навигация
+    return (f'<!DOCTYPE html><html><head><title>{title}</title>'
+            f'<style>body {{ font-family: serif; }}</style>'
+            f'<script>var page = {doc_id};</script></head>'
+            f'<body><nav><a href="/">Main page</a> <a href="/random">Random</a></nav>'
+            f'<h1>{title}</h1>{"".join(paragraphs)}'
+            f'<footer>Page {doc_id} of the benchmark collection</footer></body></html>')
+
+
+def generate_corpus(directory, doc_count, seed=0, vocabulary_size=DEFAULT_VOCABULARY_SIZE):
+    # Раскладка как у task1: directory/task1/downloads (PageStore) и directory/task1/index.txt
+    print(f'Generating {doc_count} documents')
+    task1_dir = Path(directory) / 'task1'
+    vocabulary = corpus_vocabulary(seed, vocabulary_size)
+    weights = zipf_weights(len(vocabulary))
+    with PageStore(task1_dir / 'downloads') as pages, open(task1_dir / 'index.txt', 'w') as index_file:
+        for doc_id in range(1, doc_count + 1):
+            pages.put(doc_id, generate_page(doc_id, vocabulary, weights, seed))
+            index_file.write(f'{doc_id}. {URL_PATTERN.format(doc_id)}\n')
+    return vocabulary
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Синтетическая коллекция html-страниц в формате task1')
+    parser.add_argument('directory', help='каталог, в котором будет создан task1/downloads и task1/index.txt')
+    parser.add_argument('--docs', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--vocabulary', type=int, default=DEFAULT_VOCABULARY_SIZE, help='размер словаря коллекции')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    generate_corpus(args.directory, args.docs, args.seed, args.vocabulary)
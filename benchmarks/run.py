@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.compare import compare, load_results
+from benchmarks.corpus import generate_corpus
+from benchmarks.stage import RESULT_PREFIX
+
+ROOT = Path(__file__).resolve().parent.parent
+# Рабочая копия получает только код: данные и кеши репозитория не затрагиваются
+CODE_DIRS = ['common', 'task1', 'task2', 'task3', 'task4', 'task5', 'benchmarks']
+CODE_PATTERNS = ['*.py', '*.html']
+BUILD_STAGES = ['extraction', 'tokenization', 'lemmatization', 'analysis', 'indexing', 'tfidf', 'matrix']
+QUERY_STAGES = ['boolean', 'ranked']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Замер сборки task1–task5 и поиска на синтетической коллекции')
+    parser.add_argument('--docs', type=int, nargs='+', default=[100, 1000], help='размеры коллекции')
+    parser.add_argument('--stages', nargs='+', choices=BUILD_STAGES + QUERY_STAGES, default=BUILD_STAGES + QUERY_STAGES)
+    parser.add_argument('--workspace', default=str(Path(tempfile.gettempdir()) / 'infosearch-bench'),
+                        help='каталог для рабочих копий; для каждого размера пересоздаётся')
+    parser.add_argument('--workers', type=int, default=None, help='число процессов для извлечения текста')
+    parser.add_argument('--queries', type=int, default=1000, help='число запросов к каждому поиску')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help='файл результатов (по умолчанию benchmarks/results/<время>.json)')
+    parser.add_argument('--baseline', default=None, help='сравнить с результатами прошлого запуска')
+    parser.add_argument('--threshold', type=float, default=0.1, help='допустимое ухудшение, доля')
+    return parser.parse_args()
+
+
+def prepare_workspace(directory):
+    shutil.rmtree(directory, ignore_errors=True)
+    for code_dir in CODE_DIRS:
+        (directory / code_dir).mkdir(parents=True)
+        for pattern in CODE_PATTERNS:
+            for path in (ROOT / code_dir).glob(pattern):
+                shutil.copy2(path, directory / code_dir / path.name)
+
+
+def run_stage(directory, stage, args):
+    command = [sys.executable, str(directory / 'benchmarks' / 'stage.py'), stage,
+               '--queries', str(args.queries), '--seed', str(args.seed)]
+    if args.workers:
+        command += ['--workers', str(args.workers)]
+    log_file = directory / 'bench' / f'{stage}.log'
+    log_file.parent.mkdir(exist_ok=True)
+    with open(log_file, 'w') as log:
+        completed = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT)
+    if completed.returncode != 0:
+        raise RuntimeError(f'Stage {stage} failed, see {log_file}')
+    with open(log_file, 'r') as log:
+        lines = [line for line in log if line.startswith(RESULT_PREFIX)]
+    return json.loads(lines[-1][len(RESULT_PREFIX):])
+
+
+def format_result(stage, result):
+    line = f'  {stage:<14}{result["seconds"]:>9.2f}s {result["peak_rss_mb"]:>9.1f} MB'
+    if 'docs_per_sec' in result:
+        line += f'  {result["docs_per_sec"]:.1f} docs/sec'
+    if 'qps' in result:
+        line += (f'  {result["qps"]:.1f} qps, p50 {result["p50_ms"]:.2f} ms, '
+                 f'p95 {result["p95_ms"]:.2f} ms, p99 {result["p99_ms"]:.2f} ms')
+    return line
+
+
+def run_size(doc_count, args):
+    directory = Path(args.workspace) / str(doc_count)
+    prepare_workspace(directory)
+    start = time.perf_counter()
+    generate_corpus(directory, doc_count, args.seed)
+    stages = {'generation': {'seconds': time.perf_counter() - start}}
+    # Этапы идут по порядку: каждый использует результаты предыдущих (тексты, кеш анализа, индексы)
+    for stage in [stage for stage in BUILD_STAGES + QUERY_STAGES if stage in args.stages]:
+        print(f'Running {stage} on {doc_count} documents')
+        stages[stage] = run_stage(directory, stage, args)
+        print(format_result(stage, stages[stage]))
+    return {'docs': doc_count, 'stages': stages}
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'workers': args.workers,
+        'queries': args.queries,
+        'runs': [run_size(doc_count, args) for doc_count in args.docs],
+    }
+    output = Path(args.output or ROOT / 'benchmarks' / 'results' / (time.strftime('%Y%m%d-%H%M%S') + '.json'))
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'Saved results to {output}')
+    if args.baseline:
+        regressions = compare(load_results(args.baseline), results, args.threshold)
+        sys.exit(1 if regressions else 0)
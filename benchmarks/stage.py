@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import resource
+import runpy
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common.page_store import iter_pages, open_pages
+
+# Один этап замера в отдельном процессе, чтобы пиковая память относилась только к нему.
+# Запускается из run.py внутри рабочей копии репозитория; результат — последняя строка вывода
+RESULT_PREFIX = 'BENCH '
+ROOT = Path(__file__).resolve().parent.parent
+BENCH_DIR = ROOT / 'bench'
+
+# Этапы сборки task2–task5: скрипт и его аргументы
+SCRIPTS = {
+    'analysis': ('task2', 'main.py', True),
+    'indexing': ('task3', 'main.py', True),
+    'tfidf': ('task4', 'main.py', True),
+    'matrix': ('task5', 'create_vector_matrix.py', False),
+}
+BOOLEAN_TEMPLATES = ['{0}', '{0} AND {1}', '{0} OR {1}', '{0} AND NOT {1}', '({0} OR {1}) AND {2}']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('stage')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def peak_memory_mb():
+    # ru_maxrss в Linux — в килобайтах; дочерние процессы — пулы разбора страниц
+    usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return usage / 1024
+
+
+def extraction(args):
+    from common.extraction import DEFAULT_PARSER, available_parser, extract_pages
+    totals = {'docs': 0, 'bytes_in': 0}
+
+    def pages():
+        for doc_id, html in iter_pages(ROOT / 'task1' / 'downloads'):
+            totals['docs'] += 1
+            totals['bytes_in'] += len(html.encode())
+            yield doc_id, html
+
+    start = time.perf_counter()
+    with open_pages(BENCH_DIR / 'texts') as texts:
+        for doc_id, text in extract_pages(pages(), available_parser(DEFAULT_PARSER), args.workers):
+            texts.put(doc_id, text)
+    return time.perf_counter() - start, totals
+
+
+def tokenization(args):
+    from common.analysis import tokenize_with_count
+    totals = {'docs': 0, 'tokens': 0, 'bytes_in': 0}
+    vocabulary = set()
+    start = time.perf_counter()
+    for _, text in iter_pages(BENCH_DIR / 'texts'):
+        counts = tokenize_with_count(text)
+        vocabulary.update(counts)
+        totals['docs'] += 1
+        totals['tokens'] += sum(counts.values())
+        totals['bytes_in'] += len(text.encode())
+    elapsed = time.perf_counter() - start
+    with open(BENCH_DIR / 'vocabulary.txt', 'w') as file:
+        file.write('\n'.join(sorted(vocabulary)) + '\n')
+    return elapsed, totals
+
+
+def lemmatization(args):
+    # С пустой таблицей лемм: WordNet вызывается для каждого токена
+    from common.analysis import lemmatize_vocabulary
+    with open(BENCH_DIR / 'vocabulary.txt', 'r') as file:
+        vocabulary = file.read().split()
+    table_file = BENCH_DIR / 'lemma_table.txt'
+    table_file.unlink(missing_ok=True)
+    start = time.perf_counter()
+    lemmatize_vocabulary(vocabulary, table_file)
+    return time.perf_counter() - start, {'tokens': len(vocabulary)}
+
+
+def run_script(args):
+    directory, script, parallel = SCRIPTS[args.stage]
+    os.chdir(ROOT / directory)
+    sys.path.insert(0, str(ROOT / directory))
+    sys.argv = [script] + (['--workers', str(args.workers)] if parallel and args.workers else [])
+    start = time.perf_counter()
+    runpy.run_path(script, run_name='__main__')
+    return time.perf_counter() - start, {}
+
+
+def workload(args, templates, word_count):
+    # Слова запросов — из словаря коллекции с тем же распределением, что и в документах
+    from benchmarks.corpus import corpus_vocabulary, sample_words, zipf_weights
+    vocabulary = corpus_vocabulary(args.seed)
+    weights = zipf_weights(len(vocabulary))
+    rng = np.random.default_rng(args.seed)
+    queries = []
+    for _ in range(args.queries):
+        template = templates[rng.integers(len(templates))]
+        queries.append(template.format(*sample_words(rng, vocabulary, weights, word_count)))
+    return queries
+
+
+def latency_stats(latencies, elapsed):
+    latencies = np.array(latencies) * 1000
+    return {'queries': len(latencies), 'qps': len(latencies) / elapsed,
+            'p50_ms': float(np.percentile(latencies, 50)), 'p95_ms': float(np.percentile(latencies, 95)),
+            'p99_ms': float(np.percentile(latencies, 99))}
+
+
+def timed_queries(queries, function):
+    latencies = []
+    start = time.perf_counter()
+    for query in queries:
+        query_start = time.perf_counter()
+        function(query)
+        latencies.append(time.perf_counter() - query_start)
+    elapsed = time.perf_counter() - start
+    return elapsed, latency_stats(latencies, elapsed)
+
+
+def boolean(args):
+    # Тот же путь, что у task3/search.py: разбор запроса, перевод в постфиксную запись, поиск по индексу
+    from common.boolean_engine import BooleanEngine
+    from task3.search import convert_to_postfix, load_index, tokenize_query
+    engine = BooleanEngine(load_index(str(ROOT / 'task3' / 'inverted_index.bin')))
+    queries = workload(args, BOOLEAN_TEMPLATES, 3)
+    return timed_queries(queries, lambda query: engine.search(convert_to_postfix(tokenize_query(query))))
+
+
+def ranked(args):
+    # Запросы к /search через тестовый клиент Flask: весь путь обработчика без сетевого стека
+    os.chdir(ROOT / 'task5')
+    sys.path.insert(0, str(ROOT / 'task5'))
+    import main
+    main.init()
+    client = main.app.test_client()
+    queries = workload(args, ['{0}', '{0} {1}', '{0} {1} {2}'], 3)
+
+    def post(query):
+        response = client.post('/search', data={'query': query})
+        if response.status_code != 200:
+            raise ValueError(f'/search returned {response.status_code} for {query!r}')
+
+    elapsed, stats = timed_queries(queries, post)
+    stats['cache_hit_ratio'] = main.query_cache.stats()['hit_rate']
+    return elapsed, stats
+
+
+STAGES = {
+    'extraction': extraction,
+    'tokenization': tokenization,
+    'lemmatization': lemmatization,
+    'analysis': run_script,
+    'indexing': run_script,
+    'tfidf': run_script,
+    'matrix': run_script,
+    'boolean': boolean,
+    'ranked': ranked,
+}
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    BENCH_DIR.mkdir(exist_ok=True)
+    elapsed, stats = STAGES[args.stage](args)
+    result = {'seconds': elapsed, 'peak_rss_mb': peak_memory_mb(), **stats}
+    if elapsed and 'docs' in stats:
+        result['docs_per_sec'] = stats['docs'] / elapsed
+    print(RESULT_PREFIX + json.dumps(result))
@@ -0,0 +1,84 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.corpus import zipf_weights
+from common.ranking import RankedEngine, normalize_rows, upper_bounds
+
+# Точный top-k на синтетической матрице без сборки коллекции: частоты лемм по закону Ципфа,
+# поэтому в запросах, как и в настоящих, часто встречаются леммы с очень длинными списками.
+# Сравниваются exhaustive (оценка всех документов с леммами запроса) и RankedEngine.top_k (MaxScore),
+# результаты обоих проверяются на совпадение
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Сравнение exhaustive и MaxScore top-k на синтетической матрице')
+    parser.add_argument('--docs', type=int, nargs='+', default=[100000, 1000000], help='число документов')
+    parser.add_argument('--terms', type=int, default=20000, help='число лемм')
+    parser.add_argument('--doc-terms', type=int, default=60, help='среднее число различных лемм в документе')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def synthetic_postings(rng, doc_count, term_count, doc_terms):
+    # Лемма -> документы: документная частота пропорциональна весу Ципфа, веса документов нормированы
+    doc_freqs = np.minimum(doc_count, np.maximum(1, np.round(zipf_weights(term_count, 1.0) * doc_count * doc_terms)))
+    doc_freqs = doc_freqs.astype(np.int64)
+    row_lists = [rng.choice(doc_count, doc_freq, replace=False) if doc_freq < doc_count // 4
+                 else np.flatnonzero(rng.random(doc_count) < doc_freq / doc_count)
+                 for doc_freq in doc_freqs]
+    rows = np.concatenate(row_lists)
+    columns = np.repeat(np.arange(term_count), [len(row_list) for row_list in row_lists])
+    counts = sparse.csr_matrix((rng.integers(1, 5, len(rows)).astype(np.float64), (rows, columns)),
+                               shape=(doc_count, term_count))
+    postings = sparse.csr_matrix(normalize_rows(counts).T)
+    postings.sort_indices()
+    return postings
+
+
+def synthetic_queries(rng, postings, count):
+    term_count, doc_count = postings.shape
+    weights = zipf_weights(term_count, 1.0)
+    doc_freqs = np.diff(postings.indptr)
+    idf = np.log(doc_count / np.maximum(doc_freqs, 1))
+    queries = []
+    for _ in range(count):
+        columns = np.unique(rng.choice(term_count, rng.integers(2, 5), p=weights))
+        queries.append({int(j): float(idf[j]) for j in columns})
+    return queries
+
+
+def timed(function, queries):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(function(query))
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    return results, float(np.mean(latencies)), float(np.percentile(latencies, 95))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    for doc_count in args.docs:
+        rng = np.random.default_rng(args.seed)
+        postings = synthetic_postings(rng, doc_count, args.terms, args.doc_terms)
+        engine = RankedEngine(postings, upper_bounds(postings))
+        queries = synthetic_queries(rng, postings, args.queries)
+        exhaustive, exhaustive_mean, exhaustive_p95 = timed(lambda query: engine.exhaustive(query, args.k), queries)
+        maxscore, maxscore_mean, maxscore_p95 = timed(lambda query: engine.top_k(query, args.k), queries)
+        for (rows, _), (expected_rows, _) in zip(maxscore, exhaustive):
+            if rows.tolist() != expected_rows.tolist():
+                raise AssertionError('MaxScore and exhaustive top-k differ')
+        print(f'{doc_count} docs, {postings.nnz} postings: exhaustive {exhaustive_mean:.2f} ms '
+              f'(p95 {exhaustive_p95:.2f}), maxscore {maxscore_mean:.2f} ms (p95 {maxscore_p95:.2f}), '
+              f'speedup {exhaustive_mean / maxscore_mean:.1f}x')
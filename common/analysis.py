@@ -0,0 +1,268 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from functools import partial
+
+from common.cache import ArtifactCache, content_key
+from common.extraction import DEFAULT_PARSER, available_parser, clean_html, extract_pages
+from common.lemmatizer import LemmaService
+from common.metrics import record_stage, stage
+from common.nltk_resources import english_stopwords, english_words
+from common.page_store import iter_pages, open_pages
+
+logger = logging.getLogger(__name__)
+
+# Увеличивается при любом изменении анализа, чтобы кешированные результаты перестроились
+ANALYSIS_VERSION = 3
+TOKEN_PATTERN = re.compile(r'[a-z-]+')
+TOKEN_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz-')
+# Размер куска текста при токенизации: длинные страницы не копируются целиком
+TEXT_CHUNK_SIZE = 64 * 1024
+
+
+class Analysis:
+    # Результат одного прохода по коллекции, общий для task2, task3 и task4
+    def __init__(self, token_counts, tokens, token_postings, lemmas, lemma_postings, token_lemmas,
+                 lemma_positions=None):
+        self.token_counts = token_counts
+        self.tokens = tokens
+        self.token_postings = token_postings
+        self.lemmas = lemmas
+        self.lemma_postings = lemma_postings
+        self.token_lemmas = token_lemmas
+        self.lemma_positions = lemma_positions
+
+    @property
+    def doc_ids(self):
+        return sorted(self.token_counts)
+
+
+def text_chunks(text, chunk_size=TEXT_CHUNK_SIZE):
+    for start in range(0, len(text), chunk_size):
+        yield text[start:start + chunk_size]
+
+
+def raw_token_lists(chunks):
+    # Слова — непрерывные отрезки из строчных латинских букв и дефисов после lower(), как раньше давали
+    # замена остальных символов пробелами и split. Текст обрабатывается кусками: слово, которое
+    # упирается в конец куска, переносится в начало следующего
+    carry = ''
+    for chunk in chunks:
+        chunk = carry + chunk.lower()
+        tokens = TOKEN_PATTERN.findall(chunk)
+        carry = ''
+        if tokens and chunk[-1] in TOKEN_CHARS:
+            carry = tokens.pop()
+        yield tokens
+    if carry:
+        yield [carry]
+
+
+def tokenize(text, chunk_size=TEXT_CHUNK_SIZE):
+    # text — строка или итератор кусков строки
+    chunks = text_chunks(text, chunk_size) if isinstance(text, str) else text
+    words = english_words()
+    for tokens in raw_token_lists(chunks):
+        for token in tokens:
+            if len(token) > 1 and token in words:
+                yield token
+
+
+def tokenize_with_count(text, chunk_size=TEXT_CHUNK_SIZE):
+    # Сначала подсчёт всех слов куска одним Counter.update, затем проверка по словарю
+    # только различных слов, а не каждого вхождения
+    chunks = text_chunks(text, chunk_size) if isinstance(text, str) else text
+    counts = Counter()
+    for tokens in raw_token_lists(chunks):
+        counts.update(tokens)
+    words = english_words()
+    return Counter({token: count for token, count in counts.items() if len(token) > 1 and token in words})
+
+
+def tokenize_with_positions(text):
+    # Позиция — порядковый номер слова среди прошедших фильтр словаря
+    positions = {}
+    for position, token in enumerate(tokenize(text)):
+        positions.setdefault(token, []).append(position)
+    return positions
+
+
+def analyze_chunk(chunk, parser, positions=False):
+    # Вместе с результатом возвращается время извлечения текста и токенизации в рабочем процессе
+    results = []
+    for doc_id, html in chunk:
+        start = time.perf_counter()
+        text = clean_html(html, parser)
+        extracted = time.perf_counter()
+        if positions:
+            token_positions = tokenize_with_positions(text)
+            counts = Counter({token: len(token_list) for token, token_list in token_positions.items()})
+            result = {'counts': counts, 'positions': token_positions}
+        else:
+            result = {'counts': tokenize_with_count(text)}
+        result['stats'] = {'extraction': extracted - start, 'tokenization': time.perf_counter() - extracted,
+                           'bytes': len(html.encode())}
+        results.append((doc_id, result))
+    return results
+
+
+def document_sources(pages_directory, parser, positions=False, doc_ids=None):
+    # Ключ кеша разбора каждой страницы (или только страниц doc_ids): хеш html и параметров анализа
+    return {doc_id: content_key(ANALYSIS_VERSION, parser, positions, html)
+            for doc_id, html in iter_pages(pages_directory, doc_ids)}
+
+
+def iter_documents(pages_directory, documents_directory, parser, workers, chunk_size, positions, sources,
+                   doc_ids=None):
+    # Тройки (номер, частоты токенов, позиции токенов или None) по одному документу, без порядка.
+    # Документы, чей html не изменился с прошлого запуска, берутся из кеша;
+    # остальные разбираются параллельно и сразу дописываются в кеш.
+    # doc_ids — разобрать только эти документы; кеш остальных при этом не трогается
+    with open_pages(documents_directory) as documents:
+        reused = set()
+        for doc_id in documents.doc_ids():
+            if doc_id not in sources:
+                if doc_ids is None:
+                    documents.delete(doc_id)
+                continue
+            cached = json.loads(documents.get(doc_id))
+            if cached['source'] == sources[doc_id]:
+                reused.add(doc_id)
+                yield doc_id, Counter(cached['counts']), cached['positions'] if positions else None
+
+        changed = ((doc_id, html) for doc_id, html in iter_pages(pages_directory, doc_ids) if doc_id not in reused)
+        if len(reused) < len(sources):
+            # Словарь загружается до запуска рабочих процессов, и они получают его готовым при fork
+            english_words()
+        start = time.perf_counter()
+        process_chunk = partial(analyze_chunk, positions=positions)
+        totals = Counter()
+        analyzed = 0
+        for doc_id, result in extract_pages(changed, parser, workers, chunk_size, process_chunk):
+            totals.update(result.pop('stats'))
+            totals['tokens'] += sum(result['counts'].values())
+            documents.put(doc_id, json.dumps({'source': sources[doc_id], **result}))
+            analyzed += 1
+            yield doc_id, result['counts'], result['positions'] if positions else None
+        elapsed = time.perf_counter() - start
+        # Каждый изменившийся документ дописывается в кеш заново, старая запись остаётся мёртвой
+        if documents.compact_if_needed():
+            logger.info('Compacted the document cache')
+    logger.info(f'Analyzed {analyzed} documents in {elapsed:.2f}s '
+                f'({analyzed / elapsed if elapsed else 0:.1f} docs/sec), reused {len(reused)} from cache')
+    if analyzed:
+        # Время этапов — сумма по рабочим процессам, то есть процессорное время, а не настенное
+        record_stage('extraction', totals['extraction'], docs=analyzed, bytes_read=totals['bytes'])
+        record_stage('tokenization', totals['tokenization'], docs=analyzed, tokens=totals['tokens'])
+
+
+def analyze_documents(pages_directory, documents_directory, parser, workers, chunk_size, positions=False,
+                      doc_ids=None):
+    logger.info('Analyzing documents')
+    sources = document_sources(pages_directory, parser, positions, doc_ids)
+    token_counts = {}
+    token_positions = {} if positions else None
+    for doc_id, counts, doc_positions in iter_documents(pages_directory, documents_directory, parser, workers,
+                                                        chunk_size, positions, sources, doc_ids):
+        token_counts[doc_id] = counts
+        if positions:
+            token_positions[doc_id] = doc_positions
+    return token_counts, token_positions, sources
+
+
+def remove_stopwords(tokens):
+    logger.info('Removing stopwords')
+    stopword_set = english_stopwords()
+    return [word for word in tokens if word not in stopword_set and len(word) > 1]
+
+
+def lemmatize_vocabulary(vocabulary, table_file):
+    # Таблица токен -> леммы сохраняется между сборками: WordNet вызывается только для новых токенов
+    logger.info('Lemmatizing vocabulary')
+    with stage('lemmatization') as lemmatization:
+        service = LemmaService.load(table_file) if table_file.is_file() else LemmaService()
+        token_lemmas = service.lemmatize_batch(vocabulary)
+        service.save(table_file)
+        lemmatization.add(tokens=len(vocabulary))
+    return token_lemmas
+
+
+def get_lemmas(tokens, token_lemmas):
+    logger.info('Getting lemmas')
+    lemmas = {}
+    for token in tokens:
+        for token_lem in token_lemmas[token]:
+            if token_lem not in lemmas:
+                lemmas[token_lem] = [token]
+            elif token not in lemmas[token_lem]:
+                lemmas[token_lem].append(token)
+    return dict(sorted(lemmas.items(), key=lambda i: -len(i[1])))
+
+
+def build_postings(token_counts, tokens):
+    logger.info('Building postings')
+    token_set = set(tokens)
+    postings = {}
+    for doc_id, counts in sorted(token_counts.items()):
+        for token in counts:
+            if token in token_set:
+                postings.setdefault(token, set()).add(doc_id)
+    return postings
+
+
+def build_lemma_postings(lemmas, token_postings):
+    lemma_postings = {}
+    for lemma, forms in lemmas.items():
+        pages = set()
+        for form in forms:
+            pages.update(token_postings.get(form, ()))
+        lemma_postings[lemma] = pages
+    return lemma_postings
+
+
+def build_lemma_positions(lemmas, token_positions):
+    # Лемма -> {номер документа: отсортированные позиции всех её форм}
+    logger.info('Building positional postings')
+    form_lemmas = {}
+    for lemma, forms in lemmas.items():
+        for form in forms:
+            form_lemmas.setdefault(form, []).append(lemma)
+    lemma_positions = {}
+    for doc_id, positions in sorted(token_positions.items()):
+        for token, token_positions_in_doc in positions.items():
+            for lemma in form_lemmas.get(token, ()):
+                lemma_positions.setdefault(lemma, {}).setdefault(doc_id, []).extend(token_positions_in_doc)
+    for doc_positions in lemma_positions.values():
+        for position_list in doc_positions.values():
+            position_list.sort()
+    return lemma_positions
+
+
+def analyze_collection(pages_directory, args, cache=None):
+    # Один проход по страницам: токены, леммы, инвертированные списки и частоты слов по документам.
+    # Итог кешируется по хешу содержимого всех страниц и перестраивается только при их изменении
+    cache = cache or ArtifactCache()
+    parser = available_parser(getattr(args, 'parser', DEFAULT_PARSER))
+    positions = getattr(args, 'positions', False)
+    token_counts, token_positions, sources = analyze_documents(
+        pages_directory, cache.directory / 'documents', parser,
+        getattr(args, 'workers', None), getattr(args, 'chunk_size', 16), positions)
+    key = content_key(ANALYSIS_VERSION, positions,
+                      *(f'{doc_id}:{source}' for doc_id, source in sorted(sources.items())))
+
+    def build():
+        vocabulary = set()
+        for counts in token_counts.values():
+            vocabulary.update(counts)
+        vocabulary = sorted(vocabulary)
+        token_lemmas = lemmatize_vocabulary(vocabulary, cache.directory / 'lemma_table.txt')
+        tokens = remove_stopwords(vocabulary)
+        token_postings = build_postings(token_counts, tokens)
+        lemmas = get_lemmas(tokens, token_lemmas)
+        lemma_postings = build_lemma_postings(lemmas, token_postings)
+        lemma_positions = build_lemma_positions(lemmas, token_positions) if positions else None
+        return Analysis(token_counts, tokens, token_postings, lemmas, lemma_postings, token_lemmas, lemma_positions)
+
+    return cache.get_or_build('collection', key, build)
@@ -0,0 +1,73 @@
+import numpy as np
+from scipy import sparse
+
+from common.ranking import normalize_query, top_documents
+
+# Сколько ближайших кластеров просматривается по умолчанию: больше — выше полнота и медленнее запрос
+DEFAULT_NPROBE = 4
+
+
+def default_cluster_count(doc_count):
+    return max(1, int(np.sqrt(doc_count)))
+
+
+def normalize_centroids(centroids):
+    norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+    return np.divide(centroids, norms, out=np.zeros_like(centroids), where=norms > 0)
+
+
+def spherical_kmeans(matrix, cluster_count, iterations=20, seed=0):
+    # k-средних по косинусной мере над нормированными строками: центроид — нормированная сумма векторов
+    # кластера, документ относится к центроиду с наибольшим скалярным произведением
+    cluster_count = min(cluster_count, matrix.shape[0])
+    rng = np.random.default_rng(seed)
+    centroids = normalize_centroids(matrix[rng.choice(matrix.shape[0], cluster_count, replace=False)].toarray())
+    assignment = None
+    for _ in range(iterations):
+        new_assignment = np.asarray((matrix @ centroids.T).argmax(axis=1)).ravel()
+        if assignment is not None and np.array_equal(assignment, new_assignment):
+            break
+        assignment = new_assignment
+        members = sparse.csr_matrix((np.ones(len(assignment)), (assignment, np.arange(len(assignment)))),
+                                    shape=(cluster_count, matrix.shape[0]))
+        sums = np.asarray((members @ matrix).todense())
+        # пустой кластер сохраняет прежний центроид
+        empty = np.diff(members.indptr) == 0
+        sums[empty] = centroids[empty]
+        centroids = normalize_centroids(sums)
+    return centroids, assignment
+
+
+def build_ivf(matrix, cluster_count=None, iterations=20, seed=0):
+    # Инвертированный файл: строки — кластеры, столбцы — документы кластера; вместе с матрицей центроидов
+    matrix = sparse.csr_matrix(matrix)
+    if cluster_count is None:
+        cluster_count = default_cluster_count(matrix.shape[0])
+    centroids, assignment = spherical_kmeans(matrix, cluster_count, iterations, seed)
+    lists = sparse.csr_matrix((np.ones(len(assignment)), (assignment, np.arange(len(assignment)))),
+                              shape=(len(centroids), matrix.shape[0]))
+    return lists, centroids
+
+
+class IVFIndex:
+    # Приближённый поиск: точная косинусная мера считается только для документов nprobe кластеров,
+    # центроиды которых ближе всего к запросу
+    def __init__(self, lists, centroids, documents):
+        self.lists = lists
+        self.centroids = centroids
+        self.documents = documents
+
+    def candidates(self, query_tfidf, nprobe=DEFAULT_NPROBE):
+        # Документы nprobe ближайших кластеров и их оценки, без отбора лучших
+        columns, weights = normalize_query(query_tfidf)
+        if not len(columns):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        centroid_scores = self.centroids[:, columns] @ weights
+        probes = np.argsort(-centroid_scores, kind='stable')[:nprobe]
+        rows = np.unique(np.concatenate([self.lists.indices[self.lists.indptr[c]:self.lists.indptr[c + 1]]
+                                         for c in probes]))
+        scores = self.documents[rows][:, columns] @ weights
+        return rows, np.asarray(scores).ravel()
+
+    def search(self, query_tfidf, k, nprobe=DEFAULT_NPROBE):
+        return top_documents(*self.candidates(query_tfidf, nprobe), k)
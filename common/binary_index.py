@@ -0,0 +1,250 @@
+import argparse
+import json
+import mmap
+import struct
+from array import array
+from itertools import accumulate
+
+from common.metrics import stage
+
+# Бинарный инвертированный индекс:
+#   заголовок | списки документов | все номера документов | словарь терминов
+# Списки хранятся как разности соседних номеров в variable-byte кодировке и декодируются
+# только при обращении к термину. Словарь отсортирован по байтам терминов и состоит из
+# массивов смещений терминов (uint32), смещений списков (uint64), частот (uint32) и строк терминов,
+# поэтому термин ищется двоичным поиском прямо по отображённому в память файлу.
+# В позиционном индексе (флаг FLAG_POSITIONS) после разности номеров документа идут
+# число вхождений и разности позиций вхождений в этом документе.
+MAGIC = b'IIDX'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIQQ')
+FLAG_POSITIONS = 1
+
+
+def vbyte_encode(numbers, out=None):
+    out = bytearray() if out is None else out
+    for number in numbers:
+        while number >= 128:
+            out.append(number & 127)
+            number >>= 7
+        out.append(number | 128)
+    return out
+
+
+def vbyte_decode(data):
+    numbers = []
+    number = 0
+    shift = 0
+    for byte in data:
+        if byte & 128:
+            numbers.append(number | (byte & 127) << shift)
+            number = 0
+            shift = 0
+        else:
+            number |= byte << shift
+            shift += 7
+    return numbers
+
+
+def delta_encode(doc_ids, out=None):
+    previous = 0
+    deltas = []
+    for doc_id in doc_ids:
+        deltas.append(doc_id - previous)
+        previous = doc_id
+    return vbyte_encode(deltas, out)
+
+
+def delta_decode(data):
+    return list(accumulate(vbyte_decode(data)))
+
+
+def positional_encode(doc_positions, out=None):
+    out = bytearray() if out is None else out
+    previous = 0
+    for doc_id, positions in doc_positions:
+        vbyte_encode((doc_id - previous, len(positions)), out)
+        delta_encode(positions, out)
+        previous = doc_id
+    return out
+
+
+def positional_decode(data):
+    numbers = vbyte_decode(data)
+    doc_ids = []
+    positions = []
+    doc_id = 0
+    i = 0
+    while i < len(numbers):
+        doc_id += numbers[i]
+        count = numbers[i + 1]
+        doc_ids.append(doc_id)
+        positions.append(list(accumulate(numbers[i + 2:i + 2 + count])))
+        i += 2 + count
+    return doc_ids, positions
+
+
+def write_index(index_filename, term_postings, doc_ids, flags=0):
+    # term_postings — пары (термин, отсортированные номера документов) в порядке возрастания терминов,
+    # для позиционного индекса — (термин, [(номер документа, позиции), ...]);
+    # списки пишутся по одному, так что в памяти держится только словарь
+    term_offsets = array('I', [0])
+    postings_offsets = array('Q', [0])
+    doc_freqs = array('I')
+    terms = bytearray()
+    previous_term = None
+    with stage('indexing') as indexing, open(index_filename, 'wb') as file:
+        file.write(bytes(HEADER.size))
+        for term, postings in term_postings:
+            term_bytes = term.encode()
+            if previous_term is not None and term_bytes <= previous_term:
+                raise ValueError(f'Terms must be unique and sorted, got {term!r} after {previous_term.decode()!r}')
+            previous_term = term_bytes
+            encoded = positional_encode(postings) if flags & FLAG_POSITIONS else delta_encode(postings)
+            file.write(encoded)
+            terms += term_bytes
+            term_offsets.append(len(terms))
+            postings_offsets.append(postings_offsets[-1] + len(encoded))
+            doc_freqs.append(len(postings))
+
+        doc_ids = sorted(doc_ids)
+        universe_offset = file.tell()
+        file.write(delta_encode(doc_ids))
+        file.write(bytes(-file.tell() % 8))
+        dict_offset = file.tell()
+        for section in (term_offsets, postings_offsets, doc_freqs):
+            file.write(section.tobytes())
+        file.write(terms)
+        indexing.add(docs=len(doc_ids), bytes_written=file.tell())
+
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, VERSION, flags, len(doc_freqs), len(doc_ids), universe_offset, dict_offset))
+
+
+class BinaryIndex:
+    def __init__(self, index_filename):
+        with open(index_filename, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.flags, self.term_count, self.doc_count, self.universe_offset, self.dict_offset = \
+            HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{index_filename} is not a binary inverted index')
+        view = memoryview(self.map)
+        count = self.term_count
+        start = self.dict_offset
+        self.term_offsets = view[start:start + 4 * (count + 1)].cast('I')
+        start += 4 * (count + 1)
+        self.postings_offsets = view[start:start + 8 * (count + 1)].cast('Q')
+        start += 8 * (count + 1)
+        self.doc_freqs = view[start:start + 4 * count].cast('I')
+        start += 4 * count
+        self.terms_start = start
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.term_count
+
+    def __contains__(self, term):
+        return self.find(term) >= 0
+
+    def __getitem__(self, term):
+        position = self.find(term)
+        if position < 0:
+            raise KeyError(term)
+        return set(self.postings_at(position))
+
+    def find(self, term):
+        # Двоичный поиск по словарю; -1, если термина нет
+        term_bytes = term.encode()
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            current = self.term_at(middle)
+            if current < term_bytes:
+                low = middle + 1
+            elif current > term_bytes:
+                high = middle
+            else:
+                return middle
+        return -1
+
+    def term_at(self, position):
+        start = self.terms_start + self.term_offsets[position]
+        end = self.terms_start + self.term_offsets[position + 1]
+        return self.map[start:end]
+
+    def terms(self):
+        for position in range(self.term_count):
+            yield self.term_at(position).decode()
+
+    def doc_freq(self, term):
+        position = self.find(term)
+        return self.doc_freqs[position] if position >= 0 else 0
+
+    def postings(self, term):
+        position = self.find(term)
+        return self.postings_at(position) if position >= 0 else []
+
+    @property
+    def has_positions(self):
+        return bool(self.flags & FLAG_POSITIONS)
+
+    def postings_at(self, position):
+        data = self._postings_data(position)
+        if self.has_positions:
+            return positional_decode(data)[0]
+        return delta_decode(data)
+
+    def positional_postings(self, term):
+        # (номера документов, позиции термина в каждом из них)
+        if not self.has_positions:
+            raise ValueError('The index has no positions, rebuild it with task3/main.py --positions')
+        position = self.find(term)
+        return positional_decode(self._postings_data(position)) if position >= 0 else ([], [])
+
+    def _postings_data(self, position):
+        start = HEADER.size + self.postings_offsets[position]
+        end = HEADER.size + self.postings_offsets[position + 1]
+        return self.map[start:end]
+
+    def doc_ids(self):
+        # Нулевые байты выравнивания перед словарём не завершают ни одного числа и при декодировании отбрасываются
+        return delta_decode(self.map[self.universe_offset:self.dict_offset])
+
+    def close(self):
+        for view in (self.term_offsets, self.postings_offsets, self.doc_freqs):
+            view.release()
+        self.map.close()
+
+
+def convert_json_index(json_filename, index_filename):
+    with open(json_filename, 'r') as json_file:
+        data = json.load(json_file)
+    term_postings = {item['word']: sorted(item['inverted_array']) for item in data}
+    doc_ids = set()
+    for postings in term_postings.values():
+        doc_ids.update(postings)
+    write_index(index_filename, sorted_postings(term_postings), doc_ids)
+
+
+def sorted_postings(term_postings):
+    for term in sorted(term_postings, key=str.encode):
+        yield term, sorted(term_postings[term])
+
+
+def sorted_positional_postings(term_positions):
+    for term in sorted(term_positions, key=str.encode):
+        yield term, sorted(term_positions[term].items())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert a JSON inverted index into the binary format')
+    parser.add_argument('json_index')
+    parser.add_argument('binary_index')
+    args = parser.parse_args()
+    convert_json_index(args.json_index, args.binary_index)
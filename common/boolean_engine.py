@@ -0,0 +1,254 @@
+import re
+from bisect import bisect_left
+
+import numpy as np
+
+from common.nltk_resources import english_stopwords
+
+NEAR_OPERATOR = re.compile(r'NEAR/(\d+)')
+
+
+class Bitmap:
+    # Множество номеров документов в виде битовой маски из 64-битных слов
+    __slots__ = ('words',)
+
+    def __init__(self, words):
+        self.words = words
+
+    @classmethod
+    def empty(cls, word_count):
+        return cls(np.zeros(word_count, dtype=np.uint64))
+
+    @classmethod
+    def from_ids(cls, doc_ids, word_count):
+        bitmap = cls.empty(word_count)
+        doc_ids = np.asarray(doc_ids, dtype=np.uint64)
+        if len(doc_ids):
+            np.bitwise_or.at(bitmap.words, (doc_ids >> np.uint64(6)).astype(np.intp),
+                             np.uint64(1) << (doc_ids & np.uint64(63)))
+        return bitmap
+
+    def __and__(self, other):
+        return Bitmap(self.words & other.words)
+
+    def __or__(self, other):
+        return Bitmap(self.words | other.words)
+
+    def andnot(self, other):
+        return Bitmap(self.words & ~other.words)
+
+    def is_empty(self):
+        return not self.words.any()
+
+    def __len__(self):
+        return int(np.unpackbits(self.words.view(np.uint8)).sum())
+
+    def to_ids(self):
+        return np.flatnonzero(np.unpackbits(self.words.view(np.uint8), bitorder='little')).tolist()
+
+
+def gallop_intersect(small, large):
+    # Пересечение отсортированных списков: для каждого элемента короткого списка позиция в длинном
+    # ищется экспоненциальными шагами от предыдущей найденной, затем двоичным поиском
+    result = []
+    low = 0
+    size = len(large)
+    for value in small:
+        bound = 1
+        while low + bound < size and large[low + bound] < value:
+            bound *= 2
+        low = bisect_left(large, value, low, min(low + bound + 1, size))
+        if low == size:
+            break
+        if large[low] == value:
+            result.append(value)
+            low += 1
+    return result
+
+
+def has_phrase(position_lists, offsets):
+    # offsets — смещение каждого слова от начала фразы
+    starts = {position - offsets[0] for position in position_lists[0]}
+    for offset, positions in zip(offsets[1:], position_lists[1:]):
+        starts &= {position - offset for position in positions}
+        if not starts:
+            return False
+    return True
+
+
+def within_distance(positions1, positions2, distance):
+    i = j = 0
+    while i < len(positions1) and j < len(positions2):
+        if abs(positions1[i] - positions2[j]) <= distance:
+            return True
+        if positions1[i] < positions2[j]:
+            i += 1
+        else:
+            j += 1
+    return False
+
+
+def parse_postfix(postfix_tokens):
+    # Постфиксная запись -> дерево: ('term', t), ('phrase', [t1, t2, ...]), ('near', (k, t1, t2)),
+    # ('not', node), ('and', [nodes]), ('or', [nodes]);
+    # вложенные AND и OR сливаются в один узел с несколькими операндами
+    stack = []
+    for token in postfix_tokens:
+        near = NEAR_OPERATOR.fullmatch(token)
+        if near:
+            right = stack.pop()
+            left = stack.pop()
+            if left[0] != 'term' or right[0] != 'term':
+                raise ValueError(f'{token} operands must be single words')
+            stack.append(('near', (int(near.group(1)), left[1], right[1])))
+        elif token.startswith('"'):
+            terms = token.strip('"').split()
+            if not terms:
+                raise IndexError('empty phrase')
+            stack.append(('term', terms[0]) if len(terms) == 1 else ('phrase', terms))
+        elif token == 'NOT':
+            stack.append(('not', stack.pop()))
+        elif token in ('AND', 'OR'):
+            right = stack.pop()
+            left = stack.pop()
+            operator = token.lower()
+            operands = []
+            for node in (left, right):
+                operands.extend(node[1] if node[0] == operator else [node])
+            stack.append((operator, operands))
+        else:
+            stack.append(('term', token))
+    if len(stack) != 1:
+        raise IndexError('invalid query')
+    return stack[0]
+
+
+class BooleanEngine:
+    def __init__(self, index, stopwords=None):
+        self.index = index
+        self.stopwords = stopwords
+        doc_ids = index.doc_ids() if hasattr(index, 'doc_ids') else sorted(set().union(*index.values()))
+        self.word_count = (max(doc_ids, default=0) >> 6) + 1
+        self.universe = Bitmap.from_ids(doc_ids, self.word_count)
+        self.universe_size = len(doc_ids)
+
+    def search(self, postfix_tokens):
+        return self.evaluate(parse_postfix(postfix_tokens)).to_ids()
+
+    def doc_freq(self, term):
+        if hasattr(self.index, 'doc_freq'):
+            return self.index.doc_freq(term)
+        return len(self.index.get(term, ()))
+
+    def estimate(self, node):
+        # Оценка размера результата узла, по которой планировщик упорядочивает операнды
+        kind, value = node
+        if kind == 'term':
+            return self.doc_freq(value)
+        if kind == 'phrase':
+            return min(self.doc_freq(term) for _, term in self.phrase_terms(value))
+        if kind == 'near':
+            return min(self.doc_freq(self.indexed_term(value[1])), self.doc_freq(self.indexed_term(value[2])))
+        if kind == 'not':
+            return self.universe_size - self.estimate(value)
+        if kind == 'and':
+            return min(self.estimate(operand) for operand in value)
+        return min(self.universe_size, sum(self.estimate(operand) for operand in value))
+
+    def evaluate(self, node):
+        kind, value = node
+        if kind == 'term':
+            postings = self.index.postings(value) if hasattr(self.index, 'postings') else self.index.get(value, ())
+            return Bitmap.from_ids(sorted(postings), self.word_count)
+        if kind == 'phrase':
+            return Bitmap.from_ids(self.phrase_docs(value), self.word_count)
+        if kind == 'near':
+            return Bitmap.from_ids(self.near_docs(*value), self.word_count)
+        if kind == 'not':
+            return self.universe.andnot(self.evaluate(value))
+        if kind == 'or':
+            result = Bitmap.empty(self.word_count)
+            for operand in value:
+                result = result | self.evaluate(operand)
+            return result
+        return self.evaluate_and(value)
+
+    def evaluate_and(self, operands):
+        # Сначала пересекаются самые редкие операнды, NOT x превращается в вычитание (and-not),
+        # а как только промежуточный результат пуст, остальные операнды не вычисляются
+        positive = sorted((operand for operand in operands if operand[0] != 'not'), key=self.estimate)
+        negative = sorted((operand[1] for operand in operands if operand[0] == 'not'),
+                          key=self.estimate, reverse=True)
+        result = self.evaluate(positive[0]) if positive else self.universe
+        for operand in positive[1:]:
+            if result.is_empty():
+                return result
+            result = result & self.evaluate(operand)
+        for operand in negative:
+            if result.is_empty():
+                return result
+            result = result.andnot(self.evaluate(operand))
+        return result
+
+    def positional_postings(self, term):
+        if not hasattr(self.index, 'positional_postings'):
+            raise ValueError('Phrase and NEAR/k queries need a positional binary index (task3/main.py --positions)')
+        return self.index.positional_postings(term)
+
+    def candidate_docs(self, postings):
+        # Документы, содержащие все термины: пересечение начинается с самого короткого списка
+        doc_lists = sorted((doc_ids for doc_ids, _ in postings), key=len)
+        candidates = doc_lists[0]
+        for doc_ids in doc_lists[1:]:
+            if not candidates:
+                break
+            candidates = gallop_intersect(candidates, doc_ids)
+        return candidates
+
+    def is_stopword(self, term):
+        if self.stopwords is None:
+            self.stopwords = english_stopwords()
+        return term in self.stopwords
+
+    def phrase_terms(self, terms):
+        # Стоп-слов в индексе нет, но позиции в тексте они занимают: фраза проверяется по остальным словам
+        # с их смещениями ("state of the art" — state на позиции p, art на p + 3), стоп-слово внутри фразы
+        # совпадает с любым словом, а стоп-слова в начале и в конце не учитываются.
+        # Однобуквенные слова позиций не получают (см. tokenize) и смещение не сдвигают
+        offset_terms = []
+        offset = 0
+        for term in terms:
+            if len(term) < 2:
+                continue
+            if not self.is_stopword(term):
+                offset_terms.append((offset, term))
+            if offset_terms:
+                offset += 1
+        if not offset_terms:
+            raise ValueError(f'Phrase "{" ".join(terms)}" has only stopwords, which are not indexed')
+        return offset_terms
+
+    def indexed_term(self, term):
+        if len(term) < 2 or self.is_stopword(term):
+            raise ValueError(f'NEAR/k operand "{term}" is a stopword, which is not indexed')
+        return term
+
+    def phrase_docs(self, terms):
+        offsets, terms = zip(*self.phrase_terms(terms))
+        postings = [self.positional_postings(term) for term in terms]
+        result = []
+        for doc_id in self.candidate_docs(postings):
+            position_lists = [positions[bisect_left(doc_ids, doc_id)] for doc_ids, positions in postings]
+            if has_phrase(position_lists, offsets):
+                result.append(doc_id)
+        return result
+
+    def near_docs(self, distance, term1, term2):
+        postings = [self.positional_postings(self.indexed_term(term1)),
+                    self.positional_postings(self.indexed_term(term2))]
+        result = []
+        for doc_id in self.candidate_docs(postings):
+            positions1, positions2 = (positions[bisect_left(doc_ids, doc_id)] for doc_ids, positions in postings)
+            if within_distance(positions1, positions2, distance):
+                result.append(doc_id)
+        return result
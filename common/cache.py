@@ -0,0 +1,59 @@
+import hashlib
+import logging
+import os
+import pickle
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / 'cache'
+KEEP_ARTIFACTS = 3
+
+
+def content_key(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    # Промежуточные результаты, адресуемые хешем входных данных: cache/<этап>/<ключ>.pkl
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = Path(directory)
+
+    def path(self, stage, key):
+        return self.directory / stage / f'{key}.pkl'
+
+    def load(self, stage, key):
+        path = self.path(stage, key)
+        if not path.is_file():
+            return None
+        with open(path, 'rb') as file:
+            artifact = pickle.load(file)
+        os.utime(path)
+        return artifact
+
+    def save(self, stage, key, artifact):
+        path = self.path(stage, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(artifact, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._prune(stage)
+
+    def get_or_build(self, stage, key, build):
+        artifact = self.load(stage, key)
+        if artifact is None:
+            artifact = build()
+            self.save(stage, key, artifact)
+        else:
+            logger.info(f'Using cached {stage} ({key[:12]})')
+        return artifact
+
+    def _prune(self, stage):
+        artifacts = sorted((self.directory / stage).glob('*.pkl'), key=os.path.getmtime, reverse=True)
+        for path in artifacts[KEEP_ARTIFACTS:]:
+            path.unlink()
@@ -0,0 +1,78 @@
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from bs4 import BeautifulSoup as bs, CData
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARSER = 'html.parser'
+FAST_PARSER = 'lxml'
+
+
+def available_parser(parser):
+    # lxml — необязательная зависимость; без неё используется встроенный html.parser
+    if parser == FAST_PARSER:
+        try:
+            import lxml  # noqa: F401
+        except ImportError:
+            logger.warning('lxml is not installed, falling back to html.parser')
+            return DEFAULT_PARSER
+    return parser
+
+
+def clean_html(html, parser=DEFAULT_PARSER):
+    # html.parser и lxml должны давать одинаковый текст: lxml сам достраивает <body> и превращает CDATA
+    # в комментарий, поэтому для html.parser фрагмент без <body> читается целиком (кроме <head> и <title>),
+    # а CDATA отбрасывается
+    soup = bs(html, features=parser)
+    for tag in soup(["script", "style", "head", "title"]):
+        tag.extract()
+    for cdata in soup.find_all(string=lambda string: isinstance(string, CData)):
+        cdata.extract()
+
+    body = soup.find('body')
+    text = (soup if body is None else body).get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+
+def clean_chunk(chunk, parser):
+    return [(doc_id, clean_html(html, parser)) for doc_id, html in chunk]
+
+
+def chunked(pages, chunk_size):
+    chunk = []
+    for page in pages:
+        chunk.append(page)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def extract_pages(pages, parser=DEFAULT_PARSER, workers=None, chunk_size=16, process_chunk=clean_chunk):
+    # Пары (номер, html) раздаются процессам пачками; в работе держится не больше 2 пачек на процесс,
+    # результаты (номер, текст) отдаются по мере готовности, без сохранения порядка.
+    # process_chunk позволяет выполнить в тех же процессах и следующую обработку текста
+    parser = available_parser(parser)
+    workers = workers or os.cpu_count()
+    chunks = chunked(pages, chunk_size)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+        for chunk in chunks:
+            in_flight.add(executor.submit(process_chunk, chunk, parser))
+            if len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        for future in in_flight:
+            yield from future.result()
+
+
+def add_extraction_args(parser):
+    parser.add_argument('--workers', type=int, default=None, help='число процессов для извлечения текста')
+    parser.add_argument('--parser', choices=[DEFAULT_PARSER, FAST_PARSER], default=DEFAULT_PARSER)
+    parser.add_argument('--chunk-size', type=int, default=16)
@@ -0,0 +1,58 @@
+from functools import lru_cache
+
+from common.nltk_resources import wordnet_lemmatizer
+
+PARTS_OF_SPEECH = ["a", "s", "r", "n", "v"]
+DEFAULT_CACHE_SIZE = 100_000
+
+
+class LemmaService:
+    # Лемматизация через таблицу токен -> леммы, построенную при индексации.
+    # Токены, которых нет в таблице, лемматизируются WordNet (загружается только при первом промахе)
+    # и запоминаются в ограниченном LRU-кеше
+    def __init__(self, table=None, cache_size=DEFAULT_CACHE_SIZE, fallback=True):
+        self.table = table or {}
+        self.fallback = fallback
+        self.wordnet = None
+        self.lemmatize_missing = lru_cache(maxsize=cache_size)(self._lemmatize_with_wordnet)
+
+    @classmethod
+    def load(cls, table_file, **kwargs):
+        table = {}
+        with open(table_file, 'r') as file:
+            for line in file:
+                token, _, lemmas = line.partition(':')
+                table[token.strip()] = tuple(lemmas.split())
+        return cls(table, **kwargs)
+
+    def save(self, table_file):
+        with open(table_file, 'w') as file:
+            for token, lemmas in sorted(self.table.items()):
+                file.write(f'{token}: {" ".join(lemmas)}\n')
+
+    def lemmas(self, token):
+        # Леммы токена для всех частей речи в порядке PARTS_OF_SPEECH, без повторов
+        lemmas = self.table.get(token)
+        if lemmas is None:
+            lemmas = self.lemmatize_missing(token) if self.fallback else ()
+        return lemmas
+
+    def lemmatize_batch(self, tokens):
+        # Каждый различный токен лемматизируется один раз; результат пополняет таблицу
+        for token in set(tokens):
+            if token not in self.table:
+                self.table[token] = self._lemmatize_with_wordnet(token)
+        return {token: self.table[token] for token in tokens}
+
+    def cache_info(self):
+        return self.lemmatize_missing.cache_info()
+
+    def _lemmatize_with_wordnet(self, token):
+        if self.wordnet is None:
+            self.wordnet = wordnet_lemmatizer()
+        lemmas = []
+        for part_of_speech in PARTS_OF_SPEECH:
+            lemma = self.wordnet.lemmatize(token, part_of_speech)
+            if lemma not in lemmas:
+                lemmas.append(lemma)
+        return tuple(lemmas)
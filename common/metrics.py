@@ -0,0 +1,288 @@
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Счётчики, показатели и гистограммы в памяти процесса; render() отдаёт их в текстовом формате Prometheus.
+# Сборочные скрипты пишут итог в файл (--metrics), сервер task5 — на /metrics
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def label_text(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f'{self.name} expects labels {self.labels}, got {tuple(labels)}')
+        return tuple(labels[name] for name in self.labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{label_text(self.labels, key)} {format_value(value)}')
+        return lines
+
+
+class CounterMetric(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self.lock:
+            return self.values.get(self.key(labels), 0)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            # счётчики по корзинам, сумма и число наблюдений
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    bucket_labels = label_text(self.labels + ('le',), key + (format_value(bound),))
+                    lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+                lines.append(f'{self.name}_sum{label_text(self.labels, key)} {format_value(total)}')
+                lines.append(f'{self.name}_count{label_text(self.labels, key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def register(self, metric):
+        # Повторная регистрация с тем же именем возвращает уже созданную метрику
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(CounterMetric(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        with self.lock:
+            metrics = [self.metrics[name] for name in sorted(self.metrics)]
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+REGISTRY = Registry()
+
+# Этапы сборки: время и объём работы по имени этапа
+STAGE_SECONDS = REGISTRY.counter('infosearch_stage_seconds_total', 'Time spent in a build stage', ['stage'])
+STAGE_RUNS = REGISTRY.counter('infosearch_stage_runs_total', 'Build stage runs', ['stage'])
+STAGE_DOCS = REGISTRY.counter('infosearch_stage_docs_total', 'Documents processed by a build stage', ['stage'])
+STAGE_TOKENS = REGISTRY.counter('infosearch_stage_tokens_total', 'Tokens processed by a build stage', ['stage'])
+STAGE_BYTES_READ = REGISTRY.counter('infosearch_stage_bytes_read_total', 'Bytes read by a build stage', ['stage'])
+STAGE_BYTES_WRITTEN = REGISTRY.counter('infosearch_stage_bytes_written_total', 'Bytes written by a build stage',
+                                       ['stage'])
+
+
+class Stage:
+    # Итог одного этапа; время — настенное (stage) или сумма времени рабочих процессов (record_stage)
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.docs = 0
+        self.tokens = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def add(self, docs=0, tokens=0, bytes_read=0, bytes_written=0):
+        self.docs += docs
+        self.tokens += tokens
+        self.bytes_read += bytes_read
+        self.bytes_written += bytes_written
+
+    def record(self):
+        STAGE_RUNS.inc(stage=self.name)
+        STAGE_SECONDS.inc(self.seconds, stage=self.name)
+        STAGE_DOCS.inc(self.docs, stage=self.name)
+        STAGE_TOKENS.inc(self.tokens, stage=self.name)
+        STAGE_BYTES_READ.inc(self.bytes_read, stage=self.name)
+        STAGE_BYTES_WRITTEN.inc(self.bytes_written, stage=self.name)
+        logger.info(self.summary())
+
+    def summary(self):
+        parts = [f'{self.seconds:.2f}s']
+        if self.docs:
+            parts.append(f'{self.docs} docs ({self.rate(self.docs):.1f} docs/sec)')
+        if self.tokens:
+            parts.append(f'{self.tokens} tokens ({self.rate(self.tokens):.0f} tokens/sec)')
+        if self.bytes_read:
+            parts.append(f'read {self.bytes_read / 2 ** 20:.1f} MB')
+        if self.bytes_written:
+            parts.append(f'wrote {self.bytes_written / 2 ** 20:.1f} MB')
+        return f'Stage {self.name}: ' + ', '.join(parts)
+
+    def rate(self, amount):
+        return amount / self.seconds if self.seconds else 0.0
+
+
+@contextmanager
+def stage(name):
+    current = Stage(name)
+    start = time.perf_counter()
+    yield current
+    current.seconds = time.perf_counter() - start
+    current.record()
+
+
+def record_stage(name, seconds, **amounts):
+    current = Stage(name)
+    current.seconds = seconds
+    current.add(**amounts)
+    current.record()
+
+
+def path_size(path):
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size
+    return sum(file.stat().st_size for file in path.rglob('*') if file.is_file())
+
+
+def setup_logging(stream=sys.stdout):
+    # Модули common/ пишут о ходе сборки в logging; выводят его только скрипты, которые это вызвали,
+    # поэтому search.py и сервер не получают в stdout строки этапов
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=stream)
+
+
+def add_metrics_args(parser):
+    parser.add_argument('--metrics', default=None, help='сохранить метрики сборки в файл в формате Prometheus')
+
+
+def save_metrics(metrics_file, registry=REGISTRY):
+    # Файл можно отдать node_exporter (textfile collector); запись через временный файл
+    if not metrics_file:
+        return
+    tmp_file = f'{metrics_file}.tmp'
+    with open(tmp_file, 'w') as file:
+        file.write(registry.render())
+    os.replace(tmp_file, metrics_file)
+
+
+class SamplingProfiler:
+    # Раз в interval секунд снимает стеки всех потоков, кроме своего; collapsed() — строки
+    # «кадр;кадр;... число», которые понимают flamegraph.pl и speedscope
+    def __init__(self, interval=0.01, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def start(self):
+        # Потоки не переживают fork (gunicorn --preload), поэтому в дочернем процессе поток запускается заново
+        os.register_at_fork(after_in_child=self.restart_in_child)
+        self.start_thread()
+        return self
+
+    def start_thread(self):
+        threading.Thread(target=self.run, name='sampling-profiler', daemon=True).start()
+
+    def restart_in_child(self):
+        self.lock = threading.Lock()
+        self.samples = Counter()
+        if not self.stopped.is_set():
+            self.start_thread()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    names.append(f'{Path(frame.f_code.co_filename).name}:{frame.f_code.co_name}')
+                    frame = frame.f_back
+                key = ';'.join(reversed(names))
+                with self.lock:
+                    self.samples[key] += 1
+
+    def collapsed(self):
+        with self.lock:
+            return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
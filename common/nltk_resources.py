@@ -0,0 +1,39 @@
+from functools import lru_cache
+
+# Ресурсы NLTK читаются только с диска и только при первом обращении: запуск не ходит в сеть
+# и не загружает словари, которые не нужны. Установить ресурсы один раз:
+#   python -m nltk.downloader words stopwords wordnet
+RESOURCES = {
+    'words': 'corpora/words',
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet',
+}
+
+
+def require(name):
+    import nltk
+    try:
+        nltk.data.find(RESOURCES[name])
+    except LookupError:
+        raise LookupError(f"NLTK resource '{name}' is not installed, "
+                          f"install it once with: python -m nltk.downloader {name}") from None
+
+
+@lru_cache(maxsize=None)
+def english_words():
+    require('words')
+    from nltk.corpus import words
+    return frozenset(words.words())
+
+
+@lru_cache(maxsize=None)
+def english_stopwords():
+    require('stopwords')
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english'))
+
+
+def wordnet_lemmatizer():
+    require('wordnet')
+    from nltk.stem import WordNetLemmatizer
+    return WordNetLemmatizer()
@@ -0,0 +1,253 @@
+import mmap
+import os
+import shutil
+import struct
+import zlib
+from pathlib import Path
+
+# Хранилище страниц: append-only сегменты со сжатыми записями и индекс смещений.
+# Запись в сегменте: заголовок (номер документа, длина, crc32) + zlib-сжатый html.
+# Запись в index.dat: номер документа, номер сегмента, смещение и длина записи;
+# более поздняя запись для того же документа замещает предыдущую, длина 0 означает удаление.
+INDEX_FILE = 'index.dat'
+TEMP_INDEX_FILE = 'index.dat.tmp'
+SEGMENT_PATTERN = 'segment-{:05d}.dat'
+SEGMENT_GLOB = 'segment-*.dat'
+INDEX_ENTRY = struct.Struct('<IIQI')
+RECORD_HEADER = struct.Struct('<III')
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+# Доля замещённых и удалённых байтов, после которой compact_if_needed переписывает хранилище
+COMPACT_THRESHOLD = 0.5
+
+
+class PageStore:
+    def __init__(self, directory, segment_size=DEFAULT_SEGMENT_SIZE, compression_level=6):
+        self.directory = Path(directory)
+        self.segment_size = segment_size
+        self.compression_level = compression_level
+        self.locations = {}
+        self.maps = {}
+        self.segment_file = None
+        self.index_file = None
+        self.segment_number = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def exists(directory):
+        return (Path(directory) / INDEX_FILE).is_file()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, doc_id):
+        return doc_id in self.locations
+
+    def __len__(self):
+        return len(self.locations)
+
+    def doc_ids(self):
+        return sorted(self.locations)
+
+    def put(self, doc_id, html):
+        self._open_for_writing()
+        data = zlib.compress(html.encode(), self.compression_level)
+        self._append_record(doc_id, RECORD_HEADER.pack(doc_id, len(data), zlib.crc32(data)) + data)
+
+    def delete(self, doc_id):
+        if doc_id in self.locations:
+            self._open_for_writing()
+            self._write_location(doc_id, 0, 0, 0)
+
+    def get(self, doc_id):
+        segment, offset, length = self.locations[doc_id]
+        if self.segment_file is not None:
+            self.segment_file.flush()
+        segment_map = self._segment_map(segment)
+        record_doc_id, data_length, crc = RECORD_HEADER.unpack_from(segment_map, offset)
+        start = offset + RECORD_HEADER.size
+        data = segment_map[start:start + data_length]
+        if record_doc_id != doc_id or zlib.crc32(data) != crc:
+            raise ValueError(f'Corrupted record for document {doc_id} in segment {segment}')
+        return zlib.decompress(data).decode()
+
+    def iter_pages(self, doc_ids=None):
+        # Потоковый обход в порядке номеров документов: в памяти держится только текущая страница.
+        # doc_ids — только эти документы (отсутствующие пропускаются), остальные записи не читаются
+        selected = self.doc_ids() if doc_ids is None else sorted(set(doc_ids) & self.locations.keys())
+        for doc_id in selected:
+            yield doc_id, self.get(doc_id)
+
+    def compact(self):
+        # Живые записи копируются в сегменты с новыми номерами, рядом пишется новый индекс, который атомарно
+        # подменяет index.dat; старые сегменты удаляются только после этого. Если процесс упадёт раньше,
+        # index.dat по-прежнему указывает на старые сегменты, а недописанные новые удалит следующее сжатие
+        self.close()
+        shutil.rmtree(self.directory / 'compacting', ignore_errors=True)
+        old_segments = []
+        for segment in self.directory.glob(SEGMENT_GLOB):
+            if int(segment.stem.split('-')[1]) > self.segment_number:
+                segment.unlink()
+            else:
+                old_segments.append(segment)
+        old_locations = self.locations
+        self.locations = {}
+        self.segment_number += 1
+        temp_index = self.directory / TEMP_INDEX_FILE
+        self.segment_file = open(self._segment_path(self.segment_number), 'ab')
+        self.index_file = open(temp_index, 'wb')
+        for doc_id in sorted(old_locations):
+            segment, offset, length = old_locations[doc_id]
+            self._append_record(doc_id, self._segment_map(segment)[offset:offset + length])
+        for file in (self.segment_file, self.index_file):
+            file.flush()
+            os.fsync(file.fileno())
+        self.close()
+        os.replace(temp_index, self.directory / INDEX_FILE)
+        for segment in old_segments:
+            segment.unlink()
+
+    def garbage_ratio(self):
+        # Доля байтов сегментов и index.dat, которые уже не относятся ни к одной живой записи
+        if self.segment_file is not None:
+            self.segment_file.flush()
+            self.index_file.flush()
+        total = sum(segment.stat().st_size for segment in self.directory.glob(SEGMENT_GLOB))
+        index_path = self.directory / INDEX_FILE
+        total += index_path.stat().st_size if index_path.is_file() else 0
+        live = sum(length for _, _, length in self.locations.values()) + INDEX_ENTRY.size * len(self.locations)
+        return 1 - live / total if total else 0.0
+
+    def compact_if_needed(self, threshold=COMPACT_THRESHOLD):
+        if self.garbage_ratio() <= threshold:
+            return False
+        self.compact()
+        return True
+
+    def close(self):
+        for segment_map in self.maps.values():
+            segment_map.close()
+        self.maps = {}
+        for file in (self.segment_file, self.index_file):
+            if file is not None:
+                file.close()
+        self.segment_file = None
+        self.index_file = None
+
+    def _load_index(self):
+        index_path = self.directory / INDEX_FILE
+        if not index_path.is_file():
+            return
+        with open(index_path, 'rb') as file:
+            data = file.read()
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        for doc_id, segment, offset, length in INDEX_ENTRY.iter_unpack(data[:usable]):
+            if length:
+                self.locations[doc_id] = (segment, offset, length)
+            else:
+                self.locations.pop(doc_id, None)
+            self.segment_number = max(self.segment_number, segment)
+
+    def _open_for_writing(self):
+        if self.segment_file is None:
+            self.segment_file = open(self._segment_path(self.segment_number), 'ab')
+            self.index_file = open(self.directory / INDEX_FILE, 'ab')
+
+    def _append_record(self, doc_id, record):
+        if self.segment_file.tell() > 0 and self.segment_file.tell() + len(record) > self.segment_size:
+            self._roll_segment()
+        offset = self.segment_file.tell()
+        self.segment_file.write(record)
+        self._write_location(doc_id, self.segment_number, offset, len(record))
+
+    def _roll_segment(self):
+        self.segment_file.close()
+        self.segment_number += 1
+        self.segment_file = open(self._segment_path(self.segment_number), 'ab')
+
+    def _write_location(self, doc_id, segment, offset, length):
+        self.index_file.write(INDEX_ENTRY.pack(doc_id, segment, offset, length))
+        if length:
+            self.locations[doc_id] = (segment, offset, length)
+        else:
+            self.locations.pop(doc_id, None)
+
+    def _segment_map(self, segment):
+        segment_map = self.maps.get(segment)
+        size = os.path.getsize(self._segment_path(segment))
+        if segment_map is None or len(segment_map) < size:
+            if segment_map is not None:
+                segment_map.close()
+            with open(self._segment_path(segment), 'rb') as file:
+                segment_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[segment] = segment_map
+        return segment_map
+
+    def _segment_path(self, segment):
+        return self.directory / SEGMENT_PATTERN.format(segment)
+
+
+class DirectoryPages:
+    # Старый формат: по одному файлу N.txt на страницу, с тем же интерфейсом записи, что у PageStore
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, doc_id):
+        return self._page_path(doc_id).is_file()
+
+    def put(self, doc_id, html):
+        with open(self._page_path(doc_id), 'w') as html_file:
+            html_file.write(html)
+
+    def delete(self, doc_id):
+        self._page_path(doc_id).unlink(missing_ok=True)
+
+    def get(self, doc_id):
+        with open(self._page_path(doc_id), 'r') as html_file:
+            return html_file.read()
+
+    def close(self):
+        pass
+
+    def _page_path(self, doc_id):
+        return self.directory / f'{doc_id}.txt'
+
+
+def open_pages(directory, page_format='store'):
+    return PageStore(directory) if page_format == 'store' else DirectoryPages(directory)
+
+
+def iter_pages(directory, doc_ids=None):
+    # Страницы из хранилища или, для старых выгрузок, из файлов N.txt — по возрастанию номера;
+    # doc_ids — только эти документы
+    if PageStore.exists(directory):
+        with PageStore(directory) as store:
+            yield from store.iter_pages(doc_ids)
+        return
+    files = [file for file in os.listdir(directory) if file.endswith('txt')]
+    if doc_ids is not None:
+        doc_ids = set(doc_ids)
+        files = [file for file in files if page_number(file) in doc_ids]
+    for file in sorted(files, key=page_sort_key):
+        with open(f'{directory}/{file}', 'r') as page_file:
+            yield page_number(file), page_file.read()
+
+
+def page_number(filename):
+    stem = Path(filename).stem
+    return int(stem) if stem.isdigit() else stem
+
+
+def page_sort_key(filename):
+    number = page_number(filename)
+    return (0, number, '') if isinstance(number, int) else (1, 0, number)
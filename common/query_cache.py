@@ -0,0 +1,86 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 600
+
+
+def result_size(key, result):
+    return sys.getsizeof(key) + sys.getsizeof(result) + sum(sys.getsizeof(item) for item in result)
+
+
+class QueryCache:
+    # LRU-кеш результатов запросов с ограничением по числу записей, по памяти и по времени жизни.
+    # Записи относятся к версии индекса: при смене версии кеш очищается целиком
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL,
+                 version=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = version
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def set_version(self, version):
+        with self.lock:
+            if version != self.version:
+                self.version = version
+                self.entries.clear()
+                self.bytes = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, result):
+        size = result_size(key, result)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (result, time.monotonic(), size)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def get_or_compute(self, key, compute):
+        result = self.get(key)
+        if result is None:
+            result = compute()
+            self.put(key, result)
+        return result
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+            }
+
+    def _remove(self, key):
+        _, _, size = self.entries.pop(key)
+        self.bytes -= size
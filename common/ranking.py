@@ -0,0 +1,157 @@
+import numpy as np
+from scipy import sparse
+
+# Запас при сравнении верхних границ с порогом: границы и точные оценки складываются в разном порядке
+BOUND_SLACK = 1e-9
+
+
+def normalize_query(query_tfidf):
+    # Разреженный вектор запроса: номера столбцов и нормированные веса
+    columns = np.fromiter(query_tfidf.keys(), dtype=np.int64, count=len(query_tfidf))
+    weights = np.fromiter(query_tfidf.values(), dtype=np.float64, count=len(query_tfidf))
+    norm = np.linalg.norm(weights)
+    if norm == 0:
+        return columns[:0], weights[:0]
+    return columns, weights / norm
+
+
+def score_documents(columns, weights, postings):
+    # Косинусная мера только по документам, где встречаются леммы запроса: векторы документов
+    # уже нормированы, поэтому скалярное произведение собирается из строк postings (лемма -> документы)
+    doc_rows = []
+    doc_scores = []
+    for j, weight in zip(columns, weights):
+        start, end = postings.indptr[j], postings.indptr[j + 1]
+        doc_rows.append(postings.indices[start:end])
+        doc_scores.append(postings.data[start:end] * weight)
+    if not doc_rows:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    rows, inverse = np.unique(np.concatenate(doc_rows), return_inverse=True)
+    scores = np.bincount(inverse, weights=np.concatenate(doc_scores), minlength=len(rows))
+    return rows, scores
+
+
+def top_documents(rows, scores, k):
+    # k лучших через argpartition; при равной мере выше документ с меньшим номером строки
+    positive = scores > 0
+    rows, scores = rows[positive], scores[positive]
+    if len(rows) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        # на границе могут оказаться документы с той же мерой, что и k-й: берутся все и сортируются
+        threshold = scores[best].min()
+        best = np.flatnonzero(scores >= threshold)
+        rows, scores = rows[best], scores[best]
+    order = np.lexsort((rows, -scores))[:k]
+    return rows[order], scores[order]
+
+
+def normalize_rows(matrix):
+    # Евклидова норма каждой строки одной операцией; пустые строки остаются нулевыми
+    matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+    matrix.sort_indices()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    matrix.data *= np.repeat(inverse_norms, np.diff(matrix.indptr))
+    return matrix
+
+
+def upper_bounds(postings):
+    # Наибольший вес каждой леммы по всем документам — верхняя граница её вклада в оценку
+    result = np.zeros(postings.shape[0])
+    nonempty = np.diff(postings.indptr) > 0
+    if nonempty.any():
+        result[nonempty] = np.maximum.reduceat(postings.data, postings.indptr[:-1][nonempty])
+    return result
+
+
+def term_contributions(rows, data, weight, candidates):
+    # Вклад леммы в оценку каждого кандидата (0, если леммы в документе нет): двоичный поиск по её списку
+    found = np.searchsorted(rows, candidates)
+    found = np.minimum(found, len(rows) - 1)
+    return np.where(rows[found] == candidates, data[found] * weight, 0.0)
+
+
+class RankedEngine:
+    # Точный top-k по косинусной мере с отсечением MaxScore, векторизованным по numpy:
+    # 1) точные оценки документов леммы с наибольшей верхней границей вклада дают нижнюю оценку порога —
+    #    k-го результата;
+    # 2) леммы с наименьшими границами, сумма которых не дотягивает до порога, не порождают кандидатов:
+    #    документ только с ними в top-k не попадёт;
+    # 3) кандидаты — объединение списков остальных лемм, их точные оценки собираются двоичным поиском
+    #    по спискам всех лемм запроса.
+    # Выигрыш — на запросах с частыми леммами (длинные списки с малым idf), где exhaustive
+    # сливает и сортирует все их документы; если отсечь нечего, работает exhaustive
+    def __init__(self, postings, max_weights):
+        self.postings = postings
+        self.max_weights = max_weights
+
+    def exhaustive(self, query_tfidf, k):
+        columns, weights = normalize_query(query_tfidf)
+        return top_documents(*score_documents(columns, weights, self.postings), k)
+
+    def query_terms(self, query_tfidf):
+        # (граница вклада, порядок в запросе, документы, веса, вес леммы в запросе) по возрастанию границы
+        columns, weights = normalize_query(query_tfidf)
+        terms = []
+        for order, (j, weight) in enumerate(zip(columns, weights)):
+            start, end = self.postings.indptr[j], self.postings.indptr[j + 1]
+            bound = weight * self.max_weights[j]
+            if end > start and bound > 0:
+                terms.append((bound, order, self.postings.indices[start:end],
+                              self.postings.data[start:end], weight))
+        terms.sort(key=lambda term: term[0])
+        return terms
+
+    def exact_scores(self, terms, candidates):
+        # Вклады складываются в порядке лемм запроса, как в score_documents, поэтому оценки совпадают побитно
+        scores = np.zeros(len(candidates))
+        for _, _, rows, data, weight in sorted(terms, key=lambda term: term[1]):
+            scores += term_contributions(rows, data, weight, candidates)
+        return scores
+
+    def top_k(self, query_tfidf, k):
+        terms = self.query_terms(query_tfidf)
+        if len(terms) < 2:
+            return self.exhaustive(query_tfidf, k)
+        seed = terms[-1][2]
+        seed_scores = self.exact_scores(terms, seed)
+        if len(seed) < k:
+            return self.exhaustive(query_tfidf, k)
+        threshold = np.partition(seed_scores, len(seed) - k)[len(seed) - k]
+        # bounds[i] — наибольшая оценка документа, в котором есть только леммы 0..i; строгое сравнение
+        # с запасом гарантирует, что отброшенный документ хуже k-го и не спорит с ним при равенстве
+        bounds = np.cumsum([term[0] for term in terms]) * (1 + BOUND_SLACK)
+        first_essential = int(np.searchsorted(bounds, threshold, side='left'))
+        if first_essential == 0:
+            return self.exhaustive(query_tfidf, k)
+        candidates = np.unique(np.concatenate([term[2] for term in terms[first_essential:]]))
+        return top_documents(candidates, self.exact_scores(terms, candidates), k)
+
+
+def query_matrix(query_tfidfs, term_count):
+    # Запросы x леммы: по строке нормированного вектора на запрос
+    indptr = [0]
+    indices = [np.empty(0, dtype=np.int64)]
+    data = [np.empty(0)]
+    for query_tfidf in query_tfidfs:
+        columns, weights = normalize_query(query_tfidf)
+        indices.append(columns)
+        data.append(weights)
+        indptr.append(indptr[-1] + len(columns))
+    return sparse.csr_matrix((np.concatenate(data), np.concatenate(indices), indptr),
+                             shape=(len(query_tfidfs), term_count))
+
+
+def batch_top_k(query_tfidfs, postings, k, block_size=256):
+    # Запросы оцениваются блоками по block_size одним умножением (запросы x леммы) @ postings (леммы x документы).
+    # Произведение остаётся разреженным: в строке только документы, где есть хотя бы одна лемма запроса,
+    # поэтому память зависит от числа совпадений, а не от размера коллекции
+    queries = query_matrix(query_tfidfs, postings.shape[0])
+    results = []
+    for start in range(0, queries.shape[0], block_size):
+        block = sparse.csr_matrix(queries[start:start + block_size] @ postings)
+        for i in range(block.shape[0]):
+            row_start, row_end = block.indptr[i], block.indptr[i + 1]
+            results.append(top_documents(block.indices[row_start:row_end].astype(np.int64),
+                                         block.data[row_start:row_end], k))
+    return results
@@ -0,0 +1,344 @@
+import fcntl
+import heapq
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from common.analysis import (build_lemma_positions, build_lemma_postings, build_postings, get_lemmas,
+                             remove_stopwords)
+from common.binary_index import (FLAG_POSITIONS, BinaryIndex, sorted_positional_postings, sorted_postings,
+                                 write_index)
+from common.boolean_engine import BooleanEngine
+from common.lemmatizer import LemmaService
+from common.ranking import RankedEngine, normalize_rows, upper_bounds
+from common.sparse_store import load_array, load_csr, load_terms, save_csr
+from common.tfidf import build_count_matrix, inverse_document_frequencies, termin_lemma_counts, tf_idf_weights
+from common.vector_snapshot import CURRENT_FILE, current_dir, load_index, publish
+
+logger = logging.getLogger(__name__)
+
+# Индекс из неизменяемых сегментов. Сегмент — каталог seg-* с частотами токенов его документов,
+# таблицей лемм, булевым индексом лемм и ссылками. Набор сегментов и удалённые в каждом из них документы
+# (tombstones) перечислены в манифесте manifest-<поколение>.json; новый манифест публикуется через
+# указатель CURRENT, поэтому читатель всегда видит согласованный набор. Словарь, idf и нормы векторов
+# считаются при открытии среза, так что оценки совпадают с полной пересборкой по живым документам;
+# сервер task5 открывает новый срез в фоновом потоке (SnapshotHolder), не задерживая запросы
+SEGMENT_PREFIX = 'seg-'
+MANIFEST_PREFIX = 'manifest-'
+LOCK_FILE = 'lock'
+MERGE_LOCK_FILE = 'merge.lock'
+KEEP_MANIFESTS = 3
+# Слияние: MERGE_FACTOR сегментов одного уровня размера сливаются в один;
+# сегмент, где удалено больше EXPUNGE_RATIO документов, переписывается без них
+MERGE_FACTOR = 4
+EXPUNGE_RATIO = 0.5
+
+
+def write_segment(directory, doc_ids, tokens, token_count_matrix, doc_word_sums, token_lemmas, urls,
+                  lemma_postings=None, lemma_positions=None):
+    directory = Path(directory)
+    save_csr(directory / 'tokens', token_count_matrix, tokens, doc_ids=doc_ids, doc_word_sums=doc_word_sums)
+    LemmaService({token: token_lemmas[token] for token in tokens}).save(directory / 'lemma_table.txt')
+    if lemma_positions is not None:
+        write_index(directory / 'inverted_index.bin', sorted_positional_postings(lemma_positions), doc_ids,
+                    FLAG_POSITIONS)
+    else:
+        write_index(directory / 'inverted_index.bin', sorted_postings(lemma_postings), doc_ids)
+    with open(directory / 'index.txt', 'w') as file:
+        for doc_id in doc_ids:
+            file.write(f'{doc_id}. {urls[doc_id]}\n')
+
+
+def write_document_segment(directory, token_counts, token_positions, token_lemmas, urls):
+    # Сегмент из только что разобранных документов: token_counts — {номер: Counter токенов}
+    doc_ids = sorted(token_counts)
+    vocabulary = set()
+    for doc_id in doc_ids:
+        vocabulary.update(token_counts[doc_id])
+    tokens = remove_stopwords(sorted(vocabulary))
+    token_count_dicts = [token_counts[doc_id] for doc_id in doc_ids]
+    lemmas = get_lemmas(tokens, token_lemmas)
+    lemma_postings = build_lemma_postings(lemmas, build_postings(token_counts, tokens))
+    lemma_positions = build_lemma_positions(lemmas, token_positions) if token_positions is not None else None
+    write_segment(directory, doc_ids, tokens, build_count_matrix(token_count_dicts, tokens),
+                  [sum(counts.values()) for counts in token_count_dicts], token_lemmas, urls,
+                  lemma_postings, lemma_positions)
+
+
+class Segment:
+    def __init__(self, directory, deleted=()):
+        directory = Path(directory)
+        self.directory = directory
+        self.name = directory.name
+        self.deleted = set(deleted)
+        self.index = BinaryIndex(str(directory / 'inverted_index.bin'))
+        self.counts = load_csr(directory / 'tokens')
+        self.tokens = load_terms(directory / 'tokens')
+        self.doc_ids = load_array(directory / 'tokens', 'doc_ids')
+        self.doc_word_sums = load_array(directory / 'tokens', 'doc_word_sums')
+        self.live_rows = np.flatnonzero(~np.isin(self.doc_ids, list(self.deleted)))
+        self.boolean_engine = None
+
+    def token_lemmas(self):
+        return LemmaService.load(self.directory / 'lemma_table.txt').table
+
+    def urls(self):
+        return load_index(self.directory / 'index.txt')
+
+    def search(self, postfix_tokens):
+        # NOT считается относительно всех документов сегмента, удалённые отбрасываются из результата
+        if self.boolean_engine is None:
+            self.boolean_engine = BooleanEngine(self.index)
+        return [doc_id for doc_id in self.boolean_engine.search(postfix_tokens) if doc_id not in self.deleted]
+
+    def live_postings(self):
+        # Лемма -> живые документы (или {документ: позиции}, если индекс позиционный)
+        postings = {}
+        for position, term in enumerate(self.index.terms()):
+            if self.index.has_positions:
+                doc_ids, positions = self.index.positional_postings(term)
+                live = {doc_id: doc_positions for doc_id, doc_positions in zip(doc_ids, positions)
+                        if doc_id not in self.deleted}
+            else:
+                live = {doc_id for doc_id in self.index.postings_at(position) if doc_id not in self.deleted}
+            if live:
+                postings[term] = live
+        return postings
+
+
+def stack_live_counts(segments):
+    # Частоты токенов живых документов всех сегментов в одной матрице: строки по возрастанию номера,
+    # столбцы — отсортированные токены, встречающиеся хотя бы в одном живом документе
+    token_set = set()
+    for segment in segments:
+        live = segment.counts[segment.live_rows]
+        token_set.update(segment.tokens[j] for j in np.unique(live.indices))
+    tokens = sorted(token_set)
+    columns = {token: j for j, token in enumerate(tokens)}
+    matrices = []
+    for segment in segments:
+        column_map = np.array([columns.get(token, -1) for token in segment.tokens], dtype=np.int64)
+        kept = np.flatnonzero(column_map >= 0)
+        live = sparse.csr_matrix(segment.counts[segment.live_rows][:, kept])
+        matrices.append(sparse.csr_matrix((live.data, column_map[kept][live.indices], live.indptr),
+                                          shape=(live.shape[0], len(tokens))))
+    doc_ids = np.concatenate([segment.doc_ids[segment.live_rows] for segment in segments] + [np.empty(0, np.int64)])
+    doc_word_sums = np.concatenate([segment.doc_word_sums[segment.live_rows] for segment in segments] + [np.empty(0)])
+    order = np.argsort(doc_ids, kind='stable')
+    matrix = sparse.csr_matrix(sparse.vstack(matrices, format='csr')[order] if matrices else (0, len(tokens)))
+    matrix.sort_indices()
+    return doc_ids[order].astype(np.int64), tokens, matrix, doc_word_sums[order]
+
+
+class SegmentView:
+    # Согласованный срез: сегменты и удаления из одного манифеста. Для булевого поиска (task3/search.py)
+    def __init__(self, manifest_path):
+        manifest_path = Path(manifest_path)
+        self.version = manifest_path.name
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+        self.segments = [Segment(manifest_path.parent / entry['name'], entry['deleted'])
+                         for entry in manifest['segments']]
+
+    def search(self, postfix_tokens):
+        # Живой документ есть только в одном сегменте, поэтому результаты просто сливаются
+        return list(heapq.merge(*(segment.search(postfix_tokens) for segment in self.segments)))
+
+
+class SegmentSnapshot(SegmentView):
+    # Срез для ранжированного поиска task5 с теми же полями, что и VectorSnapshot
+    def __init__(self, manifest_path):
+        super().__init__(manifest_path)
+        token_lemmas = {}
+        self.index = {}
+        for segment in self.segments:
+            token_lemmas.update(segment.token_lemmas())
+            urls = segment.urls()
+            self.index.update((int(doc_id), urls[int(doc_id)]) for doc_id in segment.doc_ids[segment.live_rows])
+        self.doc_ids, tokens, token_count_matrix, doc_word_sums = stack_live_counts(self.segments)
+        lemma_counts, lemma_vocabulary = termin_lemma_counts(token_count_matrix, tokens,
+                                                             get_lemmas(tokens, token_lemmas))
+        self.vocabulary = {lemma: j for j, lemma in enumerate(lemma_vocabulary)}
+        self.idf = inverse_document_frequencies(lemma_counts)
+        self.documents = normalize_rows(tf_idf_weights(lemma_counts, doc_word_sums, self.idf))
+        postings = sparse.csr_matrix(self.documents.T)
+        postings.sort_indices()
+        self.engine = RankedEngine(postings, upper_bounds(postings))
+        self.ivf_index = None
+        self.lemmatizer = LemmaService(token_lemmas)
+
+
+def empty_manifest(positions):
+    return {'generation': 0, 'positions': positions, 'segments': []}
+
+
+class SegmentStore:
+    # Запись в индекс: добавление сегментов, удаления и слияния. Изменения манифеста выполняются
+    # под файловой блокировкой, сами сегменты пишутся до неё и после записи не меняются
+    def __init__(self, root):
+        self.root = Path(root)
+
+    @contextmanager
+    def locked(self, lock_file=LOCK_FILE):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / lock_file, 'w') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def manifest(self, positions=False):
+        if not (self.root / CURRENT_FILE).is_file():
+            return empty_manifest(positions)
+        with open(current_dir(self.root), 'r') as file:
+            return json.load(file)
+
+    def new_segment_dir(self):
+        directory = self.root / f'{SEGMENT_PREFIX}{time.time_ns()}'
+        directory.mkdir(parents=True)
+        return directory
+
+    def commit(self, manifest):
+        manifest['generation'] += 1
+        path = self.root / f'{MANIFEST_PREFIX}{manifest["generation"]:06d}.json'
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as file:
+            json.dump(manifest, file, indent=1)
+        os.replace(tmp_path, path)
+        publish(self.root, path)
+        self.cleanup()
+
+    def cleanup(self):
+        # Удаляются старые манифесты и сегменты, на которые ссылались только они
+        manifests = sorted(self.root.glob(f'{MANIFEST_PREFIX}*.json'))
+        kept = set()
+        for path in manifests[-KEEP_MANIFESTS:]:
+            with open(path, 'r') as file:
+                kept.update(entry['name'] for entry in json.load(file)['segments'])
+        for path in manifests[:-KEEP_MANIFESTS]:
+            with open(path, 'r') as file:
+                names = {entry['name'] for entry in json.load(file)['segments']}
+            for name in names - kept:
+                shutil.rmtree(self.root / name, ignore_errors=True)
+            path.unlink()
+
+    def segment_doc_ids(self, name):
+        return load_array(self.root / name / 'tokens', 'doc_ids', mmap=False)
+
+    def tombstone(self, manifest, doc_ids):
+        doc_ids = np.asarray(sorted(doc_ids), dtype=np.int64)
+        for entry in manifest['segments']:
+            found = np.intersect1d(self.segment_doc_ids(entry['name']), doc_ids)
+            entry['deleted'] = sorted(set(entry['deleted']) | set(found.tolist()))
+
+    def add_documents(self, token_counts, token_positions, token_lemmas, urls):
+        # Новые версии документов попадают в новый сегмент, старые помечаются удалёнными
+        positions = token_positions is not None
+        if self.manifest(positions)['positions'] != positions:
+            raise ValueError('All segments must be built with the same --positions setting')
+        directory = self.new_segment_dir()
+        write_document_segment(directory, token_counts, token_positions, token_lemmas, urls)
+        with self.locked():
+            manifest = self.manifest(positions)
+            self.tombstone(manifest, token_counts)
+            manifest['segments'].append({'name': directory.name, 'doc_count': len(token_counts), 'deleted': []})
+            self.commit(manifest)
+
+    def delete_documents(self, doc_ids):
+        with self.locked():
+            manifest = self.manifest()
+            self.tombstone(manifest, doc_ids)
+            self.commit(manifest)
+
+    def select_merge(self, manifest):
+        live = {entry['name']: entry['doc_count'] - len(entry['deleted']) for entry in manifest['segments']}
+        tiers = {}
+        for entry in sorted(manifest['segments'], key=lambda entry: live[entry['name']]):
+            tier = int(math.log(max(live[entry['name']], 1), MERGE_FACTOR))
+            tiers.setdefault(tier, []).append(entry)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= MERGE_FACTOR:
+                return tiers[tier][:MERGE_FACTOR]
+        for entry in manifest['segments']:
+            if len(entry['deleted']) > EXPUNGE_RATIO * entry['doc_count']:
+                return [entry]
+        return None
+
+    def merge_once(self):
+        # Слияние идёт без блокировки манифеста; удаления, пришедшие за это время, переносятся в новый сегмент
+        with self.locked(MERGE_LOCK_FILE):
+            with self.locked():
+                chosen = self.select_merge(self.manifest())
+            if not chosen:
+                return False
+            segments = [Segment(self.root / entry['name'], entry['deleted']) for entry in chosen]
+            live_count = sum(len(segment.live_rows) for segment in segments)
+            directory = self.new_segment_dir() if live_count else None
+            if directory is not None:
+                self.write_merged_segment(directory, segments)
+            with self.locked():
+                manifest = self.manifest()
+                names = {entry['name'] for entry in chosen}
+                current = [entry for entry in manifest['segments'] if entry['name'] in names]
+                remaining = [entry for entry in manifest['segments'] if entry['name'] not in names]
+                if directory is not None:
+                    deleted = set()
+                    for entry, merged in zip(sorted(current, key=lambda entry: entry['name']),
+                                             sorted(chosen, key=lambda entry: entry['name'])):
+                        deleted.update(set(entry['deleted']) - set(merged['deleted']))
+                    remaining.append({'name': directory.name, 'doc_count': live_count, 'deleted': sorted(deleted)})
+                manifest['segments'] = remaining
+                self.commit(manifest)
+            logger.info(f'Merged {len(chosen)} segments ({live_count} documents)')
+            return True
+
+    def write_merged_segment(self, directory, segments):
+        doc_ids, tokens, token_count_matrix, doc_word_sums = stack_live_counts(segments)
+        token_lemmas = {}
+        urls = {}
+        lemma_postings = {}
+        for segment in segments:
+            token_lemmas.update(segment.token_lemmas())
+            urls.update(segment.urls())
+            for lemma, live in segment.live_postings().items():
+                if isinstance(live, dict):
+                    lemma_postings.setdefault(lemma, {}).update(live)
+                else:
+                    lemma_postings.setdefault(lemma, set()).update(live)
+        positional = segments[0].index.has_positions
+        write_segment(directory, doc_ids.tolist(), tokens, token_count_matrix, doc_word_sums, token_lemmas, urls,
+                      None if positional else lemma_postings, lemma_postings if positional else None)
+
+    def merge(self):
+        while self.merge_once():
+            pass
+
+
+class BackgroundMerger(threading.Thread):
+    # Периодически применяет политику слияния к сегментам, пока процесс обслуживает запросы
+    def __init__(self, store, interval=30.0):
+        super().__init__(daemon=True)
+        self.store = store
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            # Любой сбой слияния только записывается в лог: поток продолжает работу и повторит попытку
+            try:
+                self.store.merge()
+            except Exception:
+                logger.exception('Segment merge failed')
+
+    def stop(self):
+        self.stopped.set()
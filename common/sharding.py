@@ -0,0 +1,153 @@
+import heapq
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from common.binary_index import (FLAG_POSITIONS, BinaryIndex, sorted_positional_postings, sorted_postings,
+                                 write_index)
+from common.boolean_engine import BooleanEngine
+from common.ranking import RankedEngine, normalize_rows, upper_bounds
+from common.sparse_store import load_array, load_csr, load_terms, save_csr
+from common.tfidf import tf_idf_weights
+
+# Документы распределяются по шардам по остатку от деления номера; у каждого шарда свой инвертированный
+# индекс и своя матрица частот лемм. Веса tf-idf считаются при открытии шарда по глобальному idf,
+# поэтому оценки документов совпадают с оценками в общем индексе
+SHARD_PREFIX = 'shard-'
+
+
+def shard_of(doc_id, shard_count):
+    return doc_id % shard_count
+
+
+def shard_dirs(directory):
+    return sorted(Path(directory).glob(f'{SHARD_PREFIX}*'), key=lambda path: int(path.name[len(SHARD_PREFIX):]))
+
+
+def write_shards(directory, shard_count, doc_ids, lemma_counts, doc_word_sums, lemma_vocabulary,
+                 lemma_postings, lemma_positions=None):
+    directory = Path(directory)
+    shutil.rmtree(directory, ignore_errors=True)
+    doc_ids = np.asarray(doc_ids)
+    doc_word_sums = np.asarray(doc_word_sums, dtype=np.float64)
+    for shard in range(shard_count):
+        shard_dir = directory / f'{SHARD_PREFIX}{shard}'
+        rows = np.flatnonzero(doc_ids % shard_count == shard)
+        shard_doc_ids = doc_ids[rows].tolist()
+        save_csr(shard_dir / 'vectors', lemma_counts[rows], lemma_vocabulary,
+                 doc_ids=doc_ids[rows], doc_word_sums=doc_word_sums[rows])
+        if lemma_positions is not None:
+            positions = {}
+            for lemma, doc_positions in lemma_positions.items():
+                shard_positions = {doc_id: doc_positions[doc_id] for doc_id in doc_positions
+                                   if shard_of(doc_id, shard_count) == shard}
+                if shard_positions:
+                    positions[lemma] = shard_positions
+            write_index(shard_dir / 'inverted_index.bin', sorted_positional_postings(positions), shard_doc_ids,
+                        FLAG_POSITIONS)
+        else:
+            postings = {}
+            for lemma, pages in lemma_postings.items():
+                shard_pages = {doc_id for doc_id in pages if shard_of(doc_id, shard_count) == shard}
+                if shard_pages:
+                    postings[lemma] = shard_pages
+            write_index(shard_dir / 'inverted_index.bin', sorted_postings(postings), shard_doc_ids)
+
+
+class Shard:
+    def __init__(self, directory):
+        directory = Path(directory)
+        self.index = BinaryIndex(str(directory / 'inverted_index.bin'))
+        self.boolean_engine = BooleanEngine(self.index)
+        self.counts = load_csr(directory / 'vectors')
+        self.doc_ids = load_array(directory / 'vectors', 'doc_ids')
+        self.doc_word_sums = load_array(directory / 'vectors', 'doc_word_sums')
+        self.ranked_engine = None
+
+    def stats(self):
+        # Число документов и частоты документов лемм в шарде — для глобального idf
+        return self.counts.shape[0], np.bincount(self.counts.indices, minlength=self.counts.shape[1])
+
+    def set_idf(self, idf):
+        weights = normalize_rows(tf_idf_weights(self.counts, self.doc_word_sums, idf))
+        postings = sparse.csr_matrix(weights.T)
+        postings.sort_indices()
+        self.ranked_engine = RankedEngine(postings, upper_bounds(postings))
+
+    def top_k(self, query_tfidf, k):
+        rows, scores = self.ranked_engine.top_k(query_tfidf, k)
+        return [(float(score), int(self.doc_ids[row])) for row, score in zip(rows, scores)]
+
+    def boolean_search(self, postfix_tokens):
+        return self.boolean_engine.search(postfix_tokens)
+
+
+# Состояние процесса-шарда: каждый пул из одного процесса держит свой шард между вызовами
+shard = None
+
+
+def open_shard(directory):
+    global shard
+    shard = Shard(directory)
+
+
+def shard_stats():
+    return shard.stats()
+
+
+def shard_set_idf(idf):
+    shard.set_idf(idf)
+
+
+def shard_top_k(query_tfidf, k):
+    return shard.top_k(query_tfidf, k)
+
+
+def shard_boolean_search(postfix_tokens):
+    return shard.boolean_search(postfix_tokens)
+
+
+class ShardCoordinator:
+    # Запрос рассылается всем шардам параллельно (по процессу на шард вместо отдельных машин),
+    # ответы объединяются: для булевых запросов — слиянием отсортированных списков, для ранжированных —
+    # выбором k лучших из top-k каждого шарда. idf считается по частотам документов всех шардов
+    def __init__(self, directory):
+        self.executors = []
+        for shard_dir in shard_dirs(directory):
+            executor = ProcessPoolExecutor(max_workers=1, initializer=open_shard, initargs=(str(shard_dir),))
+            self.executors.append(executor)
+        if not self.executors:
+            raise ValueError(f'No shards in {directory}')
+        self.vocabulary = {lemma: j for j, lemma in enumerate(load_terms(shard_dirs(directory)[0] / 'vectors'))}
+        stats = self.scatter(shard_stats)
+        self.doc_count = sum(doc_count for doc_count, _ in stats)
+        doc_freqs = np.sum([shard_doc_freqs for _, shard_doc_freqs in stats], axis=0)
+        self.idf = np.zeros(len(doc_freqs))
+        present = doc_freqs > 0
+        self.idf[present] = np.log(self.doc_count / doc_freqs[present])
+        self.scatter(shard_set_idf, self.idf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def scatter(self, function, *args):
+        futures = [executor.submit(function, *args) for executor in self.executors]
+        return [future.result() for future in futures]
+
+    def boolean_search(self, postfix_tokens):
+        return list(heapq.merge(*self.scatter(shard_boolean_search, postfix_tokens)))
+
+    def top_k(self, query_tfidf, k):
+        # При равной оценке выше документ с меньшим номером, как и в общем индексе
+        results = [result for shard_results in self.scatter(shard_top_k, query_tfidf, k) for result in shard_results]
+        return heapq.nsmallest(k, results, key=lambda result: (-result[0], result[1]))
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown()
@@ -0,0 +1,166 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+from scipy import sparse
+
+# Снимок индекса одним файлом: заголовок | массивы, выровненные по 64 байтам | каталог массивов (json).
+# Каталог хранит для каждого массива смещение, тип и форму; при открытии файл отображается в память,
+# а массивы становятся представлениями np.frombuffer без чтения и копирования, поэтому открытие
+# не зависит от размера коллекции. Строки (термины, ссылки, леммы) лежат одним блоком байтов
+# с массивом смещений; термины отсортированы по байтам и ищутся двоичным поиском
+MAGIC = b'ISNP'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQQ')
+ALIGNMENT = 64
+
+
+def pack_strings(strings):
+    encoded = [string.encode() for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(item) for item in encoded])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def csr_arrays(prefix, matrix):
+    matrix = sparse.csr_matrix(matrix)
+    matrix.sort_indices()
+    return {f'{prefix}.data': matrix.data, f'{prefix}.indices': matrix.indices, f'{prefix}.indptr': matrix.indptr}
+
+
+def write_snapshot(path, arrays, meta=None):
+    # arrays — имя -> numpy-массив; meta — небольшой словарь, который сохраняется в каталоге как есть
+    directory = {}
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(bytes(HEADER.size))
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            file.write(bytes(-file.tell() % ALIGNMENT))
+            directory[name] = {'offset': file.tell(), 'dtype': array.dtype.str, 'shape': array.shape}
+            file.write(array.tobytes())
+        directory_offset = file.tell()
+        encoded = json.dumps({'arrays': directory, 'meta': meta or {}}).encode()
+        file.write(encoded)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, VERSION, 0, directory_offset, len(encoded)))
+    # файл появляется под своим именем только целиком
+    os.replace(tmp_path, path)
+
+
+class SnapshotFile:
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, directory_offset, directory_length = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not an index snapshot')
+        directory = json.loads(self.map[directory_offset:directory_offset + directory_length])
+        self.arrays = directory['arrays']
+        self.meta = directory['meta']
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def array(self, name):
+        entry = self.arrays[name]
+        dtype = np.dtype(entry['dtype'])
+        shape = tuple(entry['shape'])
+        count = int(np.prod(shape)) if shape else 1
+        return np.frombuffer(self.map, dtype=dtype, count=count, offset=entry['offset']).reshape(shape)
+
+    def csr(self, prefix, shape):
+        return sparse.csr_matrix((self.array(f'{prefix}.data'), self.array(f'{prefix}.indices'),
+                                  self.array(f'{prefix}.indptr')), shape=tuple(shape), copy=False)
+
+    def strings(self, prefix):
+        return PackedStrings(self.array(f'{prefix}.bytes'), self.array(f'{prefix}.offsets'))
+
+
+class PackedStrings:
+    # Последовательность строк поверх блока байтов и смещений; строка декодируется при обращении
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i):
+        return self.raw(i).decode()
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class TermDictionary:
+    # Термин -> номер по отсортированному списку терминов, как словарь {термин: номер}
+    def __init__(self, terms):
+        self.terms = terms
+
+    def find(self, term):
+        key = term.encode()
+        low, high = 0, len(self.terms)
+        while low < high:
+            middle = (low + high) // 2
+            if self.terms.raw(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.terms) and self.terms.raw(low) == key:
+            return low
+        return None
+
+    def __contains__(self, term):
+        return self.find(term) is not None
+
+    def __getitem__(self, term):
+        j = self.find(term)
+        if j is None:
+            raise KeyError(term)
+        return j
+
+    def get(self, term, default=None):
+        j = self.find(term)
+        return default if j is None else j
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __iter__(self):
+        return iter(self.terms)
+
+
+class LemmaTable:
+    # Таблица токен -> леммы для LemmaService: токены отсортированы, леммы токена записаны через пробел
+    def __init__(self, tokens, lemmas):
+        self.tokens = TermDictionary(tokens)
+        self.lemmas = lemmas
+
+    def get(self, token, default=None):
+        i = self.tokens.find(token)
+        return default if i is None else tuple(self.lemmas[i].split())
+
+    def __len__(self):
+        return len(self.tokens)
+
+
+class DocumentMap:
+    # Номер документа -> ссылка; номера отсортированы, ссылки лежат в том же порядке
+    def __init__(self, doc_ids, urls):
+        self.doc_ids = doc_ids
+        self.urls = urls
+
+    def __getitem__(self, doc_id):
+        i = int(np.searchsorted(self.doc_ids, doc_id))
+        if i == len(self.doc_ids) or self.doc_ids[i] != doc_id:
+            raise KeyError(doc_id)
+        return self.urls[i]
+
+    def __len__(self):
+        return len(self.doc_ids)
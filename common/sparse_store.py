@@ -0,0 +1,46 @@
+import json
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+# Разреженная матрица в виде отдельных .npy массивов CSR (data, indices, indptr) и meta.json;
+# массивы открываются через np.load(mmap_mode='r') без копирования в память процесса
+META_FILE = 'meta.json'
+
+
+def save_csr(directory, matrix, terms=None, **arrays):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    matrix = sparse.csr_matrix(matrix)
+    matrix.sort_indices()
+    np.save(directory / 'data.npy', matrix.data)
+    np.save(directory / 'indices.npy', matrix.indices)
+    np.save(directory / 'indptr.npy', matrix.indptr)
+    for name, array in arrays.items():
+        np.save(directory / f'{name}.npy', np.asarray(array))
+    if terms is not None:
+        with open(directory / 'terms.txt', 'w') as file:
+            for term in terms:
+                file.write(term + '\n')
+    with open(directory / META_FILE, 'w') as file:
+        json.dump({'shape': matrix.shape, 'arrays': sorted(arrays)}, file)
+
+
+def load_csr(directory, mmap=True):
+    directory = Path(directory)
+    mmap_mode = 'r' if mmap else None
+    with open(directory / META_FILE, 'r') as file:
+        meta = json.load(file)
+    data, indices, indptr = (np.load(directory / f'{name}.npy', mmap_mode=mmap_mode)
+                             for name in ('data', 'indices', 'indptr'))
+    return sparse.csr_matrix((data, indices, indptr), shape=tuple(meta['shape']), copy=False)
+
+
+def load_array(directory, name, mmap=True):
+    return np.load(Path(directory) / f'{name}.npy', mmap_mode='r' if mmap else None)
+
+
+def load_terms(directory):
+    with open(Path(directory) / 'terms.txt', 'r') as file:
+        return [line.rstrip('\n') for line in file]
@@ -0,0 +1,141 @@
+import heapq
+import logging
+import os
+import shutil
+import struct
+import tempfile
+from itertools import accumulate, groupby
+from operator import itemgetter
+
+from common.binary_index import delta_decode, delta_encode, positional_decode, positional_encode, vbyte_decode, \
+    vbyte_encode
+from common.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# Построение инвертированного индекса во внешней памяти (SPIMI): списки копятся в памяти до бюджета,
+# затем сбрасываются на диск отсортированным по терминам прогоном; в конце прогоны сливаются k-путевым
+# слиянием. Запись прогона: заголовок (длина термина, число документов, длина данных) | термин | данные
+# в формате binary_index (delta_encode или positional_encode)
+RUN_HEADER = struct.Struct('<IIQ')
+# Примерный расход памяти на один термин в буфере сверх его байтов: ключ словаря, строка и bytearray
+TERM_OVERHEAD = 200
+# Сколько прогонов сливается за раз; остальные сначала сливаются в промежуточные прогоны
+MAX_FAN_IN = 128
+
+
+def read_run(run_file):
+    # (термин в байтах, число документов, закодированные данные) в порядке терминов
+    with open(run_file, 'rb') as file:
+        while True:
+            header = file.read(RUN_HEADER.size)
+            if not header:
+                return
+            term_length, doc_count, data_length = RUN_HEADER.unpack(header)
+            term = file.read(term_length)
+            yield term, doc_count, file.read(data_length)
+
+
+class SpimiBuilder:
+    def __init__(self, memory_budget, positions=False, directory=None):
+        # memory_budget — в байтах; прогоны пишутся во временный каталог внутри directory
+        self.memory_budget = memory_budget
+        self.positions = positions
+        self.run_directory = tempfile.mkdtemp(prefix='spimi-', dir=directory)
+        self.runs = []
+        self.run_count = 0
+        self.buffers = {}
+        self.used = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, doc_id, term_postings):
+        # term_postings — термины документа; для позиционного индекса словарь термин -> отсортированные позиции.
+        # Документы могут приходить в любом порядке, поэтому номер пишется целиком, а не разностью
+        for term in term_postings:
+            buffer = self.buffers.get(term)
+            if buffer is None:
+                buffer = self.buffers[term] = bytearray()
+                self.used += TERM_OVERHEAD + len(term)
+            size = len(buffer)
+            vbyte_encode((doc_id,), buffer)
+            if self.positions:
+                positions = term_postings[term]
+                vbyte_encode((len(positions),), buffer)
+                delta_encode(positions, buffer)
+            self.used += len(buffer) - size
+        if self.used >= self.memory_budget:
+            self.spill()
+
+    def buffered_postings(self, buffer):
+        numbers = vbyte_decode(buffer)
+        if not self.positions:
+            return sorted(numbers)
+        entries = []
+        i = 0
+        while i < len(numbers):
+            count = numbers[i + 1]
+            entries.append((numbers[i], list(accumulate(numbers[i + 2:i + 2 + count]))))
+            i += 2 + count
+        return sorted(entries, key=itemgetter(0))
+
+    def encode(self, postings):
+        return positional_encode(postings) if self.positions else delta_encode(postings)
+
+    def decode(self, data):
+        return list(zip(*positional_decode(data))) if self.positions else delta_decode(data)
+
+    def new_run(self):
+        self.run_count += 1
+        run_file = os.path.join(self.run_directory, f'run-{self.run_count:06d}.bin')
+        self.runs.append(run_file)
+        return run_file
+
+    def write_run(self, run_file, term_postings):
+        with open(run_file, 'wb') as file:
+            for term, postings in term_postings:
+                data = self.encode(postings)
+                file.write(RUN_HEADER.pack(len(term), len(postings), len(data)))
+                file.write(term)
+                file.write(data)
+
+    def spill(self):
+        if not self.buffers:
+            return
+        with stage('spill') as spill:
+            run_file = self.new_run()
+            terms = sorted(self.buffers, key=str.encode)
+            self.write_run(run_file, ((term.encode(), self.buffered_postings(self.buffers.pop(term)))
+                                      for term in terms))
+            spill.add(bytes_written=os.path.getsize(run_file))
+        logger.info(f'Spilled run {self.run_count}: {len(terms)} terms, about {self.used / 2 ** 20:.1f} MB')
+        self.used = 0
+
+    def merge_runs(self, run_files):
+        # k-путевое слияние: термины по возрастанию байтов, списки одного термина — по номерам документов.
+        # В памяти одновременно только списки текущего термина из каждого прогона
+        records = heapq.merge(*(read_run(run_file) for run_file in run_files), key=itemgetter(0))
+        key = itemgetter(0) if self.positions else None
+        for term, group in groupby(records, key=itemgetter(0)):
+            yield term, list(heapq.merge(*(self.decode(data) for _, _, data in group), key=key))
+
+    def merged(self):
+        # (термин, список) в порядке терминов, как ждёт write_index
+        self.spill()
+        while len(self.runs) > MAX_FAN_IN:
+            run_files = self.runs[:MAX_FAN_IN]
+            self.runs = self.runs[MAX_FAN_IN:]
+            self.write_run(self.new_run(), self.merge_runs(run_files))
+            for run_file in run_files:
+                os.remove(run_file)
+        logger.info(f'Merging {len(self.runs)} runs')
+        for term, postings in self.merge_runs(self.runs):
+            yield term.decode(), postings
+
+    def close(self):
+        shutil.rmtree(self.run_directory, ignore_errors=True)
+
@@ -0,0 +1,130 @@
+import os
+from os import listdir
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+
+def build_count_matrix(word_count_dicts, vocabulary):
+    # Документы x термины словаря; слова вне словаря не попадают в матрицу
+    columns = {word: j for j, word in enumerate(vocabulary)}
+    indptr = [0]
+    indices = []
+    data = []
+    for word_count_dict in word_count_dicts:
+        for word, count in word_count_dict.items():
+            j = columns.get(word)
+            if j is not None:
+                indices.append(j)
+                data.append(count)
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix((np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32),
+                                np.array(indptr, dtype=np.int64)), shape=(len(word_count_dicts), len(vocabulary)))
+    matrix.sort_indices()
+    return matrix
+
+
+def form_lemma_matrix(vocabulary, lemma_vocabulary, lemma_form_dict):
+    # Термины x леммы: 1 там, где термин — форма леммы (форма может относиться к нескольким леммам)
+    columns = {word: j for j, word in enumerate(vocabulary)}
+    rows = []
+    lemma_columns = []
+    for lemma_column, lemma in enumerate(lemma_vocabulary):
+        for form in lemma_form_dict[lemma]:
+            if form in columns:
+                rows.append(columns[form])
+                lemma_columns.append(lemma_column)
+    return sparse.csr_matrix((np.ones(len(rows)), (rows, lemma_columns)),
+                             shape=(len(vocabulary), len(lemma_vocabulary)))
+
+
+def count_lemmas(count_matrix, vocabulary, lemma_vocabulary, lemma_form_dict):
+    # Частоты лемм во всех документах сразу: (документы x термины) @ (термины x леммы)
+    lemma_counts = sparse.csr_matrix(count_matrix @ form_lemma_matrix(vocabulary, lemma_vocabulary, lemma_form_dict))
+    lemma_counts.sort_indices()
+    return lemma_counts
+
+
+def document_frequencies(count_matrix):
+    # Число документов с термином считается один раз для всех терминов: ненулевые элементы по столбцам
+    return np.bincount(count_matrix.indices, minlength=count_matrix.shape[1])
+
+
+def inverse_document_frequencies(count_matrix):
+    doc_freqs = document_frequencies(count_matrix)
+    idf = np.zeros(count_matrix.shape[1])
+    present = doc_freqs > 0
+    idf[present] = np.log(count_matrix.shape[0] / doc_freqs[present])
+    return idf
+
+
+def tf_idf_weights(count_matrix, doc_word_sums, idf):
+    # tf = число вхождений / число слов в документе, tf-idf = tf * idf; веса пересчитываются прямо
+    # в массиве data, поэтому структура матрицы (включая нулевые веса при idf = 0) сохраняется
+    doc_word_sums = np.asarray(doc_word_sums, dtype=np.float64)
+    inverse_sums = np.divide(1.0, doc_word_sums, out=np.zeros_like(doc_word_sums), where=doc_word_sums > 0)
+    tf_idf = sparse.csr_matrix(count_matrix, dtype=np.float64, copy=True)
+    tf_idf.data *= np.repeat(inverse_sums, np.diff(tf_idf.indptr)) * idf[tf_idf.indices]
+    return tf_idf
+
+
+def tf_idf_matrix(count_matrix, doc_word_sums):
+    idf = inverse_document_frequencies(count_matrix)
+    return tf_idf_weights(count_matrix, doc_word_sums, idf), idf
+
+
+def termin_lemma_counts(token_count_matrix, tokens, lemmas):
+    # Частоты лемм, как в task4/main.py (учитываются только леммы, которые сами встречаются среди терминов),
+    # но со столбцами в порядке всех лемм, как в lemmas.txt (task2)
+    token_set = set(tokens)
+    lemma_vocabulary = list(lemmas)
+    counted_lemmas = [lemma for lemma in lemma_vocabulary if lemma in token_set]
+    counts = count_lemmas(token_count_matrix, tokens, counted_lemmas, lemmas)
+    columns = {lemma: j for j, lemma in enumerate(lemma_vocabulary)}
+    column_map = np.array([columns[lemma] for lemma in counted_lemmas], dtype=np.int64)
+    counts = sparse.csr_matrix((counts.data, column_map[counts.indices], counts.indptr),
+                               shape=(counts.shape[0], len(lemma_vocabulary)))
+    counts.sort_indices()
+    return counts, lemma_vocabulary
+
+
+def export_text(result_dir, tf_idf, idf, vocabulary, doc_ids):
+    # Прежний формат: по файлу N.txt на документ (N — номер документа строки), строка «термин idf tf-idf»
+    Path(result_dir).mkdir(parents=True, exist_ok=True)
+    for file in listdir(result_dir):
+        os.remove(os.path.join(result_dir, file))
+    for i, doc_id in enumerate(doc_ids):
+        start, end = tf_idf.indptr[i], tf_idf.indptr[i + 1]
+        with open(f'{result_dir}/{doc_id}.txt', 'w') as file:
+            for j, value in zip(tf_idf.indices[start:end], tf_idf.data[start:end]):
+                word = vocabulary[j]
+                if idf[j] == 0.0:
+                    file.write(f'{word} 0.0 0.0\n')
+                else:
+                    file.write(f'{word} {idf[j]:.20f} {value:.20f}\n')
+
+
+def lemmatize_query(query, lemmatizer, lemma_set):
+    lemmatized_query = []
+    for token in query:
+        for lemma in lemmatizer.lemmas(token):
+            if lemma in lemma_set:
+                lemmatized_query.append(lemma)
+                break
+    return lemmatized_query
+
+
+def calculate_query_tfidf(query, vocabulary, idf):
+    # Вес леммы запроса: tf в запросе * idf, посчитанный заранее (create_vector_matrix.py или по шардам)
+    query_lemma_count_dict = {}
+    for lemma in query:
+        if lemma in query_lemma_count_dict:
+            query_lemma_count_dict[lemma] += 1
+        else:
+            query_lemma_count_dict[lemma] = 1
+    query_tfidf = {}
+    for lemma, count in query_lemma_count_dict.items():
+        j = vocabulary[lemma]
+        query_tfidf[j] = count / len(query) * idf[j]
+    return query_tfidf
@@ -0,0 +1,186 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from common.ann import IVFIndex
+from common.lemmatizer import LemmaService
+from common.ranking import RankedEngine, upper_bounds
+from common.snapshot_file import (DocumentMap, LemmaTable, SnapshotFile, TermDictionary, csr_arrays, pack_strings,
+                                  write_snapshot)
+
+logger = logging.getLogger(__name__)
+
+# Каждая сборка векторного индекса пишется в отдельный файл <root>/<версия>.snap (snapshot_file.py),
+# а файл <root>/CURRENT с именем текущей версии заменяется атомарно (os.replace) только после того,
+# как сборка записана целиком
+CURRENT_FILE = 'CURRENT'
+SNAPSHOT_SUFFIX = '.snap'
+KEEP_VERSIONS = 3
+
+
+def new_version_path(root):
+    Path(root).mkdir(parents=True, exist_ok=True)
+    version = time.strftime('%Y%m%d-%H%M%S') + f'-{time.time_ns() % 1_000_000_000:09d}'
+    return Path(root) / (version + SNAPSHOT_SUFFIX)
+
+
+def read_current(root):
+    with open(Path(root) / CURRENT_FILE, 'r') as file:
+        return file.read().strip()
+
+
+def current_dir(root):
+    return Path(root) / read_current(root)
+
+
+def publish(root, path):
+    # path — каталог версии или файл манифеста сегментов (segments.py) внутри root
+    root = Path(root)
+    tmp_path = root / (CURRENT_FILE + '.tmp')
+    with open(tmp_path, 'w') as file:
+        file.write(Path(path).name + '\n')
+    os.replace(tmp_path, root / CURRENT_FILE)
+
+
+def prune(root):
+    # Старые версии удаляются; процессы, которые ещё держат их в памяти, продолжают работать
+    # с уже отображёнными файлами
+    current = read_current(root)
+    versions = sorted(path for path in Path(root).iterdir()
+                      if path.name != CURRENT_FILE and not path.name.endswith('.tmp'))
+    for path in versions[:-KEEP_VERSIONS]:
+        if path.name == current:
+            continue
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+
+def load_index(index_file):
+    # Номер документа -> ссылка (строки «N. url» из task1/index.txt)
+    index = {}
+    with open(index_file, 'r') as file:
+        for line in file:
+            parts = line.strip().split()
+            index[int(parts[0].rstrip('.'))] = parts[1]
+    return index
+
+
+def write_vector_snapshot(path, lemma_vocabulary, idf, doc_ids, documents, urls, token_lemmas, ivf=None):
+    # Столбцы матрицы переставляются в порядок отсортированного словаря, чтобы номер столбца леммы
+    # находился двоичным поиском по файлу. documents — нормированные строки документов,
+    # urls — {номер документа: ссылка}, token_lemmas — {токен: леммы}, ivf — (списки кластеров, центроиды)
+    order = np.array(sorted(range(len(lemma_vocabulary)), key=lambda j: lemma_vocabulary[j].encode()),
+                     dtype=np.int64)
+    column_map = np.empty(len(order), dtype=np.int64)
+    column_map[order] = np.arange(len(order))
+    documents = sparse.csr_matrix(documents)
+    documents = sparse.csr_matrix((documents.data, column_map[documents.indices], documents.indptr),
+                                  shape=documents.shape)
+    documents.sort_indices()
+    postings = sparse.csr_matrix(documents.T)
+    postings.sort_indices()
+    url_doc_ids = sorted(urls)
+    tokens = sorted(token_lemmas, key=str.encode)
+    arrays = {
+        'idf': np.asarray(idf)[order],
+        'doc_ids': np.asarray(doc_ids, dtype=np.int64),
+        'max_weights': upper_bounds(postings),
+        'urls.doc_ids': np.array(url_doc_ids, dtype=np.int64),
+        **csr_arrays('documents', documents),
+        **csr_arrays('postings', postings),
+    }
+    strings = {
+        'terms': [lemma_vocabulary[j] for j in order],
+        'urls': [urls[doc_id] for doc_id in url_doc_ids],
+        'tokens': tokens,
+        'token_lemmas': [' '.join(token_lemmas[token]) for token in tokens],
+    }
+    for prefix, values in strings.items():
+        arrays[f'{prefix}.bytes'], arrays[f'{prefix}.offsets'] = pack_strings(values)
+    shapes = {'documents': documents.shape, 'postings': postings.shape}
+    if ivf is not None:
+        lists, centroids = ivf
+        arrays.update(csr_arrays('ivf', lists))
+        arrays['centroids'] = np.asarray(centroids)[:, order]
+        shapes['ivf'] = lists.shape
+    write_snapshot(path, arrays, {'shapes': shapes})
+
+
+class VectorSnapshot:
+    # Одна версия индекса только для чтения: файл отображается в память, поэтому открытие занимает
+    # миллисекунды при любом размере коллекции, а процессы, открывшие одну версию, делят её страницы
+    def __init__(self, path):
+        path = Path(path)
+        snapshot = SnapshotFile(path)
+        shapes = snapshot.meta['shapes']
+        self.version = path.name
+        # Лемма -> номер столбца матрицы двоичным поиском по отсортированному словарю
+        self.vocabulary = TermDictionary(snapshot.strings('terms'))
+        self.idf = snapshot.array('idf')
+        self.doc_ids = snapshot.array('doc_ids')
+        self.documents = snapshot.csr('documents', shapes['documents'])
+        self.engine = RankedEngine(snapshot.csr('postings', shapes['postings']), snapshot.array('max_weights'))
+        self.ivf_index = None
+        if 'ivf' in shapes:
+            self.ivf_index = IVFIndex(snapshot.csr('ivf', shapes['ivf']), snapshot.array('centroids'), self.documents)
+        self.index = DocumentMap(snapshot.array('urls.doc_ids'), snapshot.strings('urls'))
+        self.lemmatizer = LemmaService(LemmaTable(snapshot.strings('tokens'), snapshot.strings('token_lemmas')))
+
+
+class SnapshotHolder:
+    # Текущий снимок индекса. Указатель CURRENT раз в check_interval секунд проверяет фоновый поток:
+    # он же загружает новую версию и подменяет ею старую присваиванием. Загрузка может занимать время,
+    # пропорциональное коллекции (срез сегментов пересчитывает idf и нормы), поэтому запросы её не ждут
+    # и до подмены получают прежний снимок. loader открывает версию по пути из CURRENT
+    def __init__(self, root, loader=VectorSnapshot, check_interval=1.0):
+        self.root = Path(root)
+        self.loader = loader
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.watcher_pid = None
+        self.failed_version = None
+        self.snapshot = loader(current_dir(self.root))
+        # Потоки не переживают fork (gunicorn --preload): в дочернем процессе наблюдатель запускается заново
+        os.register_at_fork(after_in_child=self.reset_after_fork)
+
+    def get(self):
+        if self.watcher_pid != os.getpid():
+            self.start_watcher()
+        return self.snapshot
+
+    def start_watcher(self):
+        with self.lock:
+            if self.watcher_pid == os.getpid():
+                return
+            self.watcher_pid = os.getpid()
+            threading.Thread(target=self.watch, name='snapshot-watcher', daemon=True).start()
+
+    def reset_after_fork(self):
+        self.lock = threading.Lock()
+        self.watcher_pid = None
+
+    def watch(self):
+        while True:
+            time.sleep(self.check_interval)
+            self.refresh()
+
+    def refresh(self):
+        # Любая ошибка загрузки только записывается в лог, наблюдатель продолжает работу. Версия, которую
+        # не удалось открыть, повторно не загружается, пока CURRENT не укажет на другую
+        version = None
+        try:
+            version = read_current(self.root)
+            if version != self.snapshot.version and version != self.failed_version:
+                self.snapshot = self.loader(self.root / version)
+                logger.info(f'Switched to index version {version}')
+        except Exception:
+            self.failed_version = version
+            logger.exception(f'Keeping index version {self.snapshot.version}')
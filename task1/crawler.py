@@ -0,0 +1,198 @@
+import codecs
+import gzip
+import http.client
+import random
+import threading
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.message import Message
+from urllib.parse import urljoin, urlsplit
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 5
+
+
+class Response:
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def charset(self):
+        # Кодировка из Content-Type; если она не указана или неизвестна — utf-8
+        message = Message()
+        message['Content-Type'] = self.headers.get('Content-Type', '')
+        charset = message.get_content_charset() or 'utf-8'
+        try:
+            codecs.lookup(charset)
+        except LookupError:
+            return 'utf-8'
+        return charset
+
+    def text(self):
+        # Неверные байты заменяются, чтобы одна страница в чужой кодировке не обрывала обход
+        return self.body.decode(self.charset(), errors='replace')
+
+
+class FetchError(Exception):
+    pass
+
+
+class HostRateLimiter:
+    # Не чаще одного запроса в 1 / rate секунд к одному хосту
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def wait(self, host):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot[host])
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class ConnectionPool:
+    # Keep-alive соединения, переиспользуемые между запросами к одному хосту
+    def __init__(self, per_host, timeout):
+        self.timeout = timeout
+        self.idle = defaultdict(list)
+        self.slots = defaultdict(lambda: threading.BoundedSemaphore(per_host))
+        self.lock = threading.Lock()
+
+    def acquire(self, scheme, netloc):
+        key = (scheme, netloc)
+        with self.lock:
+            semaphore = self.slots[key]
+        semaphore.acquire()
+        with self.lock:
+            if self.idle[key]:
+                return self.idle[key].pop()
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(netloc, timeout=self.timeout)
+
+    def release(self, scheme, netloc, connection, reusable):
+        key = (scheme, netloc)
+        if reusable:
+            with self.lock:
+                self.idle[key].append(connection)
+        else:
+            connection.close()
+        self.slots[key].release()
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle.clear()
+
+
+class Crawler:
+    def __init__(self, workers=8, per_host=2, rate=5.0, timeout=10, retries=3, backoff=0.5,
+                 user_agent='infosearch-crawler/1.0'):
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.user_agent = user_agent
+        self.pool = ConnectionPool(per_host, timeout)
+        self.limiter = HostRateLimiter(rate)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.pool.close()
+
+    def fetch(self, url, headers=None):
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._fetch_with_retries(url, headers or {})
+            location = response.headers.get('Location')
+            if response.status not in REDIRECT_STATUSES or not location:
+                return response
+            url = urljoin(url, location)
+        raise FetchError(f'too many redirects for {url}')
+
+    def crawl(self, urls, headers_for=None):
+        # Возвращает (номер, ссылка, ответ, ошибка) по мере завершения загрузок
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(self.fetch, url, headers_for(url) if headers_for else None): (i, url)
+                for i, url in enumerate(urls)
+            }
+            for future in as_completed(futures):
+                i, url = futures[future]
+                try:
+                    yield i, url, future.result(), None
+                except Exception as e:
+                    yield i, url, None, e
+
+    def _fetch_with_retries(self, url, headers):
+        attempt = 0
+        while True:
+            try:
+                response = self._fetch_once(url, headers)
+            except (OSError, http.client.HTTPException) as e:
+                if attempt >= self.retries:
+                    raise FetchError(f'{type(e).__name__}: {e}') from e
+                delay = None
+            else:
+                if response.status not in RETRY_STATUSES:
+                    return response
+                if attempt >= self.retries:
+                    raise FetchError(f'HTTP {response.status}')
+                delay = retry_after(response.headers.get('Retry-After'))
+            if delay is None:
+                delay = self.backoff * 2 ** attempt * (1 + random.random())
+            time.sleep(delay)
+            attempt += 1
+
+    def _fetch_once(self, url, headers):
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        request_headers = {
+            'User-Agent': self.user_agent,
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        }
+        request_headers.update(headers)
+
+        self.limiter.wait(parts.netloc)
+        connection = self.pool.acquire(parts.scheme, parts.netloc)
+        reusable = False
+        try:
+            connection.request('GET', path, headers=request_headers)
+            response = connection.getresponse()
+            body = response.read()
+            reusable = not response.will_close
+        finally:
+            self.pool.release(parts.scheme, parts.netloc, connection, reusable)
+
+        response_headers = {key.title(): value for key, value in response.getheaders()}
+        return Response(url, response.status, response_headers,
+                        decompress(body, response_headers.get('Content-Encoding')))
+
+
+def decompress(body, encoding):
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'deflate':
+        return zlib.decompress(body)
+    return body
+
+
+def retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
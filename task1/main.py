@@ -1,27 +1,98 @@
+import argparse
 import os
+import sys
+from functools import partial
 from pathlib import Path
-from urllib import request
-
-# Получение массива ссылок из предварительно подготовленного списка urls.txt
-with open('task1/urls.txt') as urls_file:
-    urls = [line.rstrip() for line in urls_file]
-
-# Создание папки downloads, в которую будут выкачиваться страницы
-# При каждом запуске программы папка очищается
-downloads_dir = 'task1/downloads'
-Path(downloads_dir).mkdir(parents=True, exist_ok=True)
-for file in os.listdir(downloads_dir):
-    os.remove(os.path.join(downloads_dir, file))
-
-# Скачивание, запись страницы в текстовый файл; добавление номера и ссылки в index.txt
-for i, url in enumerate(urls):
-    try:
-        html_page = request.urlopen(url).read().decode()
-    except Exception as e:
-        print(f'Failed to download {url}: {e.args[0]}')
+
+from crawler import Crawler
+from manifest import Manifest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common.page_store import open_pages
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--urls', default='task1/urls.txt')
+    parser.add_argument('--downloads', default='task1/downloads')
+    parser.add_argument('--index', default='task1/index.txt')
+    parser.add_argument('--format', choices=['store', 'files'], default='store',
+                        help='store — сжатые сегменты с индексом, files — по файлу N.txt на страницу')
+    parser.add_argument('--manifest', default='task1/manifest.json')
+    parser.add_argument('--incremental', action='store_true',
+                        help='не очищать downloads, перекачивать только изменившиеся страницы')
+    parser.add_argument('--workers', type=int, default=8, help='число одновременных загрузок')
+    parser.add_argument('--per-host', type=int, default=2, help='соединений на один хост')
+    parser.add_argument('--rate', type=float, default=5.0, help='запросов в секунду на один хост')
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--retries', type=int, default=3)
+    return parser.parse_args()
+
+
+def load_urls(urls_filename):
+    with open(urls_filename) as urls_file:
+        return [line.rstrip() for line in urls_file if line.strip()]
+
+
+def clear_dir(directory):
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    for file in os.listdir(directory):
+        os.remove(os.path.join(directory, file))
+
+
+def save_index(index_filename, index_items):
+    with open(index_filename, 'w') as index_file:
+        for number, url in index_items:
+            index_file.write(f'{number}. {url}\n')
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    # Получение массива ссылок из предварительно подготовленного списка urls.txt
+    urls = load_urls(args.urls)
+
+    # Создание папки downloads, в которую будут выкачиваться страницы
+    # При полном обходе папка очищается, при инкрементальном — сохраняется вместе с manifest.json
+    if args.incremental:
+        manifest = Manifest.load(args.manifest)
     else:
-        with open(f'{downloads_dir}/{i + 1}.txt', 'w') as html_file:
-            html_file.write(html_page)
-        with open('task1/index.txt', 'a') as index_file:
-            index_file.write(f'{i + 1}. {url}\n')
-        print(f'Downloaded {url}')
+        manifest = Manifest(args.manifest)
+        clear_dir(args.downloads)
+    pages = open_pages(args.downloads, args.format)
+    for url, entry in manifest.drop_missing(urls).items():
+        pages.delete(entry['doc_id'])
+        print(f'Removed {url}')
+    doc_ids = manifest.assign_doc_ids(urls)
+
+    # Параллельное скачивание с условными запросами (If-None-Match / If-Modified-Since);
+    # неизменившиеся страницы не перезаписываются, номер и ссылка попадают в index.txt
+    with pages, Crawler(workers=args.workers, per_host=args.per_host, rate=args.rate,
+                        timeout=args.timeout, retries=args.retries) as crawler:
+        headers_for = partial(manifest.conditional_headers, stored_doc_ids=pages)
+        for _, url, response, error in crawler.crawl(list(doc_ids), headers_for):
+            if error is None and response.status == 304:
+                manifest.record_not_modified(url)
+                print(f'Not modified {url}')
+                continue
+            if error is None and response.status != 200:
+                error = f'HTTP {response.status}'
+            if error is not None:
+                print(f'Failed to download {url}: {error}')
+                continue
+            doc_id = doc_ids[url]
+            if not manifest.is_modified(url, response, doc_id in pages):
+                manifest.record(url, doc_id, response, modified=False)
+                print(f'Unchanged {url}')
+                continue
+            try:
+                pages.put(doc_id, response.text())
+            except OSError as e:
+                # Страница не сохранена — в манифест не попадает и будет скачана заново при следующем обходе
+                print(f'Failed to save {url}: {e}')
+                continue
+            manifest.record(url, doc_id, response, modified=True)
+            print(f'Downloaded {url}')
+    manifest.save()
+    save_index(args.index, manifest.index_items())
+    print(f'Changed: {len(manifest.changed)}, removed: {len(manifest.removed)}')
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+
+def content_hash(response):
+    return hashlib.sha256(response.body).hexdigest()
+
+
+class Manifest:
+    # Сведения о каждой скачанной ссылке: номер документа, ETag, Last-Modified, хеш содержимого, время загрузки.
+    # next_doc_id только растёт: номера удалённых ссылок не выдаются повторно
+    def __init__(self, filename, entries=None, next_doc_id=None, changed=None, removed=None):
+        self.filename = filename
+        self.entries = entries or {}
+        self.next_doc_id = next_doc_id or max((entry['doc_id'] for entry in self.entries.values()), default=0) + 1
+        self.changed = changed or []
+        self.removed = removed or []
+
+    @classmethod
+    def load(cls, filename):
+        if not Path(filename).is_file():
+            return cls(filename)
+        with open(filename, 'r') as file:
+            data = json.load(file)
+        # В манифестах без счётчика учитываются и номера, удалённые при прошлом запуске
+        retired = max(data.get('last_run', {}).get('removed', []), default=0)
+        next_doc_id = data.get('next_doc_id') or max(
+            [entry['doc_id'] for entry in data['pages'].values()] + [retired], default=0) + 1
+        return cls(filename, data['pages'], next_doc_id)
+
+    def save(self):
+        data = {
+            'pages': self.entries,
+            'next_doc_id': self.next_doc_id,
+            'last_run': {
+                'finished_at': time.time(),
+                'changed': sorted(self.changed),
+                'removed': sorted(self.removed),
+            },
+        }
+        tmp_filename = f'{self.filename}.tmp'
+        with open(tmp_filename, 'w') as file:
+            json.dump(data, file, indent=1)
+        os.replace(tmp_filename, self.filename)
+
+    def assign_doc_ids(self, urls):
+        # Уже известные ссылки сохраняют свои номера, новые получают номера из счётчика next_doc_id
+        doc_ids = {}
+        for url in urls:
+            if url in self.entries:
+                doc_ids[url] = self.entries[url]['doc_id']
+            elif url not in doc_ids:
+                doc_ids[url] = self.next_doc_id
+                self.next_doc_id += 1
+        return doc_ids
+
+    def drop_missing(self, urls):
+        urls = set(urls)
+        dropped = {url: entry for url, entry in self.entries.items() if url not in urls}
+        for url, entry in dropped.items():
+            del self.entries[url]
+            self.removed.append(entry['doc_id'])
+        return dropped
+
+    def conditional_headers(self, url, stored_doc_ids):
+        # Условный запрос только если страница действительно есть в хранилище:
+        # иначе ответ 304 оставил бы её потерянной навсегда
+        entry = self.entries.get(url)
+        headers = {}
+        if entry is None or entry['doc_id'] not in stored_doc_ids:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def record_not_modified(self, url):
+        self.entries[url]['fetched_at'] = time.time()
+
+    def is_modified(self, url, response, page_exists):
+        # True, если содержимое страницы изменилось и её нужно перезаписать
+        entry = self.entries.get(url)
+        return not page_exists or entry is None or entry['sha256'] != content_hash(response)
+
+    def record(self, url, doc_id, response, modified):
+        # Вызывается только после того, как страница сохранена (или не требовала перезаписи)
+        self.entries[url] = {
+            'doc_id': doc_id,
+            'etag': response.headers.get('Etag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'sha256': content_hash(response),
+            'fetched_at': time.time(),
+        }
+        if modified:
+            self.changed.append(doc_id)
+
+    def index_items(self):
+        return sorted((entry['doc_id'], url) for url, entry in self.entries.items())
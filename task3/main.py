@@ -1,124 +1,111 @@
-import re
-import nltk
+import argparse
 import json
-from os import listdir
-from bs4 import BeautifulSoup as bs
-from natsort import natsorted
-from nltk.corpus import stopwords, words
-from nltk.stem import WordNetLemmatizer
-
-nltk.download('wordnet')
-nltk.download('words')
-nltk.download('stopwords')
-
-lemmatizer = WordNetLemmatizer()
-words = set(words.words())
-en_stopwords = stopwords.words('english')
-
-
-def dir_reader(directory):
-    files = natsorted([file for file in listdir(directory) if file.endswith('txt')])
-    files_content = []
-    for file in files:
-        files_content.append(file_reader(f'{directory}/{file}'))
-    return files_content
-
-
-def file_reader(filename):
-    with open(filename, 'r') as file:
-        return ''.join(file.readlines())
-
-
-def extract_text(htmls):
-    print('Extracting text')
-    texts = []
-    for html in htmls:
-        texts.append(clean_html(html))
-    return texts
-
-
-def tokenize_collection(texts):
-    print('Tokenizing collection')
-    tokens = dict()
-    for i, text in enumerate(texts):
-        token_set = tokenize(text)
-        for token in token_set:
-            if token not in tokens:
-                tokens[token] = {i + 1}
-            else:
-                tokens[token].add(i + 1)
-    return tokens
-
-
-def tokenize(text):
-    text = text.lower()
-    t = re.sub(r'[^A-Za-z-]', ' ', text)
-    t = re.sub(r'\d', '', t)
-    t = t.split(' ')
-    t = filter(lambda chunk: chunk in words and len(chunk) > 1, t)
-    return set(t)
-
-
-def remove_stopwords(tokens):
-    print('Removing stopwords')
-    for word in en_stopwords:
-        if word in tokens:
-            del tokens[word]
-    return tokens
-
-
-def clean_html(html):
-    soup = bs(html, features="html.parser")
-    for script in soup(["script", "style"]):
-        script.extract()
-
-    if soup.find('body') is not None:
-        text = soup.find('body').get_text()
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = '\n'.join(chunk for chunk in chunks if chunk)
-        return text
+import logging
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common.analysis import analyze_collection, document_sources, get_lemmas, iter_documents, remove_stopwords
+from common.binary_index import FLAG_POSITIONS, BinaryIndex, sorted_positional_postings, sorted_postings, \
+    write_index
+from common.cache import ArtifactCache
+from common.extraction import add_extraction_args, available_parser
+from common.lemmatizer import LemmaService
+from common.metrics import add_metrics_args, save_metrics, setup_logging
+from common.nltk_resources import english_stopwords
+from common.spimi import SpimiBuilder
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    add_extraction_args(parser)
+    add_metrics_args(parser)
+    parser.add_argument('--json', action='store_true', help='дополнительно сохранить индекс в inverted_index.txt')
+    parser.add_argument('--positions', action='store_true',
+                        help='сохранить позиции слов для поиска фраз и NEAR/k')
+    parser.add_argument('--memory-budget', type=float, default=None,
+                        help='строить индекс во внешней памяти: сколько мегабайт списков держать в памяти '
+                             'до сброса на диск')
+    return parser.parse_args()
 
 
 def save_tokens(tokens):
-    print('Saving tokens')
+    logger.info('Saving tokens')
     with open('tokens.txt', 'w') as file:
         for token in tokens:
             file.write(token + "\n")
 
 
-def get_lemmas(tokens):
-    print('Getting lemmas')
-    parts_of_speech = ["a", "s", "r", "n", "v"]
-    lemmas = {}
-    lemma_pages = {}
-    for token, token_pages in tokens.items():
-        for part_of_speech in parts_of_speech:
-            token_lem = lemmatizer.lemmatize(token, part_of_speech)
-            if token_lem not in lemmas:
-                lemmas[token_lem] = {token}
-                lemma_pages[token_lem] = token_pages
-            else:
-                lemmas[token_lem].add(token)
-                lemma_pages[token_lem].union(token_pages)
-    return dict(sorted(lemmas.items(), key=lambda i: -len(i[1]))), lemma_pages
-
-
 def save_lemmas(lemmas):
-    print('Saving lemmas')
+    logger.info('Saving lemmas')
     with open('lemmas.txt', 'w') as file:
         for lemma, forms in lemmas.items():
             file.write(f'{lemma}: {" ".join(forms)}\n')
 
 
-def create_index(lemma_pages):
-    print('Creating index')
+def create_index(lemma_pages, doc_ids):
+    logger.info('Creating index')
+    write_index('inverted_index.bin', sorted_postings(lemma_pages), doc_ids)
+
+
+def create_positional_index(lemma_positions, doc_ids):
+    logger.info('Creating positional index')
+    write_index('inverted_index.bin', sorted_positional_postings(lemma_positions), doc_ids, FLAG_POSITIONS)
+
+
+def document_lemmas(counts, lemma_service, stopwords, positions=None):
+    # Леммы документа; для позиционного индекса — лемма -> отсортированные позиции всех её форм
+    tokens = [token for token in counts if token not in stopwords and len(token) > 1]
+    token_lemmas = lemma_service.lemmatize_batch(tokens)
+    if positions is None:
+        return {lemma for lemmas in token_lemmas.values() for lemma in lemmas}
+    lemma_positions = {}
+    for token, lemmas in token_lemmas.items():
+        for lemma in lemmas:
+            lemma_positions.setdefault(lemma, []).extend(positions[token])
+    for position_list in lemma_positions.values():
+        position_list.sort()
+    return lemma_positions
+
+
+def create_external_index(args):
+    # Индекс без сборки всех списков в памяти: документы разбираются по одному, списки лемм копятся
+    # в SpimiBuilder до --memory-budget мегабайт и сбрасываются на диск, затем прогоны сливаются в inverted_index.bin.
+    # В памяти остаются словарь токенов и таблица лемм — они нужны для tokens.txt и lemmas.txt
+    cache = ArtifactCache()
+    parser = available_parser(args.parser)
+    logger.info('Analyzing documents')
+    sources = document_sources('../task1/downloads', parser, args.positions)
+    table_file = cache.directory / 'lemma_table.txt'
+    lemma_service = LemmaService.load(table_file) if table_file.is_file() else LemmaService()
+    stopwords = english_stopwords()
+    vocabulary = set()
+    cache.directory.mkdir(parents=True, exist_ok=True)
+    with SpimiBuilder(int(args.memory_budget * 2 ** 20), args.positions, cache.directory) as builder:
+        documents = iter_documents('../task1/downloads', cache.directory / 'documents', parser, args.workers,
+                                   args.chunk_size, args.positions, sources)
+        for doc_id, counts, positions in documents:
+            vocabulary.update(counts)
+            builder.add(doc_id, document_lemmas(counts, lemma_service, stopwords, positions))
+        lemma_service.save(table_file)
+        tokens = remove_stopwords(sorted(vocabulary))
+        save_tokens(tokens)
+        save_lemmas(get_lemmas(tokens, lemma_service.table))
+        logger.info('Creating positional index' if args.positions else 'Creating index')
+        write_index('inverted_index.bin', builder.merged(), sources, FLAG_POSITIONS if args.positions else 0)
+
+
+def create_json_index(lemma_pages):
+    logger.info('Saving JSON index')
     with open('inverted_index.txt', 'w') as index_file:
         json_obj = []
         for key, value in lemma_pages.items():
             json_obj.append({
                 "count": len(value),
-                "inverted_array": list(value),
+                "inverted_array": sorted(value),
                 "word": key
             })
         json_str = json.dumps(json_obj)
@@ -128,11 +115,21 @@ def create_index(lemma_pages):
 
 # Перед выполнением нужно запустить task1/main.py для скачивания файлов
 if __name__ == '__main__':
-    contents = dir_reader('../task1/downloads')
-    texts = extract_text(contents)
-    tokens = tokenize_collection(texts)
-    tokens = remove_stopwords(tokens)
-    save_tokens(tokens)
-    lemmas, lemma_pages = get_lemmas(tokens)
-    save_lemmas(lemmas)
-    create_index(lemma_pages)
+    args = parse_args()
+    setup_logging()
+    if args.memory_budget:
+        create_external_index(args)
+        if args.json:
+            with BinaryIndex('inverted_index.bin') as index:
+                create_json_index({term: index.postings_at(i) for i, term in enumerate(index.terms())})
+    else:
+        analysis = analyze_collection('../task1/downloads', args)
+        save_tokens(analysis.tokens)
+        save_lemmas(analysis.lemmas)
+        if args.positions:
+            create_positional_index(analysis.lemma_positions, analysis.doc_ids)
+        else:
+            create_index(analysis.lemma_postings, analysis.doc_ids)
+        if args.json:
+            create_json_index(analysis.lemma_postings)
+    save_metrics(args.metrics)
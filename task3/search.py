@@ -1,11 +1,23 @@
-import collections
 import json
+import re
+import sys
+from pathlib import Path
 
-all_pages = {num for num in range(1, 101)}
+sys.path.append(str(Path(__file__).resolve().parent.parent))
 
+from common.binary_index import BinaryIndex
+from common.boolean_engine import NEAR_OPERATOR, BooleanEngine
+from common.segments import SegmentView
+from common.vector_snapshot import CURRENT_FILE, current_dir
 
-def load_index(json_filename):
-    with open(json_filename, 'r') as json_file:
+QUERY_TOKEN = re.compile(r'"[^"]*"|\(|\)|[^\s()"]+')
+
+
+def load_index(index_filename):
+    # Бинарный индекс отображается в память, списки документов декодируются только для терминов запроса
+    if index_filename.endswith('.bin'):
+        return BinaryIndex(index_filename)
+    with open(index_filename, 'r') as json_file:
         data = json.load(json_file)
     inverted_index = {}
     for item in data:
@@ -14,10 +26,8 @@ def load_index(json_filename):
 
 
 def tokenize_query(query):
-    query = query.replace('(', '( ')
-    query = query.replace(')', ' )')
-    query = query.split(' ')
-    return query
+    # Фраза в кавычках остаётся одним токеном
+    return QUERY_TOKEN.findall(query)
 
 
 def convert_to_postfix(infix_tokens):
@@ -31,6 +41,10 @@ def convert_to_postfix(infix_tokens):
     output = []
     operator_stack = []
 
+    # NEAR/k связывает сильнее всех остальных операторов
+    def operator_precedence(operator):
+        return 4 if NEAR_OPERATOR.fullmatch(operator) else precedence[operator]
+
     for token in infix_tokens:
         if token == '(':
             operator_stack.append(token)
@@ -39,10 +53,10 @@ def convert_to_postfix(infix_tokens):
             while operator != '(':
                 output.append(operator)
                 operator = operator_stack.pop()
-        elif token in precedence:
+        elif token in precedence or NEAR_OPERATOR.fullmatch(token):
             if operator_stack:
                 current_operator = operator_stack[-1]
-                while operator_stack and precedence[current_operator] > precedence[token]:
+                while operator_stack and operator_precedence(current_operator) > operator_precedence(token):
                     output.append(operator_stack.pop())
                     if operator_stack:
                         current_operator = operator_stack[-1]
@@ -55,42 +69,22 @@ def convert_to_postfix(infix_tokens):
     return output
 
 
-def bool_and(set1, set2):
-    return set1.intersection(set2)
-
-
-def bool_or(set1, set2):
-    return set1.union(set2)
-
-
-def bool_not(set1):
-    return all_pages.difference(set1)
-
-
 # Перед выполнением нужно запустить task1/main.py для скачивания файлов и task3/main.py для создания индекса
+# (старый inverted_index.txt можно перевести в бинарный формат: python -m common.binary_index inverted_index.txt inverted_index.bin)
 # Пример запроса: (hello OR world) AND NOT often
+# Фразы и близость слов (нужен индекс, построенный с --positions): "black hole" AND NOT star, black NEAR/3 hole
+# Если есть сегментный индекс (update_index.py), поиск идёт по его текущему срезу
 if __name__ == '__main__':
-    index = load_index('inverted_index.txt')
+    if Path('segments', CURRENT_FILE).is_file():
+        engine = SegmentView(current_dir('segments'))
+    else:
+        index = load_index('inverted_index.bin' if Path('inverted_index.bin').is_file() else 'inverted_index.txt')
+        engine = BooleanEngine(index)
     query = tokenize_query(input('Enter query: '))
-    results_stack = []
-    token_queue = collections.deque(convert_to_postfix(query))
     try:
-        while token_queue:
-            token = token_queue.popleft()
-            if token != 'AND' and token != 'OR' and token != 'NOT':
-                results_stack.append(index[token] if token in index else set())
-            elif token == 'AND':
-                set1 = results_stack.pop()
-                set2 = results_stack.pop()
-                results_stack.append(bool_and(set1, set2))
-            elif token == 'OR':
-                set1 = results_stack.pop()
-                set2 = results_stack.pop()
-                results_stack.append(bool_or(set1, set2))
-            elif token == 'NOT':
-                set1 = results_stack.pop()
-                results_stack.append(bool_not(set1))
-        result = results_stack.pop()
+        result = engine.search(convert_to_postfix(query))
         print(result if result else 'No results found.')
     except IndexError:
         print('Error: invalid query.')
+    except ValueError as e:
+        print(f'Error: {e.args[0]}')
@@ -0,0 +1,91 @@
+import argparse
+import json
+import logging
+import shutil
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common.analysis import analyze_documents, lemmatize_vocabulary
+from common.cache import CACHE_DIR
+from common.extraction import add_extraction_args, available_parser
+from common.metrics import add_metrics_args, save_metrics, setup_logging
+from common.segments import SegmentStore
+from common.vector_snapshot import load_index
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Сегментный индекс: добавление и удаление документов без пересборки')
+    add_extraction_args(parser)
+    add_metrics_args(parser)
+    parser.add_argument('--segments', default='segments')
+    parser.add_argument('--pages', default='../task1/downloads')
+    parser.add_argument('--urls', default='../task1/index.txt')
+    parser.add_argument('--manifest', default='../task1/manifest.json')
+    parser.add_argument('--positions', action='store_true',
+                        help='сохранить позиции слов для поиска фраз и NEAR/k')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild', help='все скачанные страницы в один новый сегмент')
+    commands.add_parser('sync', help='изменения последнего инкрементального запуска task1 (manifest.json)')
+    add = commands.add_parser('add', help='добавить или обновить документы')
+    add.add_argument('doc_ids', type=int, nargs='+')
+    delete = commands.add_parser('delete', help='удалить документы')
+    delete.add_argument('doc_ids', type=int, nargs='+')
+    commands.add_parser('merge', help='слить сегменты по политике слияния')
+    return parser.parse_args()
+
+
+def analyze_pages(args, doc_ids=None):
+    # Разбор страниц с кешем по документам (common/analysis.py): заново разбираются только изменившиеся;
+    # для add и sync читаются и хешируются только страницы doc_ids, а не всё хранилище
+    token_counts, token_positions, _ = analyze_documents(
+        args.pages, CACHE_DIR / 'documents', available_parser(args.parser), args.workers, args.chunk_size,
+        args.positions, doc_ids)
+    if doc_ids is not None:
+        missing = set(doc_ids) - set(token_counts)
+        if missing:
+            raise ValueError(f'No downloaded pages for documents {sorted(missing)}')
+    vocabulary = set()
+    for counts in token_counts.values():
+        vocabulary.update(counts)
+    token_lemmas = lemmatize_vocabulary(sorted(vocabulary), CACHE_DIR / 'lemma_table.txt')
+    return token_counts, token_positions, token_lemmas
+
+
+def add_documents(store, args, doc_ids=None):
+    token_counts, token_positions, token_lemmas = analyze_pages(args, doc_ids)
+    if token_counts:
+        logger.info(f'Adding {len(token_counts)} documents')
+        store.add_documents(token_counts, token_positions, token_lemmas, load_index(args.urls))
+
+
+def last_run(manifest_file):
+    with open(manifest_file, 'r') as file:
+        return json.load(file)['last_run']
+
+
+# Перед выполнением нужно запустить task1/main.py; поиск по сегментам — search.py и task5/main.py --segments
+if __name__ == '__main__':
+    args = parse_args()
+    setup_logging()
+    store = SegmentStore(args.segments)
+    if args.command == 'rebuild':
+        shutil.rmtree(args.segments, ignore_errors=True)
+        add_documents(store, args)
+    elif args.command == 'sync':
+        run = last_run(args.manifest)
+        if run['removed']:
+            logger.info(f'Deleting {len(run["removed"])} documents')
+            store.delete_documents(run['removed'])
+        if run['changed']:
+            add_documents(store, args, run['changed'])
+    elif args.command == 'add':
+        add_documents(store, args, args.doc_ids)
+    elif args.command == 'delete':
+        store.delete_documents(args.doc_ids)
+    elif args.command == 'merge':
+        store.merge()
+    save_metrics(args.metrics)
@@ -1,166 +1,67 @@
-import math
-import os
-import re
-import nltk
+import argparse
+import logging
+import sys
 from pathlib import Path
-from os import listdir
-from bs4 import BeautifulSoup as bs
-from natsort import natsorted
-from nltk.corpus import stopwords, words
-from nltk.stem import WordNetLemmatizer
 
-nltk.download('wordnet')
-nltk.download('words')
-nltk.download('stopwords')
+sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-lemmatizer = WordNetLemmatizer()
-words = set(words.words())
-en_stopwords = stopwords.words('english')
+from common.analysis import analyze_collection
+from common.extraction import add_extraction_args
+from common.metrics import add_metrics_args, path_size, save_metrics, setup_logging, stage
+from common.sparse_store import save_csr
+from common.tfidf import build_count_matrix, count_lemmas, export_text, tf_idf_matrix
 
+logger = logging.getLogger(__name__)
 
-def dir_reader(directory):
-    files = natsorted([file for file in listdir(directory) if file.endswith('txt')])
-    files_content = []
-    for file in files:
-        files_content.append(file_reader(f'{directory}/{file}'))
-    return files_content
 
+def parse_args():
+    parser = argparse.ArgumentParser()
+    add_extraction_args(parser)
+    add_metrics_args(parser)
+    parser.add_argument('--no-text', action='store_true',
+                        help='не выгружать tf-idf в текстовые файлы termins/N.txt и lemmas/N.txt')
+    return parser.parse_args()
 
-def file_reader(filename):
-    with open(filename, 'r') as file:
-        return ''.join(file.readlines())
 
-
-def extract_text(htmls):
-    print('Extracting text')
-    texts = []
-    for html in htmls:
-        texts.append(clean_html(html))
-    return texts
-
-
-def clean_html(html):
-    soup = bs(html, features="html.parser")
-    for script in soup(["script", "style"]):
-        script.extract()
-
-    if soup.find('body') is not None:
-        text = soup.find('body').get_text()
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = '\n'.join(chunk for chunk in chunks if chunk)
-        return text
-
-
-def save_cleaned_htmls_if_needed(htmls_directory, save_directory):
-    cleaned_htmls_dir = save_directory
-    if Path(cleaned_htmls_dir).is_dir() and len(listdir(cleaned_htmls_dir)) > 0:
-        return
-    print('Cleaning htmls and saving texts')
-    htmls = dir_reader(htmls_directory)
-    texts = extract_text(htmls)
-    Path(cleaned_htmls_dir).mkdir(parents=True, exist_ok=True)
-    for i, text in enumerate(texts):
-        with open(f'{cleaned_htmls_dir}/{i + 1}.txt', 'w') as file:
-            file.write(text)
-
-
-def tokenize_with_count(text):
-    text = text.lower()
-    t = re.sub(r'[^A-Za-z-]', ' ', text)
-    t = re.sub(r'\d', '', t)
-    t = t.split(' ')
-    t = filter(lambda chunk: chunk in words and len(chunk) > 1, t)
-    token_count_dict = {}
-    for token in t:
-        if token in token_count_dict:
-            token_count_dict[token] += 1
-        else:
-            token_count_dict[token] = 1
-    return token_count_dict
-
-
-def count_tokens(texts):
-    print('Counting termins')
-    token_count_dicts = []
-    for i, text in enumerate(texts):
-        token_count_dicts.append(tokenize_with_count(text))
-    return token_count_dicts
-
-
-def load_termins(termins_file):
-    print('Loading termins')
-    termins_set = set()
-    with open(termins_file, 'r') as file:
-        for line in file:
-            termins_set.add(line.strip())
-    return termins_set
-
-
-def load_lemmas(lemmas_file):
-    print('Loading lemmas')
-    lemma_form_dict = {}
-    with open(lemmas_file, 'r') as file:
-        for line in file:
-            parts = line.strip().split(':')
-            word = parts[0].strip()
-            forms = [form.strip() for form in parts[1].split()]
-            lemma_form_dict[word] = forms
-    return lemma_form_dict
-
-
-def count_lemma_forms(lemma_form_dict, token_count_dicts):
-    print('Counting lemma forms')
-    lemma_count_dicts = []
-    for token_count_dict in token_count_dicts:
-        lemma_count_dict = {}
-        for lemma, forms in lemma_form_dict.items():
-            count = 0
-            for form in forms:
-                if form in token_count_dict:
-                    count += token_count_dict[form]
-            if count != 0:
-                lemma_count_dict[lemma] = count
-        lemma_count_dicts.append(lemma_count_dict)
-    return lemma_count_dicts
+def count_lemma_forms(token_count_matrix, vocabulary, lemma_vocabulary, lemma_form_dict):
+    logger.info('Counting lemma forms')
+    return count_lemmas(token_count_matrix, vocabulary, lemma_vocabulary, lemma_form_dict)
 
 
 def calculate_doc_word_sums(token_count_dicts):
-    print('Counting total word number per doc')
+    logger.info('Counting total word number per doc')
     sums = []
     for token_count_dict in token_count_dicts:
         sums.append(sum(token_count_dict.values()))
     return sums
 
 
-def calculate_tf_idf(result_dir, word_count_dicts, termins_set, doc_word_sums):
-    print(f'Calculating tf-idf for {result_dir}')
-    Path(result_dir).mkdir(parents=True, exist_ok=True)
-    for file in listdir(result_dir):
-        os.remove(os.path.join(result_dir, file))
-    doc_count = len(word_count_dicts)
-    for i, word_count_dict in enumerate(word_count_dicts):
-        with open(f'{result_dir}/{i + 1}.txt', 'a') as file:
-            for word, count in word_count_dict.items():
-                if word not in termins_set:
-                    continue
-                tf = count / doc_word_sums[i]
-                idf = math.log(doc_count / sum(1 for d in word_count_dicts if word in d))
-                tf_idf = tf * idf
-                if idf == 0.0:
-                    file.write(f'{word} 0.0 0.0\n')
-                else:
-                    file.write(f'{word} {idf:.20f} {tf_idf:.20f}\n')
+def calculate_tf_idf(result_dir, count_matrix, vocabulary, doc_word_sums, doc_ids, export):
+    # Матрица tf-idf сохраняется в result_dir_matrix, текстовые файлы — по желанию
+    logger.info(f'Calculating tf-idf for {result_dir}')
+    with stage('tfidf') as tfidf:
+        tf_idf, idf = tf_idf_matrix(count_matrix, doc_word_sums)
+        save_csr(f'{result_dir}_matrix', tf_idf, vocabulary, idf=idf, doc_ids=doc_ids)
+        tfidf.add(docs=count_matrix.shape[0], bytes_written=path_size(f'{result_dir}_matrix'))
+        if export:
+            export_text(result_dir, tf_idf, idf, vocabulary, doc_ids)
+            tfidf.add(bytes_written=path_size(result_dir))
 
 
-# Перед выполнением нужно запустить task1/main.py и task2/main.py
+# Перед выполнением нужно запустить task1/main.py; токены, леммы и частоты берутся из общего анализа коллекции
 if __name__ == '__main__':
-    save_cleaned_htmls_if_needed('../task1/downloads', 'cleaned_htmls')
-    texts = dir_reader('cleaned_htmls')
-    termins_set = load_termins('../task2/tokens.txt')
-    lemma_form_dict = load_lemmas('../task2/lemmas.txt')
-    token_count_dicts = count_tokens(texts)
-    lemma_count_dicts = count_lemma_forms(lemma_form_dict, token_count_dicts)
+    args = parse_args()
+    setup_logging()
+    analysis = analyze_collection('../task1/downloads', args)
+    termins_set = set(analysis.tokens)
+    lemma_form_dict = analysis.lemmas
+    doc_ids = analysis.doc_ids
+    token_count_dicts = [analysis.token_counts[doc_id] for doc_id in doc_ids]
+    token_count_matrix = build_count_matrix(token_count_dicts, analysis.tokens)
+    # Как и раньше, учитываются только леммы, которые сами встречаются среди терминов
+    lemma_vocabulary = [lemma for lemma in lemma_form_dict if lemma in termins_set]
+    lemma_count_matrix = count_lemma_forms(token_count_matrix, analysis.tokens, lemma_vocabulary, lemma_form_dict)
     doc_word_sums = calculate_doc_word_sums(token_count_dicts)
-    calculate_tf_idf('termins', token_count_dicts, termins_set, doc_word_sums)
-    calculate_tf_idf('lemmas', lemma_count_dicts, termins_set, doc_word_sums)
+    calculate_tf_idf('termins', token_count_matrix, analysis.tokens, doc_word_sums, doc_ids, not args.no_text)
+    calculate_tf_idf('lemmas', lemma_count_matrix, lemma_vocabulary, doc_word_sums, doc_ids, not args.no_text)
+    save_metrics(args.metrics)
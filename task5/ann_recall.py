@@ -0,0 +1,62 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common.vector_snapshot import VectorSnapshot, current_dir
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=200, help='число случайных запросов')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def sample_queries(documents, idf, count, seed):
+    # Запрос — от 1 до 4 лемм случайного документа с весами tf * idf, как у запросов из формы
+    rng = np.random.default_rng(seed)
+    queries = []
+    while len(queries) < count:
+        row = rng.integers(documents.shape[0])
+        lemmas = documents.indices[documents.indptr[row]:documents.indptr[row + 1]]
+        if not len(lemmas):
+            continue
+        chosen = rng.choice(lemmas, min(len(lemmas), rng.integers(1, 5)), replace=False)
+        queries.append({int(j): idf[j] / len(chosen) for j in chosen})
+    return queries
+
+
+def timed(function, queries):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append(function(query)[0])
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def recall(exact_results, approximate_results):
+    values = []
+    for exact, approximate in zip(exact_results, approximate_results):
+        if len(exact):
+            values.append(len(np.intersect1d(exact, approximate)) / len(exact))
+    return np.mean(values) if values else 1.0
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    snapshot = VectorSnapshot(current_dir('vector_store'))
+    if snapshot.ivf_index is None:
+        sys.exit('Error: the index has no ANN part, rebuild it with create_vector_matrix.py without --no-ann')
+    queries = sample_queries(snapshot.documents, snapshot.idf, args.queries, args.seed)
+    exact_results, exact_time = timed(lambda query: snapshot.engine.top_k(query, args.k), queries)
+    print(f'exact: {exact_time:.3f} ms/query')
+    for nprobe in args.nprobe:
+        results, ann_time = timed(lambda query: snapshot.ivf_index.search(query, args.k, nprobe), queries)
+        print(f'nprobe={nprobe}: recall@{args.k} {recall(exact_results, results):.3f}, {ann_time:.3f} ms/query')
@@ -0,0 +1,46 @@
+import argparse
+import logging
+import shutil
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common.analysis import analyze_collection
+from common.extraction import add_extraction_args
+from common.metrics import setup_logging
+from common.sharding import write_shards
+from common.tfidf import build_count_matrix, termin_lemma_counts
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    add_extraction_args(parser)
+    parser.add_argument('--shards', type=int, default=4, help='число шардов')
+    parser.add_argument('--output', default='shards')
+    parser.add_argument('--positions', action='store_true',
+                        help='сохранить позиции слов для поиска фраз и NEAR/k')
+    return parser.parse_args()
+
+
+def lemma_count_matrix(analysis):
+    logger.info('Counting lemmas')
+    token_count_dicts = [analysis.token_counts[doc_id] for doc_id in analysis.doc_ids]
+    token_count_matrix = build_count_matrix(token_count_dicts, analysis.tokens)
+    counts, lemma_vocabulary = termin_lemma_counts(token_count_matrix, analysis.tokens, analysis.lemmas)
+    doc_word_sums = [sum(token_count_dict.values()) for token_count_dict in token_count_dicts]
+    return counts, doc_word_sums, lemma_vocabulary
+
+
+# Перед выполнением нужно запустить task1/main.py; шарды используются в shard_search.py
+if __name__ == '__main__':
+    args = parse_args()
+    setup_logging()
+    analysis = analyze_collection('../task1/downloads', args)
+    counts, doc_word_sums, lemma_vocabulary = lemma_count_matrix(analysis)
+    logger.info(f'Writing {args.shards} shards')
+    write_shards(args.output, args.shards, analysis.doc_ids, counts, doc_word_sums, lemma_vocabulary,
+                 analysis.lemma_postings, analysis.lemma_positions if args.positions else None)
+    shutil.copy('../task1/index.txt', Path(args.output) / 'index.txt')
@@ -1,8 +1,36 @@
+import argparse
+import logging
+import sys
+from os import listdir
+from pathlib import Path
+
 import numpy as np
+from scipy import sparse
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common.ann import build_ivf
+from common.lemmatizer import LemmaService
+from common.metrics import add_metrics_args, path_size, save_metrics, setup_logging, stage
+from common.ranking import normalize_rows
+from common.sparse_store import load_array, load_csr, load_terms
+from common.vector_snapshot import load_index, new_version_path, prune, publish, write_vector_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clusters', type=int, default=None,
+                        help='число кластеров приближённого индекса (по умолчанию корень из числа документов)')
+    parser.add_argument('--iterations', type=int, default=20, help='число итераций k-средних')
+    parser.add_argument('--no-ann', action='store_true', help='не строить приближённый индекс')
+    add_metrics_args(parser)
+    return parser.parse_args()
 
 
 def load_lemmas(lemmas_file):
-    print('Loading lemmas')
+    logger.info('Loading lemmas')
     lemmas = []
     with open(lemmas_file, 'r') as file:
         for line in file:
@@ -12,22 +40,85 @@ def load_lemmas(lemmas_file):
     return lemmas
 
 
+def vocabulary_columns(lemma_vocabulary):
+    return {lemma: j for j, lemma in enumerate(lemma_vocabulary)}
+
+
 def calculate_vector_matrix(lemma_vocabulary, tfidf_directory):
-    print('Calculating vector matrix')
-    doc_lemma_matrix = np.zeros((100, len(lemma_vocabulary)))
-    for i in range(100):
-        with open(f'{tfidf_directory}/{i + 1}.txt', 'r') as f:
+    # Из текстовых файлов task4 N.txt (N — номер документа): по строке «лемма idf tf-idf» на каждую лемму документа.
+    # Номера берутся из имён файлов: после удалений и инкрементальных обходов они идут с пропусками
+    logger.info('Calculating vector matrix')
+    columns = vocabulary_columns(lemma_vocabulary)
+    doc_ids = sorted(int(Path(file).stem) for file in listdir(tfidf_directory) if file.endswith('.txt'))
+    doc_freqs = np.zeros(len(lemma_vocabulary), dtype=np.int64)
+    indptr = [0]
+    indices = []
+    data = []
+    for doc_id in doc_ids:
+        with open(f'{tfidf_directory}/{doc_id}.txt', 'r') as f:
             for line in f:
                 values = line.strip().split()
                 lemma, tfidf = values[0], values[2]
-                if lemma in lemma_vocabulary:
-                    j = lemma_vocabulary.index(lemma)
-                    doc_lemma_matrix[i, j] = tfidf
-    return doc_lemma_matrix
+                j = columns.get(lemma)
+                if j is not None:
+                    indices.append(j)
+                    data.append(float(tfidf))
+                    doc_freqs[j] += 1
+        indptr.append(len(indices))
+    doc_lemma_matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(doc_ids), len(lemma_vocabulary)))
+    return doc_lemma_matrix, doc_freqs, np.array(doc_ids, dtype=np.int64)
+
+
+def load_vector_matrix(lemma_vocabulary, matrix_directory):
+    # Из бинарной матрицы task4: столбцы переставляются под порядок лемм из lemmas.txt
+    logger.info('Loading vector matrix')
+    columns = vocabulary_columns(lemma_vocabulary)
+    tfidf = load_csr(matrix_directory, mmap=False)
+    column_map = np.array([columns.get(lemma, -1) for lemma in load_terms(matrix_directory)], dtype=np.int64)
+    # Частоты документов считаются по структуре матрицы task4, где сохранены и нулевые веса (idf = 0)
+    doc_freqs = np.zeros(len(lemma_vocabulary), dtype=np.int64)
+    task4_doc_freqs = np.bincount(tfidf.indices, minlength=tfidf.shape[1])
+    doc_freqs[column_map[column_map >= 0]] = task4_doc_freqs[column_map >= 0]
+    tfidf = sparse.csr_matrix(tfidf[:, np.flatnonzero(column_map >= 0)])
+    column_map = column_map[column_map >= 0]
+    doc_lemma_matrix = sparse.csr_matrix((tfidf.data, column_map[tfidf.indices], tfidf.indptr),
+                                         shape=(tfidf.shape[0], len(lemma_vocabulary)))
+    return doc_lemma_matrix, doc_freqs, load_array(matrix_directory, 'doc_ids', mmap=False)
+
+
+def inverse_document_frequencies(doc_freqs, doc_count):
+    # idf для запросов считается один раз при сборке; у лемм, которых нет ни в одном документе, idf = 0
+    idf = np.zeros(len(doc_freqs))
+    present = doc_freqs > 0
+    idf[present] = np.log(doc_count / doc_freqs[present])
+    return idf
 
 
 if __name__ == '__main__':
-    lemma_vocabulary = load_lemmas('../task2/lemmas.txt')
-    doc_lemma_matrix = calculate_vector_matrix(lemma_vocabulary, '../task4/lemmas')
-    doc_lemma_matrix_normalized = np.apply_along_axis(lambda x: x / np.linalg.norm(x), 1, doc_lemma_matrix)
-    np.save('vector_matrix_normalized.npy', doc_lemma_matrix_normalized)
+    args = parse_args()
+    setup_logging()
+    with stage('matrix') as matrix:
+        lemma_vocabulary = load_lemmas('../task2/lemmas.txt')
+        if Path('../task4/lemmas_matrix').is_dir():
+            doc_lemma_matrix, doc_freqs, doc_ids = load_vector_matrix(lemma_vocabulary, '../task4/lemmas_matrix')
+        else:
+            doc_lemma_matrix, doc_freqs, doc_ids = calculate_vector_matrix(lemma_vocabulary, '../task4/lemmas')
+        doc_lemma_matrix_normalized = normalize_rows(doc_lemma_matrix)
+        idf = inverse_document_frequencies(doc_freqs, doc_lemma_matrix.shape[0])
+        ivf = None
+        if not args.no_ann:
+            logger.info('Building ANN index')
+            ivf = build_ivf(doc_lemma_matrix_normalized, args.clusters, args.iterations)
+        # Словарь, idf, ссылки, таблица лемм, матрица, её столбцы (лемма -> документы) для MaxScore
+        # и приближённый индекс пишутся одним файлом новой версии, который становится текущим
+        # только целиком (vector_snapshot.py)
+        logger.info('Writing index snapshot')
+        version_path = new_version_path('vector_store')
+        write_vector_snapshot(version_path, lemma_vocabulary, idf, doc_ids, doc_lemma_matrix_normalized,
+                              load_index('../task1/index.txt'), LemmaService.load('../task2/lemma_table.txt').table,
+                              ivf)
+        matrix.add(docs=doc_lemma_matrix.shape[0], bytes_written=path_size(version_path))
+    publish('vector_store', version_path)
+    prune('vector_store')
+    logger.info(f'Published index version {version_path.name}')
+    save_metrics(args.metrics)
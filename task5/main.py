@@ -1,113 +1,215 @@
-import math
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from nltk.stem import WordNetLemmatizer
+import argparse
+import os
+import sys
+from collections import Counter
+from pathlib import Path
+
 from flask import Flask, request, jsonify
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common.ann import DEFAULT_NPROBE
+from common.metrics import REGISTRY, SamplingProfiler, setup_logging
+from common.query_cache import QueryCache
+from common.ranking import batch_top_k, top_documents
+from common.segments import BackgroundMerger, SegmentSnapshot, SegmentStore
+from common.tfidf import calculate_query_tfidf, lemmatize_query
+from common.vector_snapshot import SnapshotHolder
+
 app = Flask(__name__)
 
+# Метрики процесса на /metrics; под gunicorn у каждого рабочего процесса свои значения
+SEARCH_PHASE_SECONDS = REGISTRY.histogram('infosearch_search_phase_seconds', 'Time spent in a /search phase',
+                                          ['phase'])
+REQUEST_SECONDS = REGISTRY.histogram('infosearch_request_seconds', 'Request handling time', ['endpoint'])
+REQUEST_ERRORS = REGISTRY.counter('infosearch_request_errors_total', 'Requests answered with an error', ['endpoint'])
+QUERY_CACHE_GAUGES = {stat: REGISTRY.gauge(f'infosearch_query_cache_{stat}', f'Query cache {stat}')
+                      for stat in ('hits', 'misses', 'entries', 'bytes')}
+
 
-def load_index(index_file):
-    index = []
-    with open(index_file, 'r') as file:
-        for line in file:
-            parts = line.strip().split()
-            index.append(parts[1])
-    return index
-
-
-def load_lemmas(lemmas_file):
-    lemmas = []
-    with open(lemmas_file, 'r') as file:
-        for line in file:
-            parts = line.strip().split(':')
-            lemma = parts[0].strip()
-            lemmas.append(lemma)
-    return lemmas
-
-
-def load_lemmas_in_docs_list(lemmas_dir):
-    lemmas_in_docs = []
-    for i in range(100):
-        with open(f'{lemmas_dir}/{i + 1}.txt', 'r') as file:
-            doc_lemmas = set()
-            for line in file:
-                doc_lemmas.add(line.strip().split()[0])
-            lemmas_in_docs.append(doc_lemmas)
-    return lemmas_in_docs
-
-
-def lemmatize_query(query, lemmatizer, lemma_vocabulary):
-    lemma_set = set(lemma_vocabulary)
-    lemmatized_query = []
-    parts_of_speech = ["a", "s", "r", "n", "v"]
-    for token in query:
-        for part_of_speech in parts_of_speech:
-            lemma = lemmatizer.lemmatize(token, part_of_speech)
-            if lemma in lemma_set:
-                lemmatized_query.append(lemma)
-                break
-    return lemmatized_query
-
-
-def calculate_query_tfidf(query, lemmas_in_docs):
-    query_lemma_count_dict = {}
-    for lemma in query:
-        if lemma in query_lemma_count_dict:
-            query_lemma_count_dict[lemma] += 1
+def query_key(version, query_lemmatized, k, mode, nprobe):
+    # Нормализованный запрос: мультимножество лемм (порядок и словоформы не важны) и параметры поиска.
+    # Версия в ключе не даёт запросу, начатому на старом снимке, положить в кеш устаревший результат
+    return version, tuple(sorted(Counter(query_lemmatized).items())), k, mode, nprobe if mode == 'ann' else None
+
+
+def search(query_tfidf, engine, doc_ids, index, k=10, ann=None, nprobe=DEFAULT_NPROBE):
+    # ann — приближённый индекс IVF; без него точный top-k через MaxScore (векторизованный, см. RankedEngine).
+    # MaxScore сам отбирает лучшие документы, поэтому у точного поиска фаза top_k — только сборка ответа
+    with SEARCH_PHASE_SECONDS.time(phase='scoring'):
+        if ann is None:
+            rows, scores = engine.top_k(query_tfidf, k)
         else:
-            query_lemma_count_dict[lemma] = 1
-    query_lemma_tfidf_dict = {}
-    for lemma, count in query_lemma_count_dict.items():
-        tf = count / len(query)
-        idf = math.log(100 / sum(1 for s in lemmas_in_docs if lemma in s))
-        query_lemma_tfidf_dict[lemma] = tf * idf
-    return query_lemma_tfidf_dict
-
-
-def convert_query_to_vector(query_tfidf, lemma_vocabulary):
-    vector = np.zeros(len(lemma_vocabulary))
-    for lemma, tfidf in query_tfidf.items():
-        if lemma in lemma_vocabulary:
-            i = lemma_vocabulary.index(lemma)
-            vector[i] = tfidf
-    vector_normalized = vector / np.linalg.norm(vector)
-    return vector_normalized
-
-
-def search(query_vector, doc_lemma_matrix_normalized, index):
-    cos_similarities = cosine_similarity([query_vector], doc_lemma_matrix_normalized)[0]
-    indices = cos_similarities.argsort()[::-1]
-    docs = []
-    for i in range(10):
-        docs.append(index[indices[i]])
-    return docs
+            rows, scores = ann.candidates(query_tfidf, nprobe)
+    with SEARCH_PHASE_SECONDS.time(phase='top_k'):
+        if ann is not None:
+            rows, scores = top_documents(rows, scores, k)
+        return [index[int(doc_ids[row])] for row in rows]
+
+
+def vectorize_and_search(query_lemmatized, snapshot, k, ann, nprobe):
+    with SEARCH_PHASE_SECONDS.time(phase='vectorization'):
+        query_tfidf = calculate_query_tfidf(query_lemmatized, snapshot.vocabulary, snapshot.idf)
+    return search(query_tfidf, snapshot.engine, snapshot.doc_ids, snapshot.index, k, ann, nprobe)
+
+
+def search_batch(query_tfidfs, postings, doc_ids, index, k=10):
+    # Пакет запросов оценивается одним матричным умножением на столбцы матрицы (лемма -> документы),
+    # top-k каждого — через argpartition
+    return [[index[int(doc_ids[row])] for row in rows]
+            for rows, scores in batch_top_k(query_tfidfs, postings, k)]
+
+
+class InvalidRequest(Exception):
+    # Ошибка в параметрах запроса: отвечаем 400 с сообщением, 500 остаётся для сбоев сервера
+    pass
+
+
+def parse_positive(value, name):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = 0
+    if isinstance(value, bool) or number < 1:
+        raise InvalidRequest(f'{name} must be a positive integer')
+    return number
+
+
+def select_ann(mode, snapshot):
+    if mode == 'exact':
+        return None
+    if mode != 'ann':
+        raise InvalidRequest(f'Unknown search mode: {mode}')
+    if snapshot.ivf_index is None:
+        raise InvalidRequest('ANN index is not built, rebuild the index without --no-ann')
+    return snapshot.ivf_index
+
+
+def parse_batch(payload):
+    if not isinstance(payload, dict) or not isinstance(payload.get('queries'), list):
+        raise InvalidRequest('Expected a JSON object with a "queries" list')
+    if not all(isinstance(query, str) for query in payload['queries']):
+        raise InvalidRequest('Every query must be a string')
+    return payload['queries'], parse_positive(payload.get('k', 10), 'k')
+
+
+def error_response(endpoint, error, description):
+    REQUEST_ERRORS.inc(endpoint=endpoint)
+    if isinstance(error, InvalidRequest):
+        return str(error), 400
+    app.logger.exception('%s failed for %r', endpoint, description)
+    return 'Internal server error', 500
+
+
+def current_snapshot():
+    # Снимок берётся один раз на запрос: подмена версии не затрагивает уже начатые запросы
+    snapshot = snapshots.get()
+    query_cache.set_version(snapshot.version)
+    return snapshot
 
 
 @app.route('/')
 def main_page():
-    with open('search.html', 'r') as f:
-        html = f.read()
-    return html
+    return search_page
 
 
 @app.route('/search', methods=['POST'])
 def search_query():
-    query = request.form['query']
-    try:
-        query_lemmatized = lemmatize_query(query.lower().strip().split(), lemmatizer, lemma_vocabulary)
-        query_tfidf = calculate_query_tfidf(query_lemmatized, lemmas_in_docs)
-        query_vector = convert_query_to_vector(query_tfidf, lemma_vocabulary)
-        search_results = search(query_vector, doc_lemma_matrix_normalized, index)
-        return jsonify(search_results)
-    except Exception as e:
-        return e.args[0], 500
+    with REQUEST_SECONDS.time(endpoint='search'):
+        query = request.form.get('query')
+        try:
+            if query is None:
+                raise InvalidRequest('Missing query')
+            k = parse_positive(request.form.get('k', 10), 'k')
+            mode = request.form.get('mode', 'exact')
+            nprobe = parse_positive(request.form.get('nprobe', DEFAULT_NPROBE), 'nprobe')
+            snapshot = current_snapshot()
+            ann = select_ann(mode, snapshot)
+            with SEARCH_PHASE_SECONDS.time(phase='lemmatization'):
+                query_lemmatized = lemmatize_query(query.lower().strip().split(), snapshot.lemmatizer,
+                                                   snapshot.vocabulary)
+            # При попадании в кеш векторизация и оценка не выполняются и в гистограммы не попадают
+            search_results = query_cache.get_or_compute(
+                query_key(snapshot.version, query_lemmatized, k, mode, nprobe),
+                lambda: vectorize_and_search(query_lemmatized, snapshot, k, ann, nprobe))
+            return jsonify(search_results)
+        except Exception as e:
+            return error_response('search', e, query)
+
+
+@app.route('/search/batch', methods=['POST'])
+def search_batch_query():
+    # Тело запроса: {"queries": ["...", ...], "k": 10}; ответ — списки ссылок в порядке запросов
+    with REQUEST_SECONDS.time(endpoint='search_batch'):
+        payload = request.get_json(force=True, silent=True)
+        try:
+            queries, k = parse_batch(payload)
+            snapshot = current_snapshot()
+            query_tfidfs = []
+            for query in queries:
+                query_lemmatized = lemmatize_query(query.lower().strip().split(), snapshot.lemmatizer,
+                                                   snapshot.vocabulary)
+                query_tfidfs.append(calculate_query_tfidf(query_lemmatized, snapshot.vocabulary, snapshot.idf))
+            return jsonify(search_batch(query_tfidfs, snapshot.engine.postings, snapshot.doc_ids, snapshot.index, k))
+        except Exception as e:
+            return error_response('search_batch', e, payload)
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(query_cache.stats())
+
+
+@app.route('/metrics')
+def metrics():
+    stats = query_cache.stats()
+    for stat, gauge in QUERY_CACHE_GAUGES.items():
+        gauge.set(stats[stat])
+    return REGISTRY.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+@app.route('/metrics/profile')
+def profile():
+    # Свёрнутые стеки для flamegraph.pl или speedscope; ?reset=1 начинает накопление заново
+    if profiler is None:
+        return 'Profiler is disabled, start the server with --profile', 404
+    result = profiler.collapsed()
+    if request.args.get('reset'):
+        profiler.reset()
+    return result, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--segments', default=os.environ.get('SEGMENTS'),
+                        help='искать по сегментному индексу (task3/update_index.py), например ../task3/segments')
+    parser.add_argument('--profile', type=float, default=os.environ.get('PROFILE_INTERVAL'),
+                        help='включить сэмплирующий профилировщик с этим интервалом в секундах (/metrics/profile)')
+    return parser.parse_args()
+
+
+def init(vector_store='vector_store', segments=None, profile_interval=None):
+    # Всё, что нужно для поиска, загружается один раз на процесс. Под gunicorn с --preload (wsgi.py)
+    # это делает главный процесс до fork, и рабочие процессы делят отображённые в память массивы
+    global snapshots, query_cache, search_page, profiler
+    if segments:
+        # Срез сегментного индекса; новые сегменты и удаления подхватываются так же, как новые версии,
+        # а слияние сегментов идёт в фоне
+        snapshots = SnapshotHolder(segments, SegmentSnapshot)
+        BackgroundMerger(SegmentStore(segments)).start()
+    else:
+        # Файл текущей версии индекса (словарь, idf, ссылки, таблица лемм, матрицы) отображается в память;
+        # новая версия из create_vector_matrix.py подхватывается без перезапуска
+        snapshots = SnapshotHolder(vector_store)
+    # Результаты запросов кешируются для загруженной версии индекса
+    query_cache = QueryCache(version=snapshots.snapshot.version)
+    with open('search.html', 'r') as f:
+        search_page = f.read()
+    profiler = SamplingProfiler(float(profile_interval)).start() if profile_interval else None
 
 
 if __name__ == '__main__':
-    lemmatizer = WordNetLemmatizer()
-    index = load_index('../task1/index.txt')
-    lemma_vocabulary = load_lemmas('../task2/lemmas.txt')
-    doc_lemma_matrix_normalized = np.load('vector_matrix_normalized.npy')
-    lemmas_in_docs = load_lemmas_in_docs_list('../task4/lemmas')
+    args = parse_args()
+    setup_logging(sys.stderr)
+    init(segments=args.segments, profile_interval=args.profile)
     app.run()
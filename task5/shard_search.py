@@ -0,0 +1,46 @@
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common.lemmatizer import LemmaService
+from common.sharding import ShardCoordinator
+from common.tfidf import calculate_query_tfidf, lemmatize_query
+from common.vector_snapshot import load_index
+from task3.search import convert_to_postfix, tokenize_query
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shards', default='shards', help='каталог, созданный build_shards.py')
+    parser.add_argument('--mode', choices=['ranked', 'boolean'], default='ranked')
+    parser.add_argument('--k', type=int, default=10)
+    return parser.parse_args()
+
+
+def ranked_search(query, coordinator, lemmatizer, index, k):
+    query_lemmatized = lemmatize_query(query.lower().strip().split(), lemmatizer, coordinator.vocabulary)
+    query_tfidf = calculate_query_tfidf(query_lemmatized, coordinator.vocabulary, coordinator.idf)
+    return [index[doc_id] for score, doc_id in coordinator.top_k(query_tfidf, k)]
+
+
+# Перед выполнением нужно запустить build_shards.py (для фраз и NEAR/k — с --positions)
+# Пустая строка завершает работу
+if __name__ == '__main__':
+    args = parse_args()
+    lemmatizer = LemmaService.load('../task2/lemma_table.txt')
+    index = load_index(Path(args.shards) / 'index.txt')
+    with ShardCoordinator(args.shards) as coordinator:
+        print(f'{len(coordinator.executors)} shards, {coordinator.doc_count} documents')
+        while query := input('Enter query: ').strip():
+            try:
+                if args.mode == 'boolean':
+                    result = coordinator.boolean_search(convert_to_postfix(tokenize_query(query)))
+                else:
+                    result = ranked_search(query, coordinator, lemmatizer, index, args.k)
+                print(result if result else 'No results found.')
+            except IndexError:
+                print('Error: invalid query.')
+            except ValueError as e:
+                print(f'Error: {e.args[0]}')
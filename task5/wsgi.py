@@ -0,0 +1,12 @@
+# Точка входа для production-сервера; запуск из каталога task5:
+#   gunicorn --preload --workers 4 --bind 0.0.0.0:8000 wsgi:app
+# С --preload индекс загружается один раз в главном процессе, и рабочие процессы после fork делят
+# его отображённые в память страницы. Новая версия из create_vector_matrix.py подхватывается
+# каждым процессом по указателю vector_store/CURRENT без перезапуска и без потери запросов.
+# Для сегментного индекса: SEGMENTS=../task3/segments gunicorn ...
+# Сэмплирующий профилировщик (/metrics/profile): PROFILE_INTERVAL=0.01 gunicorn ...
+import os
+
+from main import app, init
+
+init(segments=os.environ.get('SEGMENTS'), profile_interval=os.environ.get('PROFILE_INTERVAL'))
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Тесты запускаются из корня репозитория: python -m pytest tests
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / 'task1'))
@@ -0,0 +1,63 @@
+import random
+from collections import Counter
+
+import pytest
+
+from common import analysis, page_store
+from common.analysis import TOKEN_PATTERN, analyze_documents, raw_token_lists, text_chunks, tokenize, \
+    tokenize_with_count
+from common.page_store import PageStore
+
+WORDS = frozenset({'black', 'hole', 'star', 'planet', 'orbit'})
+
+
+@pytest.fixture(autouse=True)
+def words(monkeypatch):
+    monkeypatch.setattr(analysis, 'english_words', lambda: WORDS)
+
+
+def test_selected_documents_are_analyzed_without_reading_the_rest(tmp_path, monkeypatch):
+    with PageStore(tmp_path / 'pages') as pages:
+        for doc_id, word in enumerate(sorted(WORDS), 1):
+            pages.put(doc_id, f'<html><body>{word} black</body></html>')
+    token_counts, _, _ = analyze_documents(tmp_path / 'pages', tmp_path / 'documents', 'html.parser', 1, 2)
+    assert sorted(token_counts) == [1, 2, 3, 4, 5]
+
+    with PageStore(tmp_path / 'pages') as pages:
+        pages.put(2, '<html><body>orbit orbit</body></html>')
+    read = []
+    get = PageStore.get
+
+    def recording_get(store, doc_id):
+        if store.directory == tmp_path / 'pages':
+            read.append(doc_id)
+        return get(store, doc_id)
+
+    monkeypatch.setattr(page_store.PageStore, 'get', recording_get)
+    token_counts, _, sources = analyze_documents(tmp_path / 'pages', tmp_path / 'documents', 'html.parser', 1, 2,
+                                                 doc_ids=[2, 4])
+    assert sorted(token_counts) == [2, 4] == sorted(sources)
+    assert token_counts[2] == {'orbit': 2}
+    assert set(read) == {2, 4}
+    # кеш остальных документов не удаляется
+    with PageStore(tmp_path / 'documents') as documents:
+        assert documents.doc_ids() == [1, 2, 3, 4, 5]
+
+
+def random_text(seed, length=300):
+    rng = random.Random(seed)
+    pieces = sorted(WORDS) + ['Black', 'STAR', 'black-hole', 'x', 'unknown', '-', '42', 'é']
+    separators = [' ', '  ', '\n', ', ', '.', '-', '']
+    return ''.join(rng.choice(pieces) + rng.choice(separators) for _ in range(length))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 16, 64])
+def test_tokens_split_across_chunks_are_joined(chunk_size):
+    for seed in range(20):
+        text = random_text(seed)
+        expected = TOKEN_PATTERN.findall(text.lower())
+        assert [token for tokens in raw_token_lists(text_chunks(text, chunk_size)) for token in tokens] == expected
+        whole = [token for token in expected if len(token) > 1 and token in WORDS]
+        assert list(tokenize(text, chunk_size)) == whole
+        assert list(tokenize(text_chunks(text, chunk_size))) == whole
+        assert tokenize_with_count(text, chunk_size) == Counter(whole)
@@ -0,0 +1,56 @@
+import json
+import random
+
+from common.binary_index import (FLAG_POSITIONS, BinaryIndex, convert_json_index, delta_decode, delta_encode,
+                                 positional_decode, positional_encode, sorted_positional_postings, write_index)
+
+
+def random_postings(seed, term_count=200, doc_count=300):
+    rng = random.Random(seed)
+    terms = {f'term{i}' for i in range(term_count)} | {'é', 'naïve', 'a-b'}
+    return {term: set(rng.sample(range(1, doc_count + 1), rng.randint(1, 40))) for term in terms}
+
+
+def test_delta_encoding_round_trip():
+    doc_ids = [1, 2, 127, 128, 129, 16383, 16384, 2 ** 32 + 5]
+    assert delta_decode(delta_encode(doc_ids)) == doc_ids
+    doc_positions = [(3, [0, 5, 300]), (70000, [1]), (70001, [2, 2 ** 20])]
+    doc_ids, positions = positional_decode(positional_encode(doc_positions))
+    assert list(zip(doc_ids, positions)) == doc_positions
+
+
+def test_binary_index_matches_json_index(tmp_path):
+    term_postings = random_postings(0)
+    # inverted_index.txt в том же формате, что пишет task3/main.py --json
+    json_items = [{'count': len(pages), 'inverted_array': sorted(pages), 'word': term}
+                  for term, pages in term_postings.items()]
+    (tmp_path / 'inverted_index.txt').write_text(json.dumps(json_items))
+    convert_json_index(tmp_path / 'inverted_index.txt', tmp_path / 'inverted_index.bin')
+
+    with BinaryIndex(tmp_path / 'inverted_index.bin') as index:
+        assert len(index) == len(term_postings)
+        assert sorted(index.terms(), key=str.encode) == list(index.terms())
+        assert set(index.terms()) == set(term_postings)
+        for term, pages in term_postings.items():
+            assert term in index
+            assert index[term] == pages
+            assert index.postings(term) == sorted(pages)
+            assert index.doc_freq(term) == len(pages)
+        assert 'missing' not in index
+        assert index.postings('missing') == []
+        assert index.doc_ids() == sorted(set().union(*term_postings.values()))
+
+
+def test_positional_index_round_trip(tmp_path):
+    rng = random.Random(1)
+    term_positions = {f'term{i}': {doc_id: sorted(rng.sample(range(500), rng.randint(1, 5)))
+                                   for doc_id in rng.sample(range(1, 100), rng.randint(1, 10))}
+                      for i in range(50)}
+    doc_ids = set().union(*term_positions.values())
+    write_index(tmp_path / 'index.bin', sorted_positional_postings(term_positions), doc_ids, FLAG_POSITIONS)
+    with BinaryIndex(tmp_path / 'index.bin') as index:
+        assert index.has_positions
+        for term, doc_positions in term_positions.items():
+            found_ids, found_positions = index.positional_postings(term)
+            assert dict(zip(found_ids, found_positions)) == doc_positions
+            assert index[term] == set(doc_positions)
@@ -0,0 +1,133 @@
+import random
+
+import pytest
+
+from common.binary_index import FLAG_POSITIONS, BinaryIndex, sorted_positional_postings, sorted_postings, write_index
+from common.boolean_engine import Bitmap, BooleanEngine, gallop_intersect
+
+STOPWORDS = frozenset({'of', 'the', 'and', 'is'})
+
+
+def random_index(seed, term_count=12, doc_count=200):
+    rng = random.Random(seed)
+    return {f't{i}': set(rng.sample(range(1, doc_count + 1), rng.randint(0, doc_count // 2)))
+            for i in range(term_count)}
+
+
+def random_query(rng, terms, depth=3):
+    # (постфиксная запись, дерево для проверки на множествах)
+    if depth == 0 or rng.random() < 0.3:
+        term = rng.choice(terms + ['missing'])
+        return [term], ('term', term)
+    operator = rng.choice(['AND', 'OR', 'NOT'])
+    if operator == 'NOT':
+        postfix, tree = random_query(rng, terms, depth - 1)
+        return postfix + ['NOT'], ('not', tree)
+    left_postfix, left = random_query(rng, terms, depth - 1)
+    right_postfix, right = random_query(rng, terms, depth - 1)
+    return left_postfix + right_postfix + [operator], (operator, left, right)
+
+
+def evaluate_sets(tree, index, universe):
+    if tree[0] == 'term':
+        return index.get(tree[1], set())
+    if tree[0] == 'not':
+        return universe - evaluate_sets(tree[1], index, universe)
+    left = evaluate_sets(tree[1], index, universe)
+    right = evaluate_sets(tree[2], index, universe)
+    return left & right if tree[0] == 'AND' else left | right
+
+
+def test_bitmap_round_trip():
+    doc_ids = [0, 1, 63, 64, 65, 127, 128, 1000]
+    bitmap = Bitmap.from_ids(doc_ids, (1000 >> 6) + 1)
+    assert bitmap.to_ids() == doc_ids
+    assert len(bitmap) == len(doc_ids)
+    other = Bitmap.from_ids([1, 64, 500], (1000 >> 6) + 1)
+    assert (bitmap & other).to_ids() == [1, 64]
+    assert (bitmap | other).to_ids() == sorted(set(doc_ids) | {500})
+    assert bitmap.andnot(other).to_ids() == [0, 63, 65, 127, 128, 1000]
+
+
+def test_engine_matches_set_semantics(tmp_path):
+    index = random_index(0)
+    universe = set().union(*index.values())
+    write_index(tmp_path / 'index.bin', sorted_postings(index), universe)
+    rng = random.Random(1)
+    with BinaryIndex(tmp_path / 'index.bin') as binary_index:
+        engines = [BooleanEngine(index), BooleanEngine(binary_index)]
+        for _ in range(500):
+            postfix, tree = random_query(rng, sorted(index))
+            expected = sorted(evaluate_sets(tree, index, universe))
+            for engine in engines:
+                assert engine.search(postfix) == expected, postfix
+
+
+def test_gallop_intersect_matches_sets():
+    rng = random.Random(2)
+    for _ in range(300):
+        small = sorted(rng.sample(range(1000), rng.randint(0, 30)))
+        large = sorted(rng.sample(range(1000), rng.randint(0, 500)))
+        assert gallop_intersect(small, large) == sorted(set(small) & set(large))
+
+
+def random_documents(seed, doc_count=150, length=40):
+    rng = random.Random(seed)
+    words = ['state', 'art', 'black', 'hole', 'star', 'of', 'the', 'and']
+    return {doc_id: [rng.choice(words) for _ in range(rng.randint(1, length))] for doc_id in range(1, doc_count + 1)}
+
+
+def positional_index(path, documents):
+    # Как в task3 --positions: позиции считаются по всем словам, стоп-слова в индекс не попадают
+    term_positions = {}
+    for doc_id, words in documents.items():
+        for position, word in enumerate(words):
+            if word not in STOPWORDS:
+                term_positions.setdefault(word, {}).setdefault(doc_id, []).append(position)
+    write_index(path, sorted_positional_postings(term_positions), set(documents), FLAG_POSITIONS)
+    return BinaryIndex(path)
+
+
+def contains_phrase(words, phrase):
+    # Стоп-слово внутри фразы совпадает с любым словом, по краям фразы не учитывается
+    indexed = [i for i, word in enumerate(phrase) if word not in STOPWORDS]
+    phrase = phrase[indexed[0]:indexed[-1] + 1]
+    return any(all(word in STOPWORDS or word == words[i + j] for j, word in enumerate(phrase))
+               for i in range(len(words) - len(phrase) + 1))
+
+
+def within(words, word1, word2, distance):
+    positions1 = [i for i, word in enumerate(words) if word == word1]
+    positions2 = [i for i, word in enumerate(words) if word == word2]
+    return any(abs(i - j) <= distance for i in positions1 for j in positions2)
+
+
+def test_phrase_and_near_match_brute_force(tmp_path):
+    documents = random_documents(3)
+    rng = random.Random(4)
+    with positional_index(tmp_path / 'index.bin', documents) as index:
+        engine = BooleanEngine(index, STOPWORDS)
+        for _ in range(200):
+            phrase = [rng.choice(['state', 'art', 'black', 'hole', 'of', 'the']) for _ in range(rng.randint(2, 4))]
+            if all(word in STOPWORDS for word in phrase):
+                continue
+            expected = [doc_id for doc_id, words in documents.items() if contains_phrase(words, phrase)]
+            assert engine.search([f'"{" ".join(phrase)}"']) == expected, phrase
+        for _ in range(100):
+            word1, word2 = rng.sample(['state', 'art', 'black', 'hole', 'star'], 2)
+            distance = rng.randint(1, 5)
+            expected = [doc_id for doc_id, words in documents.items() if within(words, word1, word2, distance)]
+            assert engine.search([word1, word2, f'NEAR/{distance}']) == expected
+
+
+def test_phrase_with_stopwords_keeps_their_offsets(tmp_path):
+    documents = {1: 'the state of the art'.split(), 2: 'state of art'.split(), 3: 'art of the state'.split()}
+    with positional_index(tmp_path / 'index.bin', documents) as index:
+        engine = BooleanEngine(index, STOPWORDS)
+        assert engine.search(['"state of the art"']) == [1]
+        assert engine.search(['"state of art"']) == [2]
+        assert engine.search(['"the state of"']) == engine.search(['state']) == [1, 2, 3]
+        with pytest.raises(ValueError, match='only stopwords'):
+            engine.search(['"of the"'])
+        with pytest.raises(ValueError, match='stopword'):
+            engine.search(['state', 'the', 'NEAR/2'])
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawler import Crawler, FetchError
+
+ETAG = '"v1"'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Локальная замена сайта: число обращений к каждому пути считается в server.hits
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        hits = self.server.hits
+        hits[self.path] += 1
+        if self.path == '/flaky' and hits[self.path] <= 2:
+            self.reply(503, b'busy', {'Retry-After': '0'})
+        elif self.path == '/down':
+            self.reply(503, b'busy')
+        elif self.path == '/redirect':
+            self.reply(302, b'', {'Location': '/page'})
+        elif self.path == '/etag' and self.headers.get('If-None-Match') == ETAG:
+            self.reply(304, b'', {'ETag': ETAG})
+        elif self.path == '/cp1251':
+            self.reply(200, 'Привет'.encode('cp1251'), {'Content-Type': 'text/html; charset=windows-1251'})
+        elif self.path == '/broken':
+            self.reply(200, b'ok \xff\xfe', {'Content-Type': 'text/html'})
+        elif self.path in ('/flaky', '/page', '/etag'):
+            self.reply(200, f'<html>{self.path}</html>'.encode(), {'ETag': ETAG})
+        else:
+            self.reply(404, b'not found')
+
+    def reply(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.hits = Counter()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server, path):
+    return f'http://127.0.0.1:{server.server_address[1]}{path}'
+
+
+def crawler(**kwargs):
+    return Crawler(workers=2, rate=0, timeout=5, **kwargs)
+
+
+def test_retries_503_until_success(server):
+    with crawler(retries=3, backoff=0.01) as client:
+        response = client.fetch(url(server, '/flaky'))
+    assert response.status == 200
+    assert response.text() == '<html>/flaky</html>'
+    assert server.hits['/flaky'] == 3
+
+
+def test_gives_up_after_retries_with_backoff(server):
+    with crawler(retries=2, backoff=0.05) as client:
+        start = time.monotonic()
+        with pytest.raises(FetchError, match='HTTP 503'):
+            client.fetch(url(server, '/down'))
+    assert server.hits['/down'] == 3
+    # две паузы: не меньше backoff и 2 * backoff
+    assert time.monotonic() - start >= 0.15
+
+
+def test_follows_redirects(server):
+    with crawler() as client:
+        response = client.fetch(url(server, '/redirect'))
+    assert response.status == 200
+    assert response.url == url(server, '/page')
+    assert server.hits['/redirect'] == 1
+
+
+def test_404_is_not_retried(server):
+    with crawler(retries=3, backoff=0.01) as client:
+        response = client.fetch(url(server, '/missing'))
+    assert response.status == 404
+    assert server.hits['/missing'] == 1
+
+
+def test_conditional_request_gets_304(server):
+    with crawler() as client:
+        first = client.fetch(url(server, '/etag'))
+        second = client.fetch(url(server, '/etag'), {'If-None-Match': first.headers['Etag']})
+    assert first.status == 200
+    assert second.status == 304
+
+
+def test_crawl_reports_every_url(server):
+    urls = [url(server, path) for path in ('/page', '/missing', '/down')]
+    with crawler(retries=0) as client:
+        results = {item_url: (response, error) for _, item_url, response, error in client.crawl(urls)}
+    assert results[urls[0]][0].status == 200
+    assert results[urls[1]][0].status == 404
+    assert isinstance(results[urls[2]][1], FetchError)
+
+
+def test_text_uses_content_type_charset(server):
+    with crawler() as client:
+        assert client.fetch(url(server, '/cp1251')).text() == 'Привет'
+
+
+def test_undecodable_bytes_are_replaced(server):
+    with crawler() as client:
+        assert client.fetch(url(server, '/broken')).text() == 'ok \ufffd\ufffd'
@@ -0,0 +1,37 @@
+import pytest
+
+from common.extraction import DEFAULT_PARSER, FAST_PARSER, clean_html, extract_pages
+
+DOCUMENTS = [
+    '<html><head><title>Заголовок</title></head><body><p>Первый абзац</p><p>Второй</p></body></html>',
+    '<p>hello</p>',
+    'plain text',
+    '<title>T</title><p>x</p>',
+    '<html><head><title>T</title></head></html>',
+    '<body>hi<script>var a = 1;</script><style>p {}</style></body>',
+    '<html><body><p>a <![CDATA[x < y]]> b</p></body></html>',
+    '<p>a<!-- comment -->b</p>',
+    '<body><div>one  two</div>\n\n<div>  three </div></body>',
+    '<html><body></body></html>',
+]
+
+
+@pytest.mark.parametrize('html', DOCUMENTS)
+def test_parsers_agree(html):
+    pytest.importorskip('lxml')
+    assert clean_html(html, DEFAULT_PARSER) == clean_html(html, FAST_PARSER)
+
+
+def test_fragment_without_body_keeps_text():
+    assert clean_html('<p>hello</p>') == 'hello'
+    assert clean_html('<title>T</title><p>x</p>') == 'x'
+    assert clean_html('<html><body><p>a <![CDATA[x]]> b</p></body></html>') == 'a\nb'
+
+
+def test_extract_pages_in_processes_matches_serial():
+    pages = [(doc_id, f'<body><p>page {doc_id}</p>{DOCUMENTS[doc_id % len(DOCUMENTS)]}</body>')
+             for doc_id in range(1, 41)]
+    expected = {doc_id: clean_html(html) for doc_id, html in pages}
+    results = list(extract_pages(iter(pages), workers=2, chunk_size=3))
+    assert len(results) == len(pages)
+    assert dict(results) == expected
@@ -0,0 +1,63 @@
+import json
+from types import SimpleNamespace
+
+from manifest import Manifest
+
+
+def page_urls(numbers):
+    return [f'http://example.org/p/{number}' for number in numbers]
+
+
+def test_removed_doc_ids_are_not_reused(tmp_path):
+    manifest = Manifest(str(tmp_path / 'manifest.json'))
+    first = manifest.assign_doc_ids(page_urls(range(1, 15)))
+    for url, doc_id in first.items():
+        manifest.entries[url] = {'doc_id': doc_id, 'sha256': ''}
+    manifest.save()
+
+    manifest = Manifest.load(str(tmp_path / 'manifest.json'))
+    urls = page_urls([1, 2, 3, 20])
+    dropped = manifest.drop_missing(urls)
+    doc_ids = manifest.assign_doc_ids(urls)
+    assert sorted(entry['doc_id'] for entry in dropped.values()) == list(range(4, 15))
+    assert doc_ids[page_urls([20])[0]] == 15
+    assert doc_ids[page_urls([20])[0]] not in manifest.removed
+
+
+def test_next_doc_id_survives_save_and_load(tmp_path):
+    manifest = Manifest(str(tmp_path / 'manifest.json'))
+    doc_ids = manifest.assign_doc_ids(page_urls([1, 2]))
+    manifest.entries[page_urls([1])[0]] = {'doc_id': doc_ids[page_urls([1])[0]], 'sha256': ''}
+    manifest.save()
+    # ссылка 2 так и не скачалась, но её номер уже выдан
+    assert Manifest.load(str(tmp_path / 'manifest.json')).next_doc_id == 3
+
+
+def test_legacy_manifest_skips_last_removed_ids(tmp_path):
+    filename = tmp_path / 'manifest.json'
+    filename.write_text(json.dumps({'pages': {'http://example.org/p/1': {'doc_id': 1}},
+                                    'last_run': {'changed': [], 'removed': [7]}}))
+    assert Manifest.load(str(filename)).next_doc_id == 8
+
+
+def test_conditional_headers_only_for_stored_pages(tmp_path):
+    manifest = Manifest(str(tmp_path / 'manifest.json'))
+    url = page_urls([1])[0]
+    manifest.entries[url] = {'doc_id': 1, 'etag': '"v1"', 'last_modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+    assert manifest.conditional_headers(url, {1}) == {'If-None-Match': '"v1"',
+                                                      'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+    assert manifest.conditional_headers(url, set()) == {}
+    assert manifest.conditional_headers(page_urls([2])[0], {1}) == {}
+
+
+def test_modified_page_is_recorded_only_on_request(tmp_path):
+    manifest = Manifest(str(tmp_path / 'manifest.json'))
+    url = page_urls([1])[0]
+    response = SimpleNamespace(body=b'<html>1</html>', headers={'Etag': '"v1"'})
+    assert manifest.is_modified(url, response, page_exists=False)
+    # пока страница не сохранена, манифест о ней не знает
+    assert url not in manifest.entries and manifest.changed == []
+    manifest.record(url, 1, response, modified=True)
+    assert manifest.changed == [1]
+    assert not manifest.is_modified(url, response, page_exists=True)
+    assert manifest.is_modified(url, response, page_exists=False)
@@ -0,0 +1,74 @@
+import pytest
+
+from common import page_store
+from common.page_store import SEGMENT_GLOB, TEMP_INDEX_FILE, PageStore
+
+
+def test_compact_if_needed_drops_dead_records(tmp_path):
+    with PageStore(tmp_path) as store:
+        for version in range(4):
+            for doc_id in range(1, 11):
+                store.put(doc_id, f'<html>{doc_id} v{version}</html>' * 20)
+        store.delete(10)
+        assert store.garbage_ratio() > 0.5
+        assert store.compact_if_needed()
+        assert store.garbage_ratio() == 0.0
+        assert not store.compact_if_needed()
+        assert store.doc_ids() == list(range(1, 10))
+        assert store.get(3) == '<html>3 v3</html>' * 20
+    with PageStore(tmp_path) as reopened:
+        assert reopened.get(9) == '<html>9 v3</html>' * 20
+        assert 10 not in reopened
+
+
+def test_fresh_store_is_not_compacted(tmp_path):
+    with PageStore(tmp_path) as store:
+        store.put(1, '<html>one</html>')
+        assert store.garbage_ratio() == 0.0
+        assert not store.compact_if_needed()
+
+
+def fill(store):
+    for version in range(3):
+        for doc_id in range(1, 21):
+            store.put(doc_id, f'<html>{doc_id} v{version}</html>' * 20)
+    store.delete(20)
+
+
+def test_compaction_interrupted_before_swap_keeps_old_index(tmp_path, monkeypatch):
+    with PageStore(tmp_path, segment_size=4096) as store:
+        fill(store)
+        expected = dict(store.iter_pages())
+
+        def crash(*args):
+            raise OSError('crash before swap')
+
+        monkeypatch.setattr(page_store.os, 'replace', crash)
+        with pytest.raises(OSError):
+            store.compact()
+    monkeypatch.undo()
+    with PageStore(tmp_path, segment_size=4096) as reopened:
+        assert dict(reopened.iter_pages()) == expected
+        reopened.compact()
+        assert dict(reopened.iter_pages()) == expected
+    with PageStore(tmp_path, segment_size=4096) as reopened:
+        assert dict(reopened.iter_pages()) == expected
+        # остались только сегменты, на которые ссылается новый индекс
+        segments = {segment for segment, _, _ in reopened.locations.values()}
+        assert {int(path.stem.split('-')[1]) for path in tmp_path.glob(SEGMENT_GLOB)} == segments
+        assert not (tmp_path / TEMP_INDEX_FILE).exists()
+
+
+def test_compaction_clears_stale_compacting_dir(tmp_path):
+    (tmp_path / 'compacting').mkdir()
+    (tmp_path / 'compacting' / 'segment-00000.dat').write_bytes(b'garbage')
+    with PageStore(tmp_path) as store:
+        fill(store)
+        expected = dict(store.iter_pages())
+        store.compact()
+        assert not (tmp_path / 'compacting').exists()
+        assert dict(store.iter_pages()) == expected
+        store.put(21, '<html>after compaction</html>')
+    with PageStore(tmp_path) as reopened:
+        assert reopened.get(21) == '<html>after compaction</html>'
+        assert reopened.get(1) == expected[1]
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from common.ranking import RankedEngine, batch_top_k, normalize_rows, upper_bounds
+
+
+def random_documents(seed, doc_count=400, term_count=60):
+    rng = np.random.default_rng(seed)
+    counts = sparse.random(doc_count, term_count, density=0.08, random_state=rng,
+                           data_rvs=lambda size: rng.integers(1, 5, size))
+    return normalize_rows(counts)
+
+
+def random_queries(seed, term_count, count=100):
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(count):
+        columns = rng.choice(term_count, rng.integers(1, 6), replace=False)
+        queries.append({int(j): float(rng.uniform(0.1, 2.0)) for j in columns})
+    return queries
+
+
+@pytest.mark.parametrize('k', [1, 5, 20])
+def test_maxscore_matches_exhaustive(k):
+    documents = random_documents(0)
+    postings = sparse.csr_matrix(documents.T)
+    engine = RankedEngine(postings, upper_bounds(postings))
+    for query in random_queries(1, documents.shape[1]):
+        rows, scores = engine.top_k(query, k)
+        expected_rows, expected_scores = engine.exhaustive(query, k)
+        assert rows.tolist() == expected_rows.tolist()
+        assert np.allclose(scores, expected_scores)
+
+
+def test_maxscore_prunes_frequent_terms():
+    # Лемма 0 есть во всех документах с малым весом: её документы не должны становиться кандидатами
+    rng = np.random.default_rng(4)
+    counts = sparse.random(2000, 30, density=0.05, random_state=rng, data_rvs=lambda size: rng.integers(1, 5, size))
+    counts = sparse.lil_matrix(counts)
+    counts[:, 0] = 1
+    postings = sparse.csr_matrix(normalize_rows(counts).T)
+    engine = RankedEngine(postings, upper_bounds(postings))
+    terms = engine.query_terms({0: 0.1, 7: 3.0, 12: 2.0})
+    assert terms[0][1] == 0
+    for k in (1, 10, 50):
+        query = {0: 0.1, 7: 3.0, 12: 2.0}
+        rows, scores = engine.top_k(query, k)
+        expected_rows, expected_scores = engine.exhaustive(query, k)
+        assert rows.tolist() == expected_rows.tolist()
+        assert scores.tolist() == expected_scores.tolist()
+
+
+def test_batch_matches_exhaustive():
+    documents = random_documents(2)
+    postings = sparse.csr_matrix(documents.T)
+    engine = RankedEngine(postings, upper_bounds(postings))
+    queries = random_queries(3, documents.shape[1]) + [{}]
+    for query, (rows, scores) in zip(queries, batch_top_k(queries, postings, 10, block_size=7)):
+        expected_rows, expected_scores = engine.exhaustive(query, 10)
+        assert rows.tolist() == expected_rows.tolist()
+        assert np.allclose(scores, expected_scores)
@@ -0,0 +1,57 @@
+import importlib.util
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+from common.ranking import normalize_rows
+from common.vector_snapshot import new_version_path, publish, write_vector_snapshot
+from conftest import ROOT
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Маленький индекс без приближённого поиска: три документа с пропуском в номерах
+    lemmas = ['black', 'hole', 'star']
+    documents = normalize_rows(sparse.csr_matrix(np.array([[1.0, 1.0, 0.0], [0.0, 0.5, 0.0], [0.2, 0.0, 1.0]])))
+    urls = {1: 'https://example.org/1', 4: 'https://example.org/4', 7: 'https://example.org/7'}
+    token_lemmas = {'black': ('black',), 'holes': ('hole',), 'hole': ('hole',), 'star': ('star',)}
+    path = new_version_path(tmp_path / 'vector_store')
+    write_vector_snapshot(path, lemmas, np.array([0.4, 0.4, 1.1]), np.array([1, 4, 7]), documents, urls,
+                          token_lemmas)
+    publish(tmp_path / 'vector_store', path)
+    (tmp_path / 'search.html').write_text('<html></html>')
+    monkeypatch.chdir(tmp_path)
+
+    spec = importlib.util.spec_from_file_location('task5_main', ROOT / 'task5' / 'main.py')
+    main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(main)
+    main.init(vector_store='vector_store')
+    return main.app.test_client()
+
+
+def test_search_returns_urls_by_doc_id(client):
+    response = client.post('/search', data={'query': 'black holes', 'k': '2'})
+    assert response.status_code == 200
+    assert response.get_json() == ['https://example.org/1', 'https://example.org/4']
+
+
+@pytest.mark.parametrize('data', [{'query': 'star', 'k': 'ten'}, {'query': 'star', 'k': '0'},
+                                  {'query': 'star', 'mode': 'fuzzy'}, {'query': 'star', 'mode': 'ann'},
+                                  {'query': 'star', 'nprobe': '-2'}, {'k': '3'}])
+def test_invalid_search_parameters_are_client_errors(client, data):
+    response = client.post('/search', data=data)
+    assert response.status_code == 400
+    assert response.data
+
+
+@pytest.mark.parametrize('body', [b'not json', b'[]', b'{"queries": "star"}', b'{"queries": [1]}',
+                                  b'{"queries": ["star"], "k": -1}'])
+def test_invalid_batch_is_a_client_error(client, body):
+    assert client.post('/search/batch', data=body).status_code == 400
+
+
+def test_batch_search(client):
+    response = client.post('/search/batch', json={'queries': ['star', 'hole'], 'k': 1})
+    assert response.status_code == 200
+    assert response.get_json() == [['https://example.org/7'], ['https://example.org/4']]
@@ -0,0 +1,107 @@
+import json
+import threading
+from collections import Counter
+
+import pytest
+
+from common import analysis
+from common.segments import KEEP_MANIFESTS, MANIFEST_PREFIX, BackgroundMerger, SegmentSnapshot, SegmentStore, \
+    SegmentView
+from common.vector_snapshot import current_dir, read_current
+
+WORDS = ['black', 'hole', 'star', 'planet', 'orbit']
+
+
+@pytest.fixture(autouse=True)
+def stopwords(monkeypatch):
+    monkeypatch.setattr(analysis, 'english_stopwords', lambda: frozenset({'the'}))
+
+
+def add(store, doc_words):
+    # doc_words — {номер документа: слова}
+    token_counts = {doc_id: Counter(words) for doc_id, words in doc_words.items()}
+    token_lemmas = {word: (word,) for words in doc_words.values() for word in words}
+    urls = {doc_id: f'https://example.org/{doc_id}' for doc_id in doc_words}
+    store.add_documents(token_counts, None, token_lemmas, urls)
+
+
+def view(root):
+    return SegmentView(current_dir(root))
+
+
+def manifest(root):
+    with open(current_dir(root), 'r') as file:
+        return json.load(file)
+
+
+def test_tombstones_hide_replaced_and_deleted_documents(tmp_path):
+    store = SegmentStore(tmp_path)
+    add(store, {1: ['black', 'hole'], 2: ['black', 'star'], 3: ['black', 'planet']})
+    add(store, {2: ['orbit', 'the']})
+    store.delete_documents([3])
+    segments = manifest(tmp_path)['segments']
+    assert [entry['deleted'] for entry in segments] == [[2, 3], []]
+    assert view(tmp_path).search(['black']) == [1]
+    assert view(tmp_path).search(['orbit']) == [2]
+    assert view(tmp_path).search(['black', 'NOT']) == [2]
+    assert SegmentSnapshot(current_dir(tmp_path)).doc_ids.tolist() == [1, 2]
+
+
+def test_commit_publishes_new_manifest_and_keeps_old_readers(tmp_path):
+    store = SegmentStore(tmp_path)
+    add(store, {1: ['black'], 2: ['star']})
+    old_view = view(tmp_path)
+    store.delete_documents([1])
+    assert read_current(tmp_path) == f'{MANIFEST_PREFIX}000002.json'
+    # читатель старого манифеста по-прежнему видит удалённый документ, новый — нет
+    assert old_view.search(['black']) == [1]
+    assert view(tmp_path).search(['black']) == []
+    for doc_id in range(3, 3 + KEEP_MANIFESTS + 1):
+        add(store, {doc_id: ['planet']})
+    assert len(list(tmp_path.glob(f'{MANIFEST_PREFIX}*.json'))) == KEEP_MANIFESTS
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_merge_keeps_deletes_that_arrive_during_merge(tmp_path, monkeypatch):
+    store = SegmentStore(tmp_path)
+    for doc_id in range(1, 5):
+        add(store, {doc_id: ['black', WORDS[doc_id]]})
+    store.delete_documents([1])
+    write_merged_segment = store.write_merged_segment
+
+    def write_and_delete(directory, segments):
+        write_merged_segment(directory, segments)
+        # удаление приходит, пока слияние идёт без блокировки манифеста
+        store.delete_documents([3])
+
+    monkeypatch.setattr(store, 'write_merged_segment', write_and_delete)
+    assert store.merge_once()
+    segments = manifest(tmp_path)['segments']
+    assert len(segments) == 1
+    assert segments[0]['doc_count'] == 3
+    assert segments[0]['deleted'] == [3]
+    assert view(tmp_path).search(['black']) == [2, 4]
+    assert SegmentSnapshot(current_dir(tmp_path)).doc_ids.tolist() == [2, 4]
+
+
+class FailingStore:
+    def __init__(self):
+        self.calls = 0
+        self.done = threading.Event()
+
+    def merge(self):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError('unexpected failure')
+        self.done.set()
+
+
+def test_background_merger_survives_failures(caplog):
+    store = FailingStore()
+    merger = BackgroundMerger(store, interval=0.01)
+    merger.start()
+    try:
+        assert store.done.wait(5)
+    finally:
+        merger.stop()
+    assert 'Segment merge failed' in caplog.text
@@ -0,0 +1,62 @@
+import importlib.util
+import random
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+from common.lemmatizer import LemmaService
+from common.ranking import normalize_rows
+from common.sharding import ShardCoordinator, write_shards
+from common.tfidf import tf_idf_matrix
+from common.vector_snapshot import new_version_path, publish, write_vector_snapshot
+from conftest import ROOT
+
+LEMMAS = [f'lemma{i}' for i in range(30)]
+
+
+def load_script(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def collection(tmp_path, monkeypatch):
+    # Одна и та же коллекция в общем снимке task5 и в трёх шардах; номера документов идут с пропусками
+    rng = np.random.default_rng(0)
+    doc_ids = np.sort(rng.choice(np.arange(1, 1000), 150, replace=False))
+    counts = sparse.random(len(doc_ids), len(LEMMAS), density=0.15, random_state=rng, format='csr',
+                           data_rvs=lambda size: rng.integers(1, 6, size))
+    counts.sort_indices()
+    doc_word_sums = np.asarray(counts.sum(axis=1)).ravel() + rng.integers(0, 20, len(doc_ids))
+    urls = {int(doc_id): f'https://example.org/{doc_id}' for doc_id in doc_ids}
+    token_lemmas = {lemma: (lemma,) for lemma in LEMMAS}
+
+    tf_idf, idf = tf_idf_matrix(counts, doc_word_sums)
+    path = new_version_path(tmp_path / 'vector_store')
+    write_vector_snapshot(path, LEMMAS, idf, doc_ids, normalize_rows(tf_idf), urls, token_lemmas)
+    publish(tmp_path / 'vector_store', path)
+
+    lemma_postings = {lemma: set(doc_ids[counts[:, j].nonzero()[0]].tolist()) for j, lemma in enumerate(LEMMAS)}
+    write_shards(tmp_path / 'shards', 3, doc_ids, counts, doc_word_sums, LEMMAS, lemma_postings)
+
+    (tmp_path / 'search.html').write_text('<html></html>')
+    monkeypatch.chdir(tmp_path)
+    main = load_script('task5_main', ROOT / 'task5' / 'main.py')
+    main.init(vector_store='vector_store')
+    shard_search = load_script('task5_shard_search', ROOT / 'task5' / 'shard_search.py')
+    with ShardCoordinator(tmp_path / 'shards') as coordinator:
+        yield main.app.test_client(), coordinator, shard_search, LemmaService(token_lemmas), urls
+
+
+def test_coordinator_matches_single_index(collection):
+    client, coordinator, shard_search, lemmatizer, urls = collection
+    rng = random.Random(1)
+    for _ in range(100):
+        query = ' '.join(rng.choice(LEMMAS + ['unknown']) for _ in range(rng.randint(1, 4)))
+        k = rng.choice([1, 3, 10, 200])
+        response = client.post('/search', data={'query': query, 'k': str(k)})
+        assert response.status_code == 200
+        assert shard_search.ranked_search(query, coordinator, lemmatizer, urls, k) == response.get_json(), query
@@ -0,0 +1,77 @@
+import threading
+import time
+
+from common.vector_snapshot import SnapshotHolder, publish
+
+
+class SlowSnapshot:
+    # Загрузка новой версии ждёт события, как долгое открытие среза сегментов
+    release = threading.Event()
+
+    def __init__(self, path):
+        self.version = path.name
+        if self.version != 'v1':
+            SlowSnapshot.release.wait(5)
+
+
+def test_new_version_loads_in_background(tmp_path):
+    (tmp_path / 'v1').mkdir()
+    publish(tmp_path, tmp_path / 'v1')
+    holder = SnapshotHolder(tmp_path, SlowSnapshot, check_interval=0.01)
+    assert holder.get().version == 'v1'
+
+    publish(tmp_path, tmp_path / 'v2')
+    time.sleep(0.1)
+    # пока v2 загружается, запросы сразу получают прежний снимок
+    start = time.monotonic()
+    assert holder.get().version == 'v1'
+    assert time.monotonic() - start < 0.05
+
+    SlowSnapshot.release.set()
+    deadline = time.monotonic() + 2
+    while holder.get().version != 'v2' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert holder.get().version == 'v2'
+
+
+def test_broken_version_keeps_current_snapshot(tmp_path):
+    (tmp_path / 'v1').mkdir()
+    publish(tmp_path, tmp_path / 'v1')
+
+    def loader(path):
+        if path.name != 'v1':
+            raise ValueError('truncated snapshot')
+        return SlowSnapshot(path)
+
+    holder = SnapshotHolder(tmp_path, loader, check_interval=0.01)
+    publish(tmp_path, tmp_path / 'broken')
+    holder.refresh()
+    assert holder.snapshot.version == 'v1'
+
+
+def test_watcher_survives_any_loader_error(tmp_path, caplog):
+    (tmp_path / 'v1').mkdir()
+    publish(tmp_path, tmp_path / 'v1')
+    loads = []
+
+    def loader(path):
+        loads.append(path.name)
+        if path.name == 'broken':
+            raise RuntimeError('unexpected failure')
+        return SlowSnapshot(path)
+
+    holder = SnapshotHolder(tmp_path, loader, check_interval=0.01)
+    assert holder.get().version == 'v1'
+    publish(tmp_path, tmp_path / 'broken')
+    time.sleep(0.1)
+    assert holder.get().version == 'v1'
+    # сломанная версия не перезагружается на каждой проверке
+    assert loads.count('broken') == 1
+    assert 'unexpected failure' in caplog.text
+
+    publish(tmp_path, tmp_path / 'v1-fixed')
+    SlowSnapshot.release.set()
+    deadline = time.monotonic() + 2
+    while holder.get().version != 'v1-fixed' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert holder.get().version == 'v1-fixed'
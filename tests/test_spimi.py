@@ -0,0 +1,62 @@
+import json
+import random
+
+import pytest
+
+from common import spimi
+from common.binary_index import (FLAG_POSITIONS, BinaryIndex, convert_json_index, sorted_positional_postings,
+                                 write_index)
+from common.spimi import SpimiBuilder
+
+
+def random_documents(seed, doc_count=120, term_count=80):
+    # Номер документа -> термин -> отсортированные позиции; документы идут не по порядку, как из кеша анализа
+    rng = random.Random(seed)
+    doc_ids = rng.sample(range(1, doc_count * 3), doc_count)
+    return {doc_id: {f'term{j}': sorted(rng.sample(range(1000), rng.randint(1, 4)))
+                     for j in rng.sample(range(term_count), rng.randint(1, 15))}
+            for doc_id in doc_ids}
+
+
+def build_external(path, documents, positions, memory_budget, directory):
+    with SpimiBuilder(memory_budget, positions, directory) as builder:
+        for doc_id, term_positions in documents.items():
+            builder.add(doc_id, term_positions if positions else set(term_positions))
+        write_index(path, builder.merged(), documents, FLAG_POSITIONS if positions else 0)
+        spilled = builder.run_count
+    return spilled
+
+
+@pytest.mark.parametrize('fan_in', [spimi.MAX_FAN_IN, 3])
+def test_external_index_matches_json_index(tmp_path, monkeypatch, fan_in):
+    monkeypatch.setattr(spimi, 'MAX_FAN_IN', fan_in)
+    documents = random_documents(0)
+    runs = build_external(tmp_path / 'external.bin', documents, False, 2000, tmp_path)
+    assert runs > 3
+
+    term_pages = {}
+    for doc_id, term_positions in documents.items():
+        for term in term_positions:
+            term_pages.setdefault(term, set()).add(doc_id)
+    json_items = [{'count': len(pages), 'inverted_array': sorted(pages), 'word': term}
+                  for term, pages in term_pages.items()]
+    (tmp_path / 'inverted_index.txt').write_text(json.dumps(json_items))
+    convert_json_index(tmp_path / 'inverted_index.txt', tmp_path / 'memory.bin')
+
+    assert (tmp_path / 'external.bin').read_bytes() == (tmp_path / 'memory.bin').read_bytes()
+    assert [path.name for path in tmp_path.iterdir() if path.name.startswith('spimi-')] == []
+
+
+def test_external_positional_index_matches_in_memory(tmp_path):
+    documents = random_documents(1)
+    build_external(tmp_path / 'external.bin', documents, True, 4000, tmp_path)
+    term_positions = {}
+    for doc_id, doc_terms in documents.items():
+        for term, positions in doc_terms.items():
+            term_positions.setdefault(term, {})[doc_id] = positions
+    write_index(tmp_path / 'memory.bin', sorted_positional_postings(term_positions), documents, FLAG_POSITIONS)
+
+    assert (tmp_path / 'external.bin').read_bytes() == (tmp_path / 'memory.bin').read_bytes()
+    with BinaryIndex(tmp_path / 'external.bin') as index:
+        doc_ids, positions = index.positional_postings('term0')
+        assert dict(zip(doc_ids, positions)) == term_positions['term0']
@@ -0,0 +1,30 @@
+import importlib.util
+
+import numpy as np
+from scipy import sparse
+
+from common.tfidf import export_text, tf_idf_matrix
+from conftest import ROOT
+
+
+def load_create_vector_matrix():
+    spec = importlib.util.spec_from_file_location('create_vector_matrix', ROOT / 'task5' / 'create_vector_matrix.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_text_export_keeps_doc_ids_with_gaps(tmp_path):
+    # Номера документов с пропусками, как после удалений при инкрементальном обходе
+    vocabulary = ['black', 'hole', 'star']
+    doc_ids = [2, 5, 9]
+    counts = sparse.csr_matrix(np.array([[1, 0, 2], [0, 3, 0], [1, 1, 0]], dtype=np.float64))
+    tf_idf, idf = tf_idf_matrix(counts, counts.sum(axis=1).A1)
+    export_text(tmp_path, tf_idf, idf, vocabulary, doc_ids)
+    assert sorted(file.name for file in tmp_path.iterdir()) == ['2.txt', '5.txt', '9.txt']
+    assert (tmp_path / '5.txt').read_text().split()[0] == 'hole'
+
+    matrix, doc_freqs, found_ids = load_create_vector_matrix().calculate_vector_matrix(vocabulary, tmp_path)
+    assert found_ids.tolist() == doc_ids
+    assert doc_freqs.tolist() == [2, 2, 1]
+    assert np.allclose(matrix.toarray(), tf_idf.toarray())